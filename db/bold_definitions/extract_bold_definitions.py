@@ -3,10 +3,16 @@
 """Extract bold defined words from the CST corpus and ad to database."""
 
 import json
+import psutil
 import re
+import sys
 
 from bs4 import BeautifulSoup
+from lxml import etree
+from multiprocessing import Manager, Process
+from multiprocessing.managers import ListProxy
 from rich import print
+from typing import List
 
 from db.models import BoldDefinition
 from db.db_helpers import get_db_session
@@ -22,7 +28,7 @@ from db.bold_definitions.functions import get_bold_strings
 from tools.paths import ProjectPaths
 from tools.tic_toc import tic, toc
 from tools.tsv_read_write import write_tsv_dot_dict
-from tools.printer import p_title, p_green, p_green_title, p_yes
+from tools.printer import p_title, p_green, p_green_title, p_red, p_yes
 
 
 def debugger(para, bold):
@@ -32,62 +38,148 @@ def debugger(para, bold):
     print(f"{'bold.next_sibling.next_sibling':<40}{bold.next_sibling.next_sibling}")
 
 
-def extract_bold_definitions(pth):
-    """extract commentary definitions from xml."""
+div_types = ["sutta", "vagga", "chapter", "samyutta", "kanda", "khandaka"]
 
-    p_green_title("extracting bold definitions")
+# no real divs in anguttara ṭīkā
+ant = ["s0401t.tik.xml", "s0402t.tik.xml", "s0403t.tik.xml", "s0404t.tik.xml"]
 
-    bold_definitions_list = []
+bold_tags_regex = re.compile("\\<b\\>|\\</b\\>")
 
-    bold_total = 0
 
-    for file_name, ref_code in file_list.items():
-        print(f"{file_name}\t{ref_code}", end="\t")
+def make_soup(element) -> BeautifulSoup:
+    """Make the soup of one element of the xml,
+    without pb, note, and hi paranum and dot tags."""
 
-        bold_count1 = 0
-        bold_count2 = 0
-        no_meaning_count = 0
-        nikaya, book, title, subhead = ["", "", "", ""]
-        
-        # open xml file
-        with open(pth.cst_xml_roman_dir.joinpath(file_name), "r", 
-            encoding="UTF-16") as file:
-            xml = file.read()
-        
-        # make the soup
-        soup = BeautifulSoup(xml, "xml")
-        
-        # remove all the "pb" tags
-        pbs = soup.find_all("pb")
-        for pb in pbs:
-            pb.decompose()
-
-        # remove all the notes
-        notes = soup.find_all("note")
-        for note in notes:
-            note.decompose()
-
-        # remove all the hi parunum dot tags
-        his = soup.find_all("hi", rend=["paranum", "dot"])
-        for hi in his:
-            hi.unwrap()
-
-        # grab the number of bolds
-        bold_count1 = len(soup.find_all("hi", rend="bold"))
-        
-        # grab the headings for suttas pitaka
-        if soup.div is not None:
-            print("has div", end="\t")
+    xml = etree.tostring(element, encoding="unicode", with_tail=False)
+    soup = BeautifulSoup(xml, "xml")
 
-            nikaya = soup.find_all("p", rend="nikaya")[0].string
-            book = soup.find_all("head", rend="book")[0].string
+    # remove all the "pb" tags
+    pbs = soup.find_all("pb")
+    for pb in pbs:
+        pb.decompose()
 
-            divs = soup.find_all("div", type=["sutta", "vagga", "chapter", "samyutta", "kanda", "khandaka"])
+    # remove all the notes
+    notes = soup.find_all("note")
+    for note in notes:
+        note.decompose()
 
-            # no real divs in anguttara ṭīkā
-            ant = ["s0401t.tik.xml", "s0402t.tik.xml", "s0403t.tik.xml", "s0404t.tik.xml"]
-            if file_name in ant:
-                divs = soup.find_all("div", type=["book"])
+    # remove all the hi parunum dot tags
+    his = soup.find_all("hi", rend=["paranum", "dot"])
+    for hi in his:
+        hi.unwrap()
+    
+    return soup
+
+
+def clear_element(element) -> None:
+    """Free an element which has been parsed, and everything before it."""
+    element.clear()
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def scan_xml(file_path):
+    """Find if the xml has divs, its first nikaya and book headings,
+    and count its bolds, one element at a time."""
+
+    has_div = False
+    nikayas = []
+    books = []
+    bold_count = 0
+    note_depth = 0
+
+    for event, element in etree.iterparse(
+        str(file_path), events=("start", "end")
+    ):
+        if event == "start":
+            if element.tag == "div" and note_depth == 0:
+                has_div = True
+            elif element.tag == "note":
+                note_depth += 1
+            continue
+
+        if element.tag == "note":
+            note_depth -= 1
+        elif note_depth == 0:
+            rend = element.get("rend")
+            if element.tag == "hi" and rend == "bold":
+                bold_count += 1
+            elif element.tag == "p" and rend == "nikaya" and not nikayas:
+                nikayas.append(make_soup(element).p.string)
+            elif element.tag == "head" and rend == "book" and not books:
+                books.append(make_soup(element).head.string)
+
+        if element.tag in ["p", "head"]:
+            clear_element(element)
+
+    return has_div, nikayas, books, bold_count
+
+
+def iter_divs(file_path, types):
+    """Yield the soup of each outermost div of the types in the xml.
+    Divs of the types inside it are found in its soup."""
+
+    depth = 0
+    for event, element in etree.iterparse(
+        str(file_path), events=("start", "end")
+    ):
+        if element.tag == "div" and element.get("type") in types:
+            if event == "start":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    yield make_soup(element)
+                    clear_element(element)
+        elif event == "end" and depth == 0:
+            clear_element(element)
+
+
+def iter_paras(file_path):
+    """Yield the soup of each paragraph in the xml which is not in a note."""
+
+    note_depth = 0
+    for event, element in etree.iterparse(
+        str(file_path), events=("start", "end")
+    ):
+        if element.tag == "note":
+            note_depth += 1 if event == "start" else -1
+        elif event == "end" and element.tag == "p":
+            if note_depth == 0:
+                yield make_soup(element).p
+            clear_element(element)
+
+
+def extract_file(pth, file_name, ref_code):
+    """Extract the bold definitions of one xml file.
+    Return the definitions and a line of counts to print."""
+
+    bold_definitions_list = []
+    bold_count1 = 0
+    bold_count2 = 0
+    no_meaning_count = 0
+    nikaya, book, title, subhead = ["", "", "", ""]
+    
+    file_path = pth.cst_xml_roman_dir.joinpath(file_name)
+
+    # grab the number of bolds
+    has_div, nikayas, books, bold_count1 = scan_xml(file_path)
+
+    # grab the headings for suttas pitaka
+    if has_div:
+        line = f"{file_name}\t{ref_code}\thas div\t"
+
+        nikaya = nikayas[0]
+        book = books[0]
+
+        types = div_types
+        if file_name in ant:
+            types = ["book"]
+
+        for div_soup in iter_divs(file_path, types):
+            divs = div_soup.find_all("div", type=types)
 
             for div in divs:
                 paras = div.find_all("p")
@@ -105,7 +197,7 @@ def extract_bold_definitions(pth):
                             bold, bold_e, bold_comp, bold_n = get_bold_strings(bold)
                             
                             # only write substantial examples
-                            bold_comp_clean = re.sub("\\<b\\>|\\</b\\>", "", bold_comp)
+                            bold_comp_clean = bold_tags_regex.sub("", bold_comp)
                             if f"{bold}{bold_e}" == bold_comp_clean.strip():
                                 no_meaning_count +=1
                             elif bold_n in useless_endings:
@@ -118,42 +210,83 @@ def extract_bold_definitions(pth):
                                     bold_comp)]
                                 bold_count2 += 1
 
-            print(f"{bold_count1}\t{bold_count2}\t{no_meaning_count}")
-
-            bold_total += bold_count2
-                                
-        # for vinaya, khuddaka nikaya, vism
-        elif soup.div is None:
-            print("no div", end="\t")
-
-            paras = soup.find_all("p")
-
-            for para in paras:
-                nikaya, book, title, subhead = get_headings_no_div(para, file_name, nikaya, book, title, subhead)
-                
-                bolds = para.find_all("hi", rend="bold")
-                bolds = dissolve_empty_siblings(para, bolds)
-
-                for bold in bolds:
-                    if bold.next_sibling is not None:
-                        bold, bold_e, bold_comp, bold_n = get_bold_strings(bold)
-
-                        # only write substantial examples
-                        bold_comp_clean = re.sub("\\<b\\>|\\</b\\>", "", bold_comp)
-                        if f"{bold}{bold_e}" == bold_comp:
-                            no_meaning_count += 1
-                        elif bold_n in useless_endings:
-                            no_meaning_count += 1
-                            continue
-                        else:
-                            bold_definitions_list += [definition_to_dict(
-                                    file_name, ref_code, nikaya, book, 
-                                    title, subhead, bold, bold_e, 
-                                    bold_comp)]
-                            bold_count2 += 1
-    
-            print(f"{bold_count1}\t{bold_count2}\t{no_meaning_count}")
-            bold_total+= bold_count2
+    # for vinaya, khuddaka nikaya, vism
+    else:
+        line = f"{file_name}\t{ref_code}\tno div\t"
+
+        for para in iter_paras(file_path):
+            nikaya, book, title, subhead = get_headings_no_div(para, file_name, nikaya, book, title, subhead)
+            
+            bolds = para.find_all("hi", rend="bold")
+            bolds = dissolve_empty_siblings(para, bolds)
+
+            for bold in bolds:
+                if bold.next_sibling is not None:
+                    bold, bold_e, bold_comp, bold_n = get_bold_strings(bold)
+
+                    # only write substantial examples
+                    if f"{bold}{bold_e}" == bold_comp:
+                        no_meaning_count += 1
+                    elif bold_n in useless_endings:
+                        no_meaning_count += 1
+                        continue
+                    else:
+                        bold_definitions_list += [definition_to_dict(
+                                file_name, ref_code, nikaya, book, 
+                                title, subhead, bold, bold_e, 
+                                bold_comp)]
+                        bold_count2 += 1
+
+    line += f"{bold_count1}\t{bold_count2}\t{no_meaning_count}"
+    return bold_definitions_list, line
+
+
+def _extract_batch(pth, batch, results_list):
+    for file_index, file_name, ref_code in batch:
+        bold_definitions_list, line = extract_file(pth, file_name, ref_code)
+
+        # strings from the soup are pickled with their whole tree
+        bold_definitions_list = [
+            {k: str(v) if v is not None else v for k, v in definition.items()}
+            for definition in bold_definitions_list]
+        results_list.append((file_index, bold_definitions_list, line))
+
+
+def extract_bold_definitions(pth):
+    """extract commentary definitions from xml."""
+
+    p_green_title("extracting bold definitions")
+
+    files = [
+        (file_index, file_name, ref_code)
+        for file_index, (file_name, ref_code) in enumerate(file_list.items())]
+
+    # deal the files out in turn, so the big books are spread over the batches
+    num_logical_cores = psutil.cpu_count()
+    batches = [files[i::num_logical_cores] for i in range(num_logical_cores)]
+
+    processes: List[Process] = []
+    manager = Manager()
+    results_list: ListProxy = manager.list()
+
+    for batch in batches:
+        p = Process(target=_extract_batch, args=(pth, batch, results_list))
+        p.start()
+        processes.append(p)
+
+    for p in processes:
+        p.join()
+        if p.exitcode != 0:
+            p_red("extracting bold definitions failed")
+            sys.exit(1)
+
+    # merge in the order of the file list
+    bold_definitions_list = []
+    for __file_index__, file_definitions, line in sorted(
+        results_list, key=lambda x: x[0]
+    ):
+        print(line)
+        bold_definitions_list += file_definitions
     
     p_green("bold_total")
     p_yes(len(bold_definitions_list))
@@ -236,6 +236,11 @@ def dissolve_empty_siblings(para, bolds):
 	return bolds
 
 	
+title_number_regex = re.compile("^\\(\\d*\\) ")
+square_number_regex = re.compile("\\[\\d*\\]")
+leading_spaces_regex = re.compile("^ *")
+
+
 def get_nikaya_headings_div(file_name, div, para, subhead):
 	"""get headings for nikaya texts"""
 
@@ -251,7 +256,7 @@ def get_nikaya_headings_div(file_name, div, para, subhead):
 			title = div.head.string
 		except:
 			title = div.p.string
-		title = re.sub("^\\(\\d*\\) ", "", title)
+		title = title_number_regex.sub("", title)
 
 		if "subhead" in str(para):
 			subhead = para.string
@@ -277,9 +282,9 @@ def get_headings_no_div(para, file_name, nikaya, book, title, subhead):
 		subhead = para.string
 	if para["rend"] == "subsubhead":
 		subhead = para.string
-	if re.findall("\\[\\d*\\]", str(para)):
+	if square_number_regex.findall(str(para)):
 		subhead = para.string
-		subhead = re.sub("^ *", "", str(subhead))
+		subhead = leading_spaces_regex.sub("", str(subhead))
 	
 	jaa = ["s0513a2.att.xml", "s0513a3.att.xml"]
 	if file_name in jaa:
@@ -346,25 +351,47 @@ useless_beginnings_str = "|".join(useless_beginnings)
 useless_endings = ["  ti.", " ti.", "ti.", "'ti.", "nti.", "'nti.", "' nti.", "."]
 
 
+text_cleaner_regexes = [
+	(re.compile(pattern), replacement) for pattern, replacement in [
+		(" – ‘‘", ", "),
+		("^‘‘", ""),
+		("’’", "'"),
+		("‘", ""),
+		("’", "'"),
+		("‘‘", "'"),
+		("‘‘", ""),
+		(" ’", ""),
+		("'", "'"),
+		("'nti", "n'ti"),
+		("…pe॰…", " …"),
+		(" – ", ", "),
+		(" \\.", "."),
+		(" ,", ","),
+		(";", ","),
+		("'\\.", "."),
+		("\\॰", "."),
+		("  ", " "),
+	]]
+
+bold_tag_regex = re.compile("""\\<hi rend\\="bold">""")
+bold_tag_end_regex = re.compile("""<\\/hi>""")
+beginning_numbers_regexes = [
+	re.compile("^\\d+\\.d+\\."),
+	re.compile("^\\d+\\."),
+	re.compile("^\\d+ "),
+	re.compile("^\\d+"),
+]
+useless_beginnings_regex = re.compile(f"^({useless_beginnings_str})")
+only_space_regex = re.compile("^ $")
+non_letters = re.compile(" |,|\\.|;")
+space_before_ti_regex = re.compile(" *(ti)( |\\.)")
+useless_bold_n_regex = re.compile(f"^({useless_beginnings})$")
+trailing_sentences_regex = re.compile(" .+$")
+
+
 def text_cleaner(text):
-	text = re.sub(" – ‘‘", ", ", text)
-	text = re.sub("^‘‘", "", text)
-	text = re.sub("’’", "'", text)
-	text = re.sub("‘", "", text)
-	text = re.sub("’", "'", text)
-	text = re.sub("‘‘", "'", text)
-	text = re.sub("‘‘", "", text)
-	text = re.sub(" ’", "", text)
-	text = re.sub("'", "'", text)
-	text = re.sub("'nti", "n'ti", text)
-	text = re.sub("…pe॰…", " …", text)
-	text = re.sub(" – ", ", ", text)
-	text = re.sub(" \\.", ".", text)
-	text = re.sub(" ,", ",", text)
-	text = re.sub(";", ",", text)
-	text = re.sub("'\\.", ".", text)
-	text = re.sub("\\॰", ".", text)
-	text = re.sub("  ", " ", text)
+	for regex, replacement in text_cleaner_regexes:
+		text = regex.sub(replacement, text)
 	return text.lower()
 
 
@@ -377,9 +404,9 @@ def get_bold_strings(bold):
 
 	def simplify_bold_tag(text):
 		# simplify the tag
-		text = re.sub("""\\<hi rend\\="bold">""", "<b>", text)
+		text = bold_tag_regex.sub("<b>", text)
 		# simplify the tag end
-		text = re.sub("""<\\/hi>""", "</b>", text)
+		text = bold_tag_end_regex.sub("</b>", text)
 		return text
 	
 	bold_text = f"{bold}"
@@ -401,17 +428,14 @@ def get_bold_strings(bold):
 	bold_p = bold_p.strip()
 	
 	# remove numbers at the beginning
-	bold_p = re.sub("^\\d+\\.d+\\.", "", bold_p)
-	bold_p = re.sub("^\\d+\\.", "", bold_p)
-	bold_p = re.sub("^\\d+ ", "", bold_p)
-	bold_p = re.sub("^\\d+", "", bold_p)
+	for regex in beginning_numbers_regexes:
+		bold_p = regex.sub("", bold_p)
 
 	# remove useless_beginnings
-	bold_p = re.sub(f"^({useless_beginnings_str})", "", bold_p)
-	bold_p = re.sub("^ $", "", bold_p)
+	bold_p = useless_beginnings_regex.sub("", bold_p)
+	bold_p = only_space_regex.sub("", bold_p)
 
-	non_letters = re.compile(" |,|\\.|;")
-	if re.match(non_letters, bold_text):
+	if non_letters.match(bold_text):
 		bold_text = bold_text[1:]
 		bold_p = f"{bold_p} "
 	
@@ -438,10 +462,10 @@ def get_bold_strings(bold):
 	bold_n = simplify_bold_tag(bold_n)
 
 	# remove space before ti
-	bold_n = re.sub(" *(ti)( |\\.)", "\\1\\2", bold_n)
+	bold_n = space_before_ti_regex.sub("\\1\\2", bold_n)
 
 	# remove useless
-	bold_n = re.sub(f"^({useless_beginnings})$", "", bold_n)
+	bold_n = useless_bold_n_regex.sub("", bold_n)
 	bold_n = bold_n.replace("[iti bhagavā]", "")
 
 	if bold_n:
@@ -457,7 +481,7 @@ def get_bold_strings(bold):
 	bold_e = str(bold_n)
 
 	# remove trailing sentences
-	bold_e = re.sub(" .+$", "", str(bold_e))
+	bold_e = trailing_sentences_regex.sub("", str(bold_e))
 	bold_e = bold_e.replace("[iti bhagavā]", "")
 	bold_e = text_cleaner(bold_e)
 
@@ -31,7 +31,11 @@ def get_db_session(db_path: Path) -> Session:
         sys.exit(1)
 
     try:
-        db_eng = create_engine(f"sqlite+pysqlite:///{db_path}", echo=False)
+        # wait for other writers, build steps can run in parallel
+        db_eng = create_engine(
+            f"sqlite+pysqlite:///{db_path}",
+            echo=False,
+            connect_args={"timeout": 300})
         # db_conn = db_eng.connect()
 
         Session = sessionmaker(db_eng)
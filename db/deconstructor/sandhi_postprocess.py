@@ -5,22 +5,24 @@ Postprocess the results, find top five
 most likely candidates and save to database.
 """
 
-import numpy as np
+import json
 import pandas as pd
 import pickle
+import psutil
 
 from difflib import SequenceMatcher
+from multiprocessing import Process, Manager
+from multiprocessing.managers import ListProxy
 from rich import print
 
 from sqlalchemy.orm.session import Session
-from tools.lookup_is_another_value import is_another_value
-from tools.update_test_add import update_test_add
+from tools.lookup_diff import write_lookup_column
 
 from db.db_helpers import get_db_session
-from db.models import Lookup
 from tools.paths import ProjectPaths
 from tools.tic_toc import tic, toc
 from tools.configger import config_test
+from tools.utils import list_into_batches
 
 
 def main():
@@ -69,6 +71,16 @@ def process_matches(ADD_DO, pth: ProjectPaths, neg_inflections_set):
         matches_df = pd.concat([matches_df, matches_do_df], ignore_index=True)
 
     matches_df = matches_df.fillna("")
+    matches_df = sort_matches(matches_df, neg_inflections_set)
+
+    print("saving to matches_sorted.tsv")
+    matches_df.to_csv(pth.matches_sorted, sep="\t", index=None)
+
+    return matches_df
+
+
+def sort_matches(matches_df, neg_inflections_set):
+    """Add the features of each match, sort by them and drop duplicates."""
 
     print("adding manual")
     matches_df["manual"] = matches_df["process"].str.count("manual")
@@ -85,29 +97,8 @@ def process_matches(ADD_DO, pth: ProjectPaths, neg_inflections_set):
     print("adding word count")
     matches_df["count"] = matches_df.groupby("word")["word"].transform("size")
 
-    def calculate_ratio(original, split):
-        split = split.replace(" + ", "")
-        return SequenceMatcher(None, original, split).ratio()
-
-    print("adding difference ratio")
-    matches_df["ratio"] = np.vectorize(calculate_ratio)(
-        matches_df["split"], matches_df["split"]
-    )
-
-    print("adding neg_count")
-
-    def neg_counter(row):
-        neg_count = 0
-        if " + " in row["split"]:
-            word_list = row["split"].split(" + ")
-            # doesn't matter if the first word is negative
-            word_list.remove(word_list[0])
-            for word in word_list:
-                if word in neg_inflections_set:
-                    neg_count += 1
-        return neg_count
-
-    matches_df["neg_count"] = matches_df.apply(neg_counter, axis=1)
+    print("adding difference ratio and neg_count")
+    add_ratio_and_neg_count(matches_df, neg_inflections_set)
 
     print("sorting df values")
     matches_df.sort_values(
@@ -123,66 +114,103 @@ def process_matches(ADD_DO, pth: ProjectPaths, neg_inflections_set):
         subset=["word", "split"], keep="first", inplace=True, ignore_index=True
     )
 
-    print("saving to matches_sorted.tsv")
-    matches_df.to_csv(pth.matches_sorted, sep="\t", index=None)
-
     return matches_df
 
 
+def split_ratio(split: str) -> float:
+    """SequenceMatcher ratio of a split and the split without ' + '."""
+    joined = split.replace(" + ", "")
+    if joined == split and len(split) < 200:
+        # identical strings shorter than the autojunk limit always score 1
+        return 1.0
+    return SequenceMatcher(None, split, joined).ratio()
+
+
+def count_negatives(split: str, neg_inflections_set: set[str]) -> int:
+    """Count the negative inflections in a split.
+    It doesn't matter if the first word is negative."""
+    return sum(word in neg_inflections_set for word in split.split(" + ")[1:])
+
+
+def _score_batch(
+    splits: list[str],
+    neg_inflections_set: set[str],
+    results_list: ListProxy,
+    batch_idx: int
+) -> None:
+    ratios = [split_ratio(split) for split in splits]
+    neg_counts = [count_negatives(split, neg_inflections_set) for split in splits]
+    results_list.append((batch_idx, ratios, neg_counts))
+
+
+def add_ratio_and_neg_count(matches_df, neg_inflections_set):
+    """Add the ratio and neg_count columns. Each unique split is scored once,
+    in batches across all cores, and mapped back onto the rows."""
+
+    splits = matches_df["split"].unique().tolist()
+
+    num_logical_cores = psutil.cpu_count()
+    batches = list_into_batches(splits, num_logical_cores)
+
+    processes: list[Process] = []
+    manager = Manager()
+    results_list: ListProxy = manager.list()
+
+    for batch_idx, batch in enumerate(batches):
+        p = Process(
+            target=_score_batch,
+            args=(batch, neg_inflections_set, results_list, batch_idx))
+        p.start()
+        processes.append(p)
+
+    for p in processes:
+        p.join()
+
+    ratios: list[float] = []
+    neg_counts: list[int] = []
+    for __batch_idx__, batch_ratios, batch_neg_counts in sorted(
+        results_list, key=lambda x: x[0]
+    ):
+        ratios.extend(batch_ratios)
+        neg_counts.extend(batch_neg_counts)
+
+    matches_df["ratio"] = matches_df["split"].map(
+        dict(zip(splits, ratios))).astype("float64")
+    matches_df["neg_count"] = matches_df["split"].map(
+        dict(zip(splits, neg_counts))).astype("int64")
+
+
 def make_top_five_dict(matches_df):
-    print("[green]making top five dict", end=" ")
-    top_five_dict = {}
+    """The first five splits of each word in sorted order, which
+    have no more splits than the first one."""
 
-    for __index__, i in matches_df.iterrows():
-        if i.word not in top_five_dict:
-            top_five_dict[i.word] = {"splits": [i.split], "splitcount": i.splitcount}
-        else:
-            if len(top_five_dict[i.word]["splits"]) < 5:
-                if i.splitcount <= top_five_dict[i.word]["splitcount"]:
-                    top_five_dict[i.word]["splits"].append(i.split)
+    print("[green]making top five dict", end=" ")
 
-    # print(top_five_dict["ārammaṇamūlakasappāyakārīsuttā"])
+    first_splitcount = matches_df.groupby(
+        "word", sort=False)["splitcount"].transform("first")
+    top_five_df = matches_df[matches_df["splitcount"] <= first_splitcount]
+    top_five_df = top_five_df.groupby("word", sort=False).head(5)
 
-    # remove the splitcount
-    for key, value in top_five_dict.items():
-        top_five_dict[key] = value["splits"]
+    top_five_dict = {}
+    for word, split in zip(top_five_df["word"], top_five_df["split"]):
+        top_five_dict.setdefault(word, []).append(split)
 
     print(len(top_five_dict))
     return top_five_dict
 
 
 def add_to_dpd_db(db_session: Session, top_five_dict):
-    print("[green]adding to dpd_db", end=" ")
+    """Write only the deconstructions which differ from the db."""
 
-    lookup_table = (db_session.query(Lookup).all())
-    update_set, test_set, add_set = update_test_add(lookup_table, top_five_dict)
-
-    # update test add
-    for i in lookup_table:
-        if i.lookup_key in update_set:
-            i.deconstructor_pack(top_five_dict[i.lookup_key])
-        elif i.lookup_key in test_set:
-            if is_another_value(i, "deconstructor"):
-                i.deconstructor = ""
-            else:
-                db_session.delete(i) 
-
-    db_session.commit()
-
-    # add
-    add_to_db = []
-    for constructed, deconstructed in top_five_dict.items():
-        if constructed in add_set:
-            add_me = Lookup()
-            add_me.lookup_key = constructed
-            add_me.deconstructor_pack(deconstructed)
-            add_to_db.append(add_me)
+    print("[green]adding to dpd_db", end=" ")
 
-    db_session.add_all(add_to_db)
-    db_session.commit()
+    packed_dict = {
+        constructed: json.dumps(deconstructed, ensure_ascii=False)
+        for constructed, deconstructed in top_five_dict.items()}
+    counts = write_lookup_column(db_session, "deconstructor", packed_dict)
     db_session.close()
 
-    print(f"{len(add_to_db)}")
+    print(", ".join(f"{name} {count:,}" for name, count in counts.items()))
 
 
 def make_rule_counts(pth: ProjectPaths, matches_df):
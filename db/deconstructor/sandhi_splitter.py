@@ -3,18 +3,24 @@
 """Recursive algorithm to deconstruct compounds and split sandhi. """
 
 import cProfile
+import hashlib
 import logging
+import os
 import pandas as pd
 import pickle
+import psutil
 import re
+import shutil
 import time
 
+from multiprocessing import Process
+from pathlib import Path
 from rich import print
 from typing import Optional, Set, TypedDict, Union, Self
 from os import popen
 
 from tools.pali_alphabet import vowels, double_consonants
-from tools.tic_toc import tic, toc, bip, bop
+from tools.tic_toc import tic, toc
 from tools.paths import ProjectPaths
 from tools.configger import config_test
 
@@ -43,6 +49,7 @@ global max_recursions
 global profiler
 global profiler_on
 global max_word_length
+global max_candidates
 clean_list_max_length = 3
 fuzzy_list_max_length = 4
 clean_word_min_length = 2
@@ -52,6 +59,19 @@ max_recursions = 15
 profiler_on = False
 profiler: Optional[cProfile.Profile] = None
 max_word_length = 1000
+# the work budget of one word, counted in candidate splits tried
+max_candidates = 15_000
+
+# words per checkpoint flush
+checkpoint_every = 1000
+
+# memo of the candidate splits of each fragment, {(pass, fragment): candidates}
+# the candidates only depend on the fragment, the inflections and the rules,
+# so every pass finds them once and replays them in any word which has the
+# same fragment. the most recently used are kept between runs.
+global memo
+memo: dict[tuple[str, str], tuple] = {}
+memo_max_size = 500_000
 
 
 class Word:
@@ -65,7 +85,7 @@ class Word:
         self.matches = set()
         self.front = ""
         self.back = ""
-        self.start_time = time.time()
+        self.candidates = 0
 
     @property
     def comp(self):
@@ -73,7 +93,8 @@ class Word:
     
     @property
     def overtime(self):
-        return time.time() - self.start_time > 10
+        """The work budget is spent, which is the same on any machine."""
+        return self.candidates >= max_candidates
 
     def copy_class(self):
         word_copy = Word.__new__(Word)
@@ -163,13 +184,24 @@ def setup(pth: ProjectPaths):
         all_inflections_nolast) = make_all_inflections_nfl_nll(
             all_inflections_set)
 
-    # initalise matches.csv
-    with open(pth.matches_path, "w") as f:
-        f.write("")
+    global rules_index
+    rules_index = make_rules_index(rules)
 
-    # initalise timer dict
-    with open(pth.sandhi_timer_path, "w") as f:
-        f.write("")
+    global memo
+    memo = load_memo(pth.sandhi_memo_path, make_memo_stamp(pth))
+
+
+# the globals made by setup which the workers read
+worker_assets = [
+    "rules", "rules_index", "unmatched_set", "all_inflections_set",
+    "all_inflections_nofirst", "all_inflections_nolast", "memo"]
+
+
+def setup_logging(log_path: Path) -> None:
+    logging.basicConfig(
+        filename=log_path, level=logging.INFO, 
+        format='%(asctime)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S')
 
 
 def import_sandhi_rules(pth: ProjectPaths):
@@ -230,6 +262,80 @@ def make_all_inflections_nfl_nll(all_inflections_set):
     return all_inflections_nofirst, all_inflections_nolast
 
 
+def make_rules_index(sandhi_rules) -> dict[tuple[str, str], list]:
+    """{(chA, chB): [(rule, ch1, ch2)]} in rule order,
+    to find the rules of a letter pair without looping through them all."""
+
+    rules_index: dict[tuple[str, str], list] = {}
+    for rule, values in sandhi_rules.items():
+        rules_index.setdefault(
+            (values["chA"], values["chB"]), []).append(
+                (rule, values["ch1"], values["ch2"]))
+    return rules_index
+
+
+# memo
+
+def memoized(context: str, fragment: str, find_candidates) -> tuple:
+    """The candidates of a fragment in a pass, found once."""
+
+    key = (context, fragment)
+    candidates = memo.pop(key, None)
+    if candidates is None:
+        candidates = tuple(find_candidates(fragment))
+        if len(memo) >= memo_max_size:
+            # drop the least recently used
+            del memo[next(iter(memo))]
+    memo[key] = candidates
+    return candidates
+
+
+def make_memo_stamp(pth: ProjectPaths) -> str:
+    """Hash of everything the candidates depend on."""
+
+    stamp = hashlib.blake2b(digest_size=16)
+    for path in [pth.all_inflections_set_path, pth.sandhi_rules_path]:
+        with open(path, "rb") as f:
+            stamp.update(f.read())
+    stamp.update(repr((
+        clean_list_max_length, fuzzy_list_max_length,
+        clean_word_min_length, fuzzy_word_min_length)).encode())
+    return stamp.hexdigest()
+
+
+def load_memo(memo_path: Path, memo_stamp: str) -> dict:
+    """The memo of the last run, or an empty one if its inputs have changed."""
+
+    if memo_path.exists():
+        with open(memo_path, "rb") as f:
+            saved_stamp, saved_memo = pickle.load(f)
+        if saved_stamp == memo_stamp:
+            print(f"[green]loading memo [white]{len(saved_memo):,}")
+            return saved_memo
+    return {}
+
+
+def save_memo(memo_path: Path, memo_stamp: str, shard_paths: list[Path]) -> None:
+    """Merge the memos of the workers and keep the most recently used."""
+
+    merged = dict(memo)
+    for shard_path in shard_paths:
+        with open(shard_path, "rb") as f:
+            shard_memo = pickle.load(f)
+        for key, candidates in shard_memo.items():
+            merged.pop(key, None)
+            merged[key] = candidates
+
+    excess = len(merged) - memo_max_size
+    if excess > 0:
+        for key in list(merged)[:excess]:
+            del merged[key]
+
+    with open(memo_path, "wb") as f:
+        pickle.dump((memo_stamp, merged), f)
+    print(f"[green]saving memo [white]{len(merged):,}")
+
+
 def main():
     tic()
     print("[bright_yellow]sandhi splitter")
@@ -251,73 +357,69 @@ def main():
     pth = ProjectPaths()
 
     # logging
-    logging.basicConfig(
-        filename=pth.sandhi_log_path, level=logging.INFO, 
-        format='%(asctime)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S')
+    setup_logging(pth.sandhi_log_path)
 
     # make globally accessible variables
     setup(pth)
 
-    global matches_dict
     with open(pth.matches_dict_path, "rb") as f:
-        matches_dict = pickle.load(f)
+        setup_matches_dict = pickle.load(f)
 
-    time_dict = {}
+    words = sorted(unmatched_set)
     global unmatched_len_init
-    unmatched_len_init = len(unmatched_set)
-
-    print(f"[green]splitting sandhi [white]{unmatched_len_init:,}")
-
-    for counter, word in enumerate(unmatched_set.copy()):
-
-        bip()
-        logging.info(word)
-
-        global w
-        w = Word(word)
-        matches_dict[word] = []
-
-        # d is a dictionary of data accessed using dot notation
-        d = DotDict(default_dot_dict_init(counter, word))
-
-        # two word sandhi
-        d = two_word_sandhi(d)
-
-        # iti + assa / assā
-        if d.word.endswith(("tissa", "tissā")):
-            d = remove_tissa(d)
-
-        # three word sandhi
-        if not w.matches:
-            d = three_word_sandhi(d)
-
-        # # recursive removal
-        if not w.matches:
-            recursive_removal(d)
-
-        time_dict[word] = bop()
-
-        if d.count % 1000 == 0:
-            print(
-                f"{d.count:>10,} / {unmatched_len_init:<10,}{d.word}")
-
-            save_matches(pth, matches_dict)
-            try:
-                save_timer_dict(pth, time_dict)
-            except KeyError:
-                pass
-            matches_dict = {}
-            time_dict = {}     
-
-    save_matches(pth, matches_dict)
-
-    try:
-        save_timer_dict(pth, time_dict)
-    except KeyError as e:
-        print(f"[red] {e}")
-
-    summary(pth)
+    unmatched_len_init = len(words)
+
+    checkpoint_dir = pth.sandhi_checkpoint_dir
+    done_dict = load_checkpoint(checkpoint_dir, make_run_stamp(pth))
+    words_to_split = [word for word in words if word not in done_dict]
+
+    print(f"[green]splitting sandhi [white]{len(words_to_split):,} / {unmatched_len_init:,}")
+    if done_dict:
+        print(f"[green]resuming from checkpoint [white]{len(done_dict):,}")
+
+    if words_to_split:
+        num_logical_cores = psutil.cpu_count()
+        print(f"[green]running with [white]{num_logical_cores} [green]cores")
+
+        # every run writes its own files
+        run_number = len(list(checkpoint_dir.glob("run_*")))
+        (checkpoint_dir / f"run_{run_number}").touch()
+
+        # the assets are passed to the workers, so they are set up the same
+        # whether the workers are forked or spawned
+        assets = {name: globals()[name] for name in worker_assets}
+
+        # interleave the words so each worker gets a fair share of long ones
+        processes: list[Process] = []
+        for shard_idx in range(num_logical_cores):
+            shard = words_to_split[shard_idx::num_logical_cores]
+            if shard:
+                p = Process(
+                    target=_split_shard,
+                    args=(
+                        checkpoint_dir, f"{run_number}_{shard_idx}", shard,
+                        assets, pth.sandhi_log_path))
+                p.start()
+                processes.append(p)
+
+        for p in processes:
+            p.join()
+
+        save_memo(
+            pth.sandhi_memo_path, make_memo_stamp(pth),
+            sorted(checkpoint_dir.glob(f"{run_number}_*.memo")))
+
+        done_dict = load_checkpoint(checkpoint_dir, make_run_stamp(pth))
+
+    missing = [word for word in words if word not in done_dict]
+    if missing:
+        raise RuntimeError(
+            f"{len(missing):,} words were not split, run again to resume")
+
+    save_matches(pth, setup_matches_dict, words, done_dict)
+    save_timer_dict(pth, done_dict)
+    summary(pth, words, done_dict)
+    shutil.rmtree(checkpoint_dir)
     toc()
 
     if profiler is not None:
@@ -328,28 +430,179 @@ def main():
             popen("tuna profiler.prof")
 
 
-def save_matches(pth: ProjectPaths, matches_dict):
+def split_word(word: str) -> list[tuple[str, str, str, str]]:
+    """Find all the matches of one word, within its work budget."""
+
+    global w
+    global matches_dict
+    w = Word(word)
+    matches_dict = {word: []}
+
+    # d is a dictionary of data accessed using dot notation
+    d = DotDict(default_dot_dict_init(w.count, word))
+
+    # two word sandhi
+    d = two_word_sandhi(d)
+
+    # iti + assa / assā
+    if d.word.endswith(("tissa", "tissā")):
+        d = remove_tissa(d)
+
+    # three word sandhi
+    if not w.matches:
+        d = three_word_sandhi(d)
+
+    # # recursive removal
+    if not w.matches:
+        recursive_removal(d)
+
+    return matches_dict[word]
+
+
+# checkpoint
+# each worker appends the matches of every word to a .tsv file,
+# and after they are flushed, the word to a .done file.
+# only matches of words in the .done file of the same run are kept.
+
+def make_run_stamp(pth: ProjectPaths) -> str:
+    """Hash of the inputs and dampers, so a checkpoint is only resumed
+    with exactly the same inputs."""
+
+    stamp = hashlib.blake2b(digest_size=16)
+    for path in [
+        pth.unmatched_set_path,
+        pth.all_inflections_set_path,
+        pth.sandhi_rules_path
+    ]:
+        with open(path, "rb") as f:
+            stamp.update(f.read())
+    stamp.update(repr((
+        clean_list_max_length, fuzzy_list_max_length,
+        clean_word_min_length, fuzzy_word_min_length,
+        max_matches, max_recursions, max_candidates)).encode())
+    return stamp.hexdigest()
+
+
+def load_checkpoint(
+    checkpoint_dir: Path,
+    run_stamp: str
+) -> dict[str, tuple[list[str], str, int]]:
+    """{word: (match rows, seconds, candidates)} of all the words done so far.
+    Start a new checkpoint if the inputs have changed."""
+
+    stamp_path = checkpoint_dir / "stamp"
+    if not stamp_path.exists() or stamp_path.read_text() != run_stamp:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        checkpoint_dir.mkdir(parents=True)
+        stamp_path.write_text(run_stamp)
+        return {}
+
+    done_dict: dict[str, tuple[list[str], str, int]] = {}
+    for done_path in sorted(checkpoint_dir.glob("*.done")):
+        run_done: dict[str, tuple[list[str], str, int]] = {}
+        with open(done_path) as f:
+            for line in f:
+                if line.endswith("\n"):
+                    word, seconds, candidates = line[:-1].split("\t")
+                    run_done[word] = ([], seconds, int(candidates))
+        with open(done_path.with_suffix(".tsv")) as f:
+            for line in f:
+                word = line.split("\t", 1)[0]
+                if word in run_done and line.endswith("\n"):
+                    run_done[word][0].append(line)
+        done_dict.update(run_done)
+
+    return done_dict
+
+
+def _split_shard(
+    checkpoint_dir: Path,
+    run_id: str,
+    words: list[str],
+    assets: dict,
+    log_path: Path
+) -> None:
+    """Split a shard of words, writing a checkpoint every so often."""
+
+    globals().update(assets)
+    setup_logging(log_path)
+
+    matches_path = checkpoint_dir / f"{run_id}.tsv"
+    done_path = checkpoint_dir / f"{run_id}.done"
+    matches_lines: list[str] = []
+    done_lines: list[str] = []
+
+    def flush() -> None:
+        with open(matches_path, "a") as f:
+            f.writelines(matches_lines)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(done_path, "a") as f:
+            f.writelines(done_lines)
+        matches_lines.clear()
+        done_lines.clear()
+
+    for counter, word in enumerate(words):
+        logging.info(word)
+        start = time.perf_counter()
+        matches = split_word(word)
+        seconds = time.perf_counter() - start
+
+        for item in matches:
+            matches_lines.append(make_matches_line(word, item))
+        done_lines.append(f"{word}\t{seconds:.3f}\t{w.candidates}\n")
+
+        if (counter + 1) % checkpoint_every == 0:
+            flush()
+            print(f"{run_id:>4}{counter + 1:>10,} / {len(words):<10,}{word}")
 
-    with open(pth.matches_path, "a") as f:
-        for word, data in matches_dict.items():
-            for item in data:
-                f.write(f"{word}\t")
-                for column in item:
-                    f.write(f"{column}\t")
-                f.write("\n")
+    flush()
 
+    with open(checkpoint_dir / f"{run_id}.memo", "wb") as f:
+        pickle.dump(memo, f)
 
-def save_timer_dict(pth: ProjectPaths, time_dict):
-    df = pd.DataFrame.from_dict(time_dict, orient="index")
-    df = df.sort_values(by=0, ascending=False)
-    df.to_csv(
-        pth.sandhi_timer_path, mode="a", header=False, sep="\t")
+
+def make_matches_line(word: str, item: tuple) -> str:
+    columns = "".join(f"{column}\t" for column in item)
+    return f"{word}\t{columns}\n"
+
+
+def save_matches(
+    pth: ProjectPaths,
+    setup_matches_dict: dict,
+    words: list[str],
+    done_dict: dict[str, tuple[list[str], str, int]]
+) -> None:
+    """Write the matches from sandhi setup, then the matches of every word
+    in sorted order."""
+
+    words_set = set(words)
+    with open(pth.matches_path, "w") as f:
+        for word, data in setup_matches_dict.items():
+            if word not in words_set:
+                for item in data:
+                    f.write(make_matches_line(word, item))
+        for word in words:
+            f.writelines(done_dict[word][0])
+
+
+def save_timer_dict(
+    pth: ProjectPaths,
+    done_dict: dict[str, tuple[list[str], str, int]]
+) -> None:
+    """Seconds and candidates tried of every word, slowest first."""
+    timer_list = sorted(
+        done_dict.items(), key=lambda x: (-float(x[1][1]), x[0]))
+    with open(pth.sandhi_timer_path, "w") as f:
+        for word, (__lines__, seconds, candidates) in timer_list:
+            f.write(f"{word}\t{seconds}\t{candidates}\n")
 
 
 def recursive_removal(d: DotDict) -> None:
 
     if w.overtime:
         return
+    w.candidates += 1
 
     d.processes += 1
 
@@ -741,62 +994,60 @@ def remove_apievaiti(d: DotDict) -> DotDict:
 
     if comp(d) not in w.matches:
 
-        try:
-            if d.word[-3] in vowels:
-                wordA = d.word[:-3]
-                wordB = d.word[-3:]
+        for word1, word2, rule, word in memoized(
+                "apievaiti", d.word, find_apievaiti):
+            d.word = word
+            d.back = f" + {word2}{d.back}"
+            d.comm = "apievaiti"
+            d.rules_back = f"{rule+2},{d.rules_back}"
+            d.path += " > apievaiti"
+
+            if d.word in all_inflections_set:
+                d.comm = f"match! = {comp(d)}"
+
+                if comp(d) not in w.matches:
+                    matches_dict[d.init] += [
+                        (comp(d), "xword-pi", "apievaiti", d.path)]
+                    w.matches.add(comp(d))
+                    d.matches.add(comp(d))
+                    unmatched_set.discard(d.init)
 
             else:
-                wordA = d.word[:-2]
-                wordB = d.word[-2:]
-
-        except Exception:
-            wordA = d.word[:-2]
-            wordB = d.word[-2:]
-
-        for rule in rules:
-            chA = rules[rule]["chA"]
-            chB = rules[rule]["chB"]
-            ch1 = rules[rule]["ch1"]
-            ch2 = rules[rule]["ch2"]
-
-            try:
-                wordA_lastletter = wordA[-1]
-            except Exception:
-                wordA_lastletter = wordA
-            wordB_firstletter = wordB[0]
-
-            if (wordA_lastletter == chA and
-                    wordB_firstletter == chB):
-                word1 = wordA[:-1] + ch1
-                word2 = ch2 + wordB[1:]
-
-                if word2 in ["api", "eva", "iti"]:
-                    d.word = d.word.replace(wordB, "")
-                    d.word = d.word.replace(wordA, word1)
-                    d.back = f" + {word2}{d.back}"
-                    d.comm = "apievaiti"
-                    d.rules_back = f"{rule+2},{d.rules_back}"
-                    d.path += " > apievaiti"
-
-                    if d.word in all_inflections_set:
-                        d.comm = f"match! = {comp(d)}"
-
-                        if comp(d) not in w.matches:
-                            matches_dict[d.init] += [
-                                (comp(d), "xword-pi", "apievaiti", d.path)]
-                            w.matches.add(comp(d))
-                            d.matches.add(comp(d))
-                            unmatched_set.discard(d.init)
-
-                    else:
-                        recursive_removal(d)
-
-                    d = DotDict(d_orig)
+                recursive_removal(d)
+
+            d = DotDict(d_orig)
 
     return d_orig
 
 
+def find_apievaiti(word: str) -> list[tuple[str, str, int, str]]:
+    """(word1, api eva or iti, rule, remaining word) of a fragment"""
+
+    try:
+        if word[-3] in vowels:
+            wordA = word[:-3]
+            wordB = word[-3:]
+
+        else:
+            wordA = word[:-2]
+            wordB = word[-2:]
+
+    except Exception:
+        wordA = word[:-2]
+        wordB = word[-2:]
+
+    candidates = []
+    for rule, ch1, ch2 in rules_index.get((wordA[-1:], wordB[:1]), []):
+        word1 = wordA[:-1] + ch1
+        word2 = ch2 + wordB[1:]
+
+        if word2 in ["api", "eva", "iti"]:
+            remaining = word.replace(wordB, "").replace(wordA, word1)
+            candidates.append((word1, word2, rule, remaining))
+
+    return candidates
+
+
 def remove_lwff_clean(d: DotDict) -> DotDict:
     """make a list of the longest clean words from the front then
     1. match 2. recurse or 3. pass through"""
@@ -805,39 +1056,47 @@ def remove_lwff_clean(d: DotDict) -> DotDict:
 
     if comp(d) not in w.matches:
 
-        lwff_clean_list = []
+        for lwff_clean, word in memoized(
+                "lwff_clean", d.word, find_lwff_clean):
+            d.path += " > front_clean"
+            d.word = word
+            d.front = f"{d.front}{lwff_clean} + "
+            d.comm = f"lwff_clean [yellow]{lwff_clean}"
+            d.rules_front += "0,"
+
+            if d.word in all_inflections_set:
+
+                if comp(d) not in w.matches:
+                    matches_dict[d.init] += [(
+                        comp(d), "xword-lwff",
+                        f"{comp_rules(d)}", d.path)]
+                    w.matches.add(comp(d))
+                    unmatched_set.discard(d.init)
 
-        for i in range(len(d.word)):
-            if d.word[:-i] in all_inflections_set:
-                lwff_clean_list.append(d.word[:-i])
+            else:
+                d.comm = f"recursing lwff_clean [yellow]{comp(d)}"
+                recursive_removal(d)
 
-        lwff_clean_list = lwff_clean_list[:clean_list_max_length]
+            d = DotDict(d_orig)
 
-        for lwff_clean in lwff_clean_list:
+    return d_orig
 
-            if len(lwff_clean) >= clean_word_min_length:
-                d.path += " > front_clean"
-                d.word = re.sub(f"^{lwff_clean}", "", d.word, count=1)
-                d.front = f"{d.front}{lwff_clean} + "
-                d.comm = f"lwff_clean [yellow]{lwff_clean}"
-                d.rules_front += "0,"
 
-                if d.word in all_inflections_set:
+def find_lwff_clean(word: str) -> list[tuple[str, str]]:
+    """(longest clean word from the front, remaining word) of a fragment"""
 
-                    if comp(d) not in w.matches:
-                        matches_dict[d.init] += [(
-                            comp(d), "xword-lwff",
-                            f"{comp_rules(d)}", d.path)]
-                        w.matches.add(comp(d))
-                        unmatched_set.discard(d.init)
+    lwff_clean_list = []
 
-                else:
-                    d.comm = f"recursing lwff_clean [yellow]{comp(d)}"
-                    recursive_removal(d)
+    for i in range(len(word)):
+        if word[:-i] in all_inflections_set:
+            lwff_clean_list.append(word[:-i])
 
-                d = DotDict(d_orig)
+    lwff_clean_list = lwff_clean_list[:clean_list_max_length]
 
-    return d_orig
+    return [
+        (lwff_clean, re.sub(f"^{lwff_clean}", "", word, count=1))
+        for lwff_clean in lwff_clean_list
+        if len(lwff_clean) >= clean_word_min_length]
 
 
 def remove_lwfb_clean(d: DotDict) -> DotDict:
@@ -848,38 +1107,46 @@ def remove_lwfb_clean(d: DotDict) -> DotDict:
 
     if comp(d) not in w.matches:
 
-        lwfb_clean_list = []
+        for lwfb_clean, word in memoized(
+                "lwfb_clean", d.word, find_lwfb_clean):
+            d.path += " > back_clean"
+            d.word = word
+            d.back = f" + {lwfb_clean}{d.back}"
+            d.comm = f"lwfb_clean [yellow]{lwfb_clean}"
+            d.rules_back = f"0,{d.rules_back}"
 
-        for i in range(len(d.word)):
-            if d.word[i:] in all_inflections_set:
-                lwfb_clean_list.append(d.word[i:])
+            if d.word in all_inflections_set:
+                if comp(d) not in w.matches:
+                    matches_dict[d.init] += [(
+                        comp(d), "xword-lwfb", f"{comp_rules(d)}", d.path)]
+                    w.matches.add(comp(d))
+                    d.matches.add(comp(d))
+                    unmatched_set.discard(d.init)
 
-        lwfb_clean_list = lwfb_clean_list[:clean_list_max_length]
+            else:
+                d.comm = f"recursing lfwb_clean [yellow]{comp(d)}"
+                recursive_removal(d)
 
-        for lwfb_clean in lwfb_clean_list:
+            d = DotDict(d_orig)
 
-            if len(lwfb_clean) >= clean_word_min_length:
-                d.path += " > back_clean"
-                d.word = re.sub(f"{lwfb_clean}$", "", d.word, count=1)
-                d.back = f" + {lwfb_clean}{d.back}"
-                d.comm = f"lwfb_clean [yellow]{lwfb_clean}"
-                d.rules_back = f"0,{d.rules_back}"
+    return d_orig
 
-                if d.word in all_inflections_set:
-                    if comp(d) not in w.matches:
-                        matches_dict[d.init] += [(
-                            comp(d), "xword-lwfb", f"{comp_rules(d)}", d.path)]
-                        w.matches.add(comp(d))
-                        d.matches.add(comp(d))
-                        unmatched_set.discard(d.init)
 
-                else:
-                    d.comm = f"recursing lfwb_clean [yellow]{comp(d)}"
-                    recursive_removal(d)
+def find_lwfb_clean(word: str) -> list[tuple[str, str]]:
+    """(longest clean word from the back, remaining word) of a fragment"""
 
-                d = DotDict(d_orig)
+    lwfb_clean_list = []
 
-    return d_orig
+    for i in range(len(word)):
+        if word[i:] in all_inflections_set:
+            lwfb_clean_list.append(word[i:])
+
+    lwfb_clean_list = lwfb_clean_list[:clean_list_max_length]
+
+    return [
+        (lwfb_clean, re.sub(f"{lwfb_clean}$", "", word, count=1))
+        for lwfb_clean in lwfb_clean_list
+        if len(lwfb_clean) >= clean_word_min_length]
 
 
 def remove_lwff_fuzzy(d: DotDict) -> DotDict:
@@ -890,73 +1157,70 @@ def remove_lwff_fuzzy(d: DotDict) -> DotDict:
 
     if comp(d) not in d.matches:
 
-        lwff_fuzzy_list = []
-
-        if len(d.word) >= fuzzy_word_min_length:
-            for i in range(len(d.word)):
-                fuzzy_word = d.word[:-i]
-
-                if (fuzzy_word in all_inflections_nolast or
-                        fuzzy_word in all_inflections_set):
-                    lwff_fuzzy_list.append(fuzzy_word)
-
-        lwff_fuzzy_list = lwff_fuzzy_list[:fuzzy_list_max_length]
-
-        for lwff_fuzzy in lwff_fuzzy_list:
-
-            if len(lwff_fuzzy) >= fuzzy_word_min_length:
-
-                wordA_fuzzy = lwff_fuzzy
-                wordB_fuzzy = re.sub(f"^{wordA_fuzzy}", "", d.word, count=1)
-
-                try:
-                    wordA_lastletter = wordA_fuzzy[-1]
-                except Exception:
-                    wordA_lastletter = ""
-                try:
-                    wordB_firstletter = wordB_fuzzy[0]
-                except Exception:
-                    wordB_firstletter = ""
-
-                for rule in rules:
-                    chA = rules[rule]["chA"]
-                    chB = rules[rule]["chB"]
-                    ch1 = rules[rule]["ch1"]
-                    ch2 = rules[rule]["ch2"]
-
-                    if (wordA_lastletter == chA and
-                            wordB_firstletter == chB):
-                        word1 = wordA_fuzzy[:-1] + ch1
-                        word2 = ch2 + wordB_fuzzy[1:]
-
-                        if word1 in all_inflections_set:
-                            d.path += " > front_fuzzy"
-                            d.word = re.sub(
-                                f"^{wordA_fuzzy}", "", d.word, count=1)
-                            d.word = re.sub(
-                                f"^{wordB_fuzzy}", word2, d.word, count=1)
-                            d.front = f"{d.front}{word1} + "
-                            d.comm = f"lwff_fuzzy [yellow]{word1} + {word2}"
-                            d.rules_front += f"{rule+2},"
-
-                            if d.word in all_inflections_set:
-                                if comp(d) not in w.matches:
-                                    matches_dict[d.init] += [(
-                                        comp(d), "xword-fff",
-                                        f"{comp_rules(d)}", d.path)]
-                                    w.matches.add(comp(d))
-                                    d.matches.add(comp(d))
-                                    unmatched_set.discard(d.init)
-
-                            else:
-                                d.comm = f"recursing lwff_fuzzy {comp(d)}"
-                                recursive_removal(d)
-
-                            d = DotDict(d_orig)
+        for word1, word2, rule, word in memoized(
+                "lwff_fuzzy", d.word, find_lwff_fuzzy):
+            d.path += " > front_fuzzy"
+            d.word = word
+            d.front = f"{d.front}{word1} + "
+            d.comm = f"lwff_fuzzy [yellow]{word1} + {word2}"
+            d.rules_front += f"{rule+2},"
+
+            if d.word in all_inflections_set:
+                if comp(d) not in w.matches:
+                    matches_dict[d.init] += [(
+                        comp(d), "xword-fff",
+                        f"{comp_rules(d)}", d.path)]
+                    w.matches.add(comp(d))
+                    d.matches.add(comp(d))
+                    unmatched_set.discard(d.init)
+
+            else:
+                d.comm = f"recursing lwff_fuzzy {comp(d)}"
+                recursive_removal(d)
+
+            d = DotDict(d_orig)
 
     return d_orig
 
 
+def find_lwff_fuzzy(word: str) -> list[tuple[str, str, int, str]]:
+    """(word1, word2, rule, remaining word) of the longest fuzzy words
+    from the front of a fragment"""
+
+    lwff_fuzzy_list = []
+
+    if len(word) >= fuzzy_word_min_length:
+        for i in range(len(word)):
+            fuzzy_word = word[:-i]
+
+            if (fuzzy_word in all_inflections_nolast or
+                    fuzzy_word in all_inflections_set):
+                lwff_fuzzy_list.append(fuzzy_word)
+
+    lwff_fuzzy_list = lwff_fuzzy_list[:fuzzy_list_max_length]
+
+    candidates = []
+    for lwff_fuzzy in lwff_fuzzy_list:
+
+        if len(lwff_fuzzy) >= fuzzy_word_min_length:
+
+            wordA_fuzzy = lwff_fuzzy
+            wordB_fuzzy = re.sub(f"^{wordA_fuzzy}", "", word, count=1)
+
+            for rule, ch1, ch2 in rules_index.get(
+                    (wordA_fuzzy[-1:], wordB_fuzzy[:1]), []):
+                word1 = wordA_fuzzy[:-1] + ch1
+                word2 = ch2 + wordB_fuzzy[1:]
+
+                if word1 in all_inflections_set:
+                    remaining = re.sub(f"^{wordA_fuzzy}", "", word, count=1)
+                    remaining = re.sub(
+                        f"^{wordB_fuzzy}", word2, remaining, count=1)
+                    candidates.append((word1, word2, rule, remaining))
+
+    return candidates
+
+
 def remove_lwfb_fuzzy(d: DotDict) -> DotDict:
     """make a list of the longest fuzzy words from the back then
     1. match 2. recurse or 3. pass through"""
@@ -965,74 +1229,69 @@ def remove_lwfb_fuzzy(d: DotDict) -> DotDict:
 
     if comp(d) not in w.matches:
 
-        lwfb_fuzzy_list = []
-
-        if len(d.word) > 0:
-            for i in range(len(d.word)):
-                fuzzy_word = d.word[i:]
-
-                if (fuzzy_word in all_inflections_nofirst or
-                        fuzzy_word in all_inflections_set):
-                    lwfb_fuzzy_list.append(fuzzy_word)
-
-        lwfb_fuzzy_list = lwfb_fuzzy_list[:fuzzy_list_max_length]
-
-        for lwfb_fuzzy in lwfb_fuzzy_list:
-
-            if len(lwfb_fuzzy) >= fuzzy_word_min_length:
-                wordA_fuzzy = re.sub(f"{lwfb_fuzzy}$", "", d.word, count=1)
-                wordB_fuzzy = lwfb_fuzzy
-
-                try:
-                    wordA_lastletter = wordA_fuzzy[-1]
-                except Exception:
-                    wordA_lastletter = ""
-                try:
-                    wordB_firstletter = wordB_fuzzy[0]
-                except Exception:
-                    wordB_firstletter = ""
-
-                for rule in rules:
-                    chA = rules[rule]["chA"]
-                    chB = rules[rule]["chB"]
-                    ch1 = rules[rule]["ch1"]
-                    ch2 = rules[rule]["ch2"]
-
-                    if (wordA_lastletter == chA and
-                            wordB_firstletter == chB):
-                        word1 = wordA_fuzzy[:-1] + ch1
-                        word2 = ch2 + wordB_fuzzy[1:]
-
-                        if word2 in all_inflections_set:
-                            d.path += " > back_fuzzy"
-                            d.word = re.sub(
-                                f"{wordB_fuzzy}$", "", d.word, count=1)
-                            d.word = re.sub(
-                                f"{wordA_fuzzy}$", word1, d.word, count=1)
-                            # d.back = re.sub(
-                            #     f"{wordB_fuzzy}$", word2, d.back, count=1)
-                            d.back = f" + {word2}{d.back}"
-                            d.comm = f"lwfb_fuzzy [yellow]{word1} + {word2}"
-                            d.rules_back = f"{rule+2},{d.rules_back}"
-
-                            if d.word in all_inflections_set:
-                                if comp(d) not in w.matches:
-                                    matches_dict[d.init] += [(
-                                        comp(d), "xword-fbf",
-                                        f"{comp_rules(d)}", d.path)]
-                                    w.matches.add(comp(d))
-                                    d.matches.add(comp(d))
-                                    unmatched_set.discard(d.init)
-
-                            else:
-                                d.comm = f"recursing lwfb_fuzzy {comp(d)}"
-                                recursive_removal(d)
-
-                            d = DotDict(d_orig)
+        for word1, word2, rule, word in memoized(
+                "lwfb_fuzzy", d.word, find_lwfb_fuzzy):
+            d.path += " > back_fuzzy"
+            d.word = word
+            d.back = f" + {word2}{d.back}"
+            d.comm = f"lwfb_fuzzy [yellow]{word1} + {word2}"
+            d.rules_back = f"{rule+2},{d.rules_back}"
+
+            if d.word in all_inflections_set:
+                if comp(d) not in w.matches:
+                    matches_dict[d.init] += [(
+                        comp(d), "xword-fbf",
+                        f"{comp_rules(d)}", d.path)]
+                    w.matches.add(comp(d))
+                    d.matches.add(comp(d))
+                    unmatched_set.discard(d.init)
+
+            else:
+                d.comm = f"recursing lwfb_fuzzy {comp(d)}"
+                recursive_removal(d)
+
+            d = DotDict(d_orig)
 
     return d_orig
 
 
+def find_lwfb_fuzzy(word: str) -> list[tuple[str, str, int, str]]:
+    """(word1, word2, rule, remaining word) of the longest fuzzy words
+    from the back of a fragment"""
+
+    lwfb_fuzzy_list = []
+
+    if len(word) > 0:
+        for i in range(len(word)):
+            fuzzy_word = word[i:]
+
+            if (fuzzy_word in all_inflections_nofirst or
+                    fuzzy_word in all_inflections_set):
+                lwfb_fuzzy_list.append(fuzzy_word)
+
+    lwfb_fuzzy_list = lwfb_fuzzy_list[:fuzzy_list_max_length]
+
+    candidates = []
+    for lwfb_fuzzy in lwfb_fuzzy_list:
+
+        if len(lwfb_fuzzy) >= fuzzy_word_min_length:
+            wordA_fuzzy = re.sub(f"{lwfb_fuzzy}$", "", word, count=1)
+            wordB_fuzzy = lwfb_fuzzy
+
+            for rule, ch1, ch2 in rules_index.get(
+                    (wordA_fuzzy[-1:], wordB_fuzzy[:1]), []):
+                word1 = wordA_fuzzy[:-1] + ch1
+                word2 = ch2 + wordB_fuzzy[1:]
+
+                if word2 in all_inflections_set:
+                    remaining = re.sub(f"{wordB_fuzzy}$", "", word, count=1)
+                    remaining = re.sub(
+                        f"{wordA_fuzzy}$", word1, remaining, count=1)
+                    candidates.append((word1, word2, rule, remaining))
+
+    return candidates
+
+
 def two_word_sandhi(d: DotDict) -> DotDict:
     """split into two words, apply sandhi rules then
     1. match or 2. pass through"""
@@ -1041,73 +1300,62 @@ def two_word_sandhi(d: DotDict) -> DotDict:
 
     if comp(d) not in w.matches:
 
-        for x in range(0, len(d.word)-1):
+        for word1, word2, rule, process in memoized(
+                "two_word", d.word, find_two_words):
+            d.front = f"{d.front}{word1} + "
+            d.word = word2
+            d.rules_front += rule
+            d.path += f" > {process}"
+            if d.comm == "start":
+                d.comm = f"start{process}"
+            else:
+                d.comm = f"x{process}"
 
-            wordA = d.word[:-x-1]
-            wordB = d.word[-1-x:]
-            try:
-                wordA_lastletter = wordA[len(wordA)-1]
-            except Exception:
-                wordA_lastletter = ""
-            wordB_firstletter = wordB[0]
+            # blah blah is tested against the matches of this branch
+            if process == "2.1":
+                matches = d.matches
+            else:
+                matches = w.matches
 
-            # blah blah
+            if comp(d) not in matches:
+                matches_dict[d.init] += [
+                    (comp(d), d.comm, f"{comp_rules(d)}", d.path)]
+                w.matches.add(comp(d))
+                d.matches.add(comp(d))
+                unmatched_set.discard(d.init)
 
-            if (wordA in all_inflections_set and
-                    wordB in all_inflections_set):
-                d.front = f"{d.front}{wordA} + "
-                d.word = wordB
-                d.rules_front += "0,"
-                d.path += " > 2.1"
-                if d.comm == "start":
-                    d.comm = "start2.1"
-                else:
-                    d.comm = "x2.1"
+            d = DotDict(d_orig)
 
-                if comp(d) not in d.matches:
-                    matches_dict[d.init] += [(
-                        f"{d.front}{wordB}{d.back}",
-                        d.comm, comp_rules(d), d.path)]
-                    w.matches.add(comp(d))
-                    d.matches.add(comp(d))
-                    unmatched_set.discard(d.init)
+    return d_orig
 
-                d = DotDict(d_orig)
 
-            # bla* *lah
+def find_two_words(word: str) -> list[tuple[str, str, str, str]]:
+    """(word1, word2, rules, process) of every two word split of a fragment"""
 
-            for rule in rules:
-                chA = rules[rule]["chA"]
-                chB = rules[rule]["chB"]
-                ch1 = rules[rule]["ch1"]
-                ch2 = rules[rule]["ch2"]
+    candidates = []
 
-                if (wordA_lastletter == chA and
-                        wordB_firstletter == chB):
-                    word1 = wordA[:-1] + ch1
-                    word2 = ch2 + wordB[1:]
+    for x in range(0, len(word)-1):
 
-                    if (word1 in all_inflections_set and
-                            word2 in all_inflections_set):
-                        d.front = f"{d.front}{word1} + "
-                        d.word = word2
-                        d.rules_front += f"{rule+2},"
-                        d.path += " > 2.2"
-                        if d.comm == "start":
-                            d.comm = "start2.2"
-                        else:
-                            d.comm = "x2.2"
-
-                        if comp(d) not in w.matches:
-                            matches_dict[d.init] += [
-                                (comp(d), d.comm, f"{comp_rules(d)}", d.path)]
-                            w.matches.add(comp(d))
-                            d.matches.add(comp(d))
-                            unmatched_set.discard(d.init)
-
-                    d = DotDict(d_orig)
+        wordA = word[:-x-1]
+        wordB = word[-1-x:]
 
-    return d_orig
+        # blah blah
+
+        if (wordA in all_inflections_set and
+                wordB in all_inflections_set):
+            candidates.append((wordA, wordB, "0,", "2.1"))
+
+        # bla* *lah
+
+        for rule, ch1, ch2 in rules_index.get((wordA[-1:], wordB[:1]), []):
+            word1 = wordA[:-1] + ch1
+            word2 = ch2 + wordB[1:]
+
+            if (word1 in all_inflections_set and
+                    word2 in all_inflections_set):
+                candidates.append((word1, word2, f"{rule+2},", "2.2"))
+
+    return candidates
 
 
 def three_word_sandhi(d: DotDict) -> DotDict:
@@ -1118,185 +1366,105 @@ def three_word_sandhi(d: DotDict) -> DotDict:
 
     if comp(d) not in w.matches:
 
-        for x in range(0, len(d.word)-1):
-
-            wordA = d.word[:-x-1]
-            try:
-                wordA_lastletter = wordA[len(wordA)-1]
-            except Exception:
-                wordA_lastletter = ""
-
-            for y in range(0, len(d.word[-1-x:])-1):
-                wordB = d.word[-1-x:-y-1]
-                try:
-                    wordB_firstletter = wordB[0]
-                except Exception:
-                    wordB_firstletter = ""
-                try:
-                    wordB_lastletter = wordB[len(wordB)-1]
-                except Exception:
-                    wordB_lastletter = ""
-
-                wordC = d.word[-1-y:]
-                wordC_firstletter = wordC[0]
-
-                # blah blah blah
-
-                if (wordA in all_inflections_set and
-                    wordB in all_inflections_set and
-                        wordC in all_inflections_set):
-
-                    d.front = f"{d.front}{wordA} + "
-                    d.word = wordB
-                    d.back = f" + {wordC}{d.back}"
-                    d.rules_front += "0,"
-                    d.rules_back = f"0,{d.rules_back}"
-                    d.path += " > 3.1"
-                    if d.comm == "start":
-                        d.comm = "start3.1"
-                    else:
-                        d.comm = "x3.1"
-
-                    if comp(d) not in w.matches:
-                        matches_dict[d.init] += [
-                            (comp(d), d.comm, "0,0", d.path)]
-                        w.matches.add(comp(d))
-                        d.matches.add(comp(d))
-                        unmatched_set.discard(d.init)
-
-                    d = DotDict(d_orig)
-
-                # blah bla* *lah
-                if wordA in all_inflections_set:
-
-                    for rule in rules:
-                        chA = rules[rule]["chA"]
-                        chB = rules[rule]["chB"]
-                        ch1 = rules[rule]["ch1"]
-                        ch2 = rules[rule]["ch2"]
-
-                        if (wordB_lastletter == chA and
-                                wordC_firstletter == chB):
-                            word2 = wordB[:-1] + ch1
-                            word3 = ch2 + wordC[1:]
-
-                            if (wordA in all_inflections_set and
-                                word2 in all_inflections_set and
-                                    word3 in all_inflections_set):
-
-                                d.front = f"{d.front}{wordA} + "
-                                d.word = word2
-                                d.back = f" + {word3}{d.back}"
-                                d.rules_front += "0,"
-                                d.rules_back = f"{rule+2},{d.rules_back}"
-                                d.path += " > 3.2"
-                                if d.comm == "start":
-                                    d.comm = "start3.2"
-                                else:
-                                    d.comm = "x3.2"
-
-                                if comp(d) not in w.matches:
-                                    matches_dict[d.init] += [(
-                                        comp(d), d.comm,
-                                        f"{comp_rules(d)}", d.path)]
-                                    w.matches.add(comp(d))
-                                    d.matches.add(comp(d))
-                                    unmatched_set.discard(d.init)
-
-                                d = DotDict(d_orig)
-
-                # bla* *lah blah
-
-                if wordC in all_inflections_set:
-
-                    for rule in rules:
-                        chA = rules[rule]["chA"]
-                        chB = rules[rule]["chB"]
-                        ch1 = rules[rule]["ch1"]
-                        ch2 = rules[rule]["ch2"]
-
-                        if (wordA_lastletter == chA and
-                                wordB_firstletter == chB):
-                            word1 = wordA[:-1] + ch1
-                            word2 = ch2 + wordB[1:]
+        for word1, word2, word3, rule_front, rule_back, process in memoized(
+                "three_word", d.word, find_three_words):
+            d.front = f"{d.front}{word1} + "
+            d.word = word2
+            d.back = f" + {word3}{d.back}"
+            d.rules_front += rule_front
+            d.rules_back = f"{rule_back}{d.rules_back}"
+            d.path += f" > {process}"
+            if d.comm == "start":
+                d.comm = f"start{process}"
+            else:
+                d.comm = f"x{process}"
 
-                            if (word1 in all_inflections_set and
-                                word2 in all_inflections_set and
-                                    wordC in all_inflections_set):
-
-                                d.front = f"{d.front}{word1} + "
-                                d.word = word2
-                                d.back = f" + {wordC}{d.back}"
-                                d.rules_front += f"{rule+2},"
-                                d.rules_back = f"0,{d.rules_back}"
-                                d.path += " > 3.3"
-                                if d.comm == "start":
-                                    d.comm = "start3.3"
-                                else:
-                                    d.comm = "x3.3"
-
-                                if comp(d) not in w.matches:
-                                    matches_dict[d.init] += [(
-                                        comp(d), d.comm,
-                                        f"{comp_rules(d)}", d.path)]
-                                    w.matches.add(comp(d))
-                                    d.matches.add(comp(d))
-                                    unmatched_set.discard(d.init)
-
-                                d = DotDict(d_orig)
-
-                # bla* *la* *lah
-
-                for rulex in rules:
-                    chAx = rules[rulex]["chA"]
-                    chBx = rules[rulex]["chB"]
-                    ch1x = rules[rulex]["ch1"]
-                    ch2x = rules[rulex]["ch2"]
-
-                    if (wordA_lastletter == chAx and
-                            wordB_firstletter == chBx):
-                        word1 = wordA[:-1] + ch1x
-                        word2 = ch2x + wordB[1:]
-
-                        for ruley in rules:
-                            chAy = rules[ruley]["chA"]
-                            chBy = rules[ruley]["chB"]
-                            ch1y = rules[ruley]["ch1"]
-                            ch2y = rules[ruley]["ch2"]
-
-                            if (wordB_lastletter == chAy and
-                                    wordC_firstletter == chBy):
-                                word2 = (ch2x + wordB[1:])[:-1] + ch1y
-                                word3 = ch2y + wordC[1:]
-
-                                if (word1 in all_inflections_set and
-                                        word2 in all_inflections_set and
-                                        word3 in all_inflections_set):
-
-                                    d.front = f"{d.front}{word1} + "
-                                    d.word = word2
-                                    d.back = f" + {word3}{d.back}"
-                                    d.rules_front += f"{rulex+2},"
-                                    d.rules_back = f"{ruley+2},{d.rules_back}"
-                                    d.path += " > 3.4"
-                                    if d.comm == "start":
-                                        d.comm = "start3.4"
-                                    else:
-                                        d.comm = "x3.4"
-
-                                    if comp(d) not in w.matches:
-                                        matches_dict[d.init] += [(
-                                            comp(d), d.comm,
-                                            f"{comp_rules(d)}", d.path)]
-                                        w.matches.add(comp(d))
-                                        d.matches.add(comp(d))
-                                        unmatched_set.discard(d.init)
-
-                                    d = DotDict(d_orig)
+            if comp(d) not in w.matches:
+                if process == "3.1":
+                    rules_column = "0,0"
+                else:
+                    rules_column = f"{comp_rules(d)}"
+                matches_dict[d.init] += [
+                    (comp(d), d.comm, rules_column, d.path)]
+                w.matches.add(comp(d))
+                d.matches.add(comp(d))
+                unmatched_set.discard(d.init)
+
+            d = DotDict(d_orig)
 
     return d_orig
 
 
+def find_three_words(word: str) -> list[tuple[str, str, str, str, str, str]]:
+    """(word1, word2, word3, front rules, back rules, process)
+    of every three word split of a fragment"""
+
+    candidates = []
+
+    for x in range(0, len(word)-1):
+
+        wordA = word[:-x-1]
+
+        for y in range(0, len(word[-1-x:])-1):
+            wordB = word[-1-x:-y-1]
+            wordC = word[-1-y:]
+
+            # blah blah blah
+
+            if (wordA in all_inflections_set and
+                wordB in all_inflections_set and
+                    wordC in all_inflections_set):
+                candidates.append((wordA, wordB, wordC, "0,", "0,", "3.1"))
+
+            # blah bla* *lah
+
+            if wordA in all_inflections_set:
+
+                for rule, ch1, ch2 in rules_index.get(
+                        (wordB[-1:], wordC[:1]), []):
+                    word2 = wordB[:-1] + ch1
+                    word3 = ch2 + wordC[1:]
+
+                    if (word2 in all_inflections_set and
+                            word3 in all_inflections_set):
+                        candidates.append(
+                            (wordA, word2, word3, "0,", f"{rule+2},", "3.2"))
+
+            # bla* *lah blah
+
+            if wordC in all_inflections_set:
+
+                for rule, ch1, ch2 in rules_index.get(
+                        (wordA[-1:], wordB[:1]), []):
+                    word1 = wordA[:-1] + ch1
+                    word2 = ch2 + wordB[1:]
+
+                    if (word1 in all_inflections_set and
+                            word2 in all_inflections_set):
+                        candidates.append(
+                            (word1, word2, wordC, f"{rule+2},", "0,", "3.3"))
+
+            # bla* *la* *lah
+
+            for rulex, ch1x, ch2x in rules_index.get(
+                    (wordA[-1:], wordB[:1]), []):
+                word1 = wordA[:-1] + ch1x
+
+                for ruley, ch1y, ch2y in rules_index.get(
+                        (wordB[-1:], wordC[:1]), []):
+                    word2 = (ch2x + wordB[1:])[:-1] + ch1y
+                    word3 = ch2y + wordC[1:]
+
+                    if (word1 in all_inflections_set and
+                            word2 in all_inflections_set and
+                            word3 in all_inflections_set):
+                        candidates.append((
+                            word1, word2, word3,
+                            f"{rulex+2},", f"{ruley+2},", "3.4"))
+
+    return candidates
+
+
 def four_word_sandhi(d: DotDict) -> DotDict:
 
     """split into four words, apply sandhi rules, then
@@ -1306,90 +1474,72 @@ def four_word_sandhi(d: DotDict) -> DotDict:
 
     if comp(d) not in w.matches:
 
-        for x in range(0, len(d.word)-1):
-            wordA = d.word[:-x-1]
-            wordA_lastletter = wordA[len(wordA)-1]
-
-            for y in range(0, len(d.word[-1-x:])-1):
-                wordB = d.word[-1-x:-y-1]
-                wordB_firstletter = wordB[0]
-                wordB_lastletter = wordB[len(wordB)-1]
-                wordC = d.word[-1-y:]
-                wordC_firstletter = wordC[0]
-
-                for z in range(0, len(d.word[-1-y:])-1):
-                    wordC = d.word[-1-y:-z-1]
-                    wordC_firstletter = wordC[0]
-                    wordC_lastletter = wordC[len(wordC)-1]
-                    wordD = d.word[-1-z:]
-                    wordD_firstletter = wordD[0]
-
-                    # bla* *la* *la* *lah
-
-                    for rulex in rules:
-                        chAx = rules[rulex]["chA"]
-                        chBx = rules[rulex]["chB"]
-                        ch1x = rules[rulex]["ch1"]
-                        ch2x = rules[rulex]["ch2"]
-
-                        if (wordA_lastletter == chAx and
-                                wordB_firstletter == chBx):
-                            word1 = wordA[:-1] + ch1x
-                            word2 = ch2x + wordB[1:]
-
-                            for ruley in rules:
-                                chAy = rules[ruley]["chA"]
-                                chBy = rules[ruley]["chB"]
-                                ch1y = rules[ruley]["ch1"]
-                                ch2y = rules[ruley]["ch2"]
-
-                                if wordB_lastletter == chAy and \
-                                        wordC_firstletter == chBy:
-                                    word2 = (ch2x + wordB[1:])[:-1] + ch1y
-                                    word3 = ch2y + wordC[1:]
-
-                                    for rulez in rules:
-                                        chAz = rules[rulez]["chA"]
-                                        chBz = rules[rulez]["chB"]
-                                        ch1z = rules[rulez]["ch1"]
-                                        ch2z = rules[rulez]["ch2"]
-
-                                        if (wordC_lastletter == chAz and
-                                                wordD_firstletter == chBz):
-                                            word3 = (
-                                                ch2y + wordC[1:])[:-1] + ch1z
-                                            word4 = ch2z + wordD[1:]
-
-                                            if (word1 in all_inflections_set
-                                                and
-                                                word2 in all_inflections_set
-                                                and
-                                                word3 in all_inflections_set
-                                                and
-                                                    word4 in all_inflections_set):
-                                                d.front = f"{d.front}{word1} + {word2} + "
-                                                d.word = word3
-                                                d.back = f" + {word4}{d.back}"
-                                                d.rules_front += f"{rulex+2},{ruley+2}"
-                                                d.rules_back = f"{rulez+2},{d.rules_back}"
-                                                d.path += " > 4"
-                                                d.comm = "x4"
-
-                                                if comp(d) not in w.matches:
-                                                    matches_dict[d.init] += [(
-                                                        comp(d), d.comm,
-                                                        f"{comp_rules(d)}",
-                                                        d.path)]
-                                                    w.matches.add(comp(d))
-                                                    d.matches.add(comp(d))
-                                                    unmatched_set.discard(
-                                                        d.init)
-
-                                                d = DotDict(d_orig)
+        for word1, word2, word3, word4, rules_front, rule_back in memoized(
+                "four_word", d.word, find_four_words):
+            d.front = f"{d.front}{word1} + {word2} + "
+            d.word = word3
+            d.back = f" + {word4}{d.back}"
+            d.rules_front += rules_front
+            d.rules_back = f"{rule_back}{d.rules_back}"
+            d.path += " > 4"
+            d.comm = "x4"
+
+            if comp(d) not in w.matches:
+                matches_dict[d.init] += [(
+                    comp(d), d.comm,
+                    f"{comp_rules(d)}",
+                    d.path)]
+                w.matches.add(comp(d))
+                d.matches.add(comp(d))
+                unmatched_set.discard(d.init)
+
+            d = DotDict(d_orig)
 
     return d_orig
 
 
+def find_four_words(word: str) -> list[tuple[str, str, str, str, str, str]]:
+    """(word1, word2, word3, word4, front rules, back rules)
+    of every four word split of a fragment"""
+
+    candidates = []
+
+    for x in range(0, len(word)-1):
+        wordA = word[:-x-1]
+
+        for y in range(0, len(word[-1-x:])-1):
+            wordB = word[-1-x:-y-1]
+
+            for z in range(0, len(word[-1-y:])-1):
+                wordC = word[-1-y:-z-1]
+                wordD = word[-1-z:]
+
+                # bla* *la* *la* *lah
+
+                for rulex, ch1x, ch2x in rules_index.get(
+                        (wordA[-1:], wordB[:1]), []):
+                    word1 = wordA[:-1] + ch1x
+
+                    for ruley, ch1y, ch2y in rules_index.get(
+                            (wordB[-1:], wordC[:1]), []):
+                        word2 = (ch2x + wordB[1:])[:-1] + ch1y
+
+                        for rulez, ch1z, ch2z in rules_index.get(
+                                (wordC[-1:], wordD[:1]), []):
+                            word3 = (ch2y + wordC[1:])[:-1] + ch1z
+                            word4 = ch2z + wordD[1:]
+
+                            if (word1 in all_inflections_set and
+                                word2 in all_inflections_set and
+                                word3 in all_inflections_set and
+                                    word4 in all_inflections_set):
+                                candidates.append((
+                                    word1, word2, word3, word4,
+                                    f"{rulex+2},{ruley+2}", f"{rulez+2},"))
+
+    return candidates
+
+
 def comp_rules(d: DotDict) -> str:
     return f"{d.rules_front}{d.rules_back}"
 
@@ -1411,17 +1561,22 @@ def dprint(d: DotDict) -> None:
     print()
 
 
-def summary(pth: ProjectPaths):
+def summary(
+    pth: ProjectPaths,
+    words: list[str],
+    done_dict: dict[str, tuple[list[str], str, int]]
+):
 
     print("[green]writing unmatched set")
 
+    unmatched_list = [word for word in words if not done_dict[word][0]]
     with open(pth.unmatched_path, "w") as f:
-        for item in unmatched_set:
+        for item in unmatched_list:
             f.write(f"{item}\n")
 
-    unmatched = len(unmatched_set)
+    unmatched = len(unmatched_list)
     umatched_perc = (unmatched/unmatched_len_init)*100
-    matched = unmatched_len_init-len(unmatched_set)
+    matched = unmatched_len_init-unmatched
     matched_perc = (matched/unmatched_len_init)*100
 
     print(
@@ -1429,17 +1584,17 @@ def summary(pth: ProjectPaths):
     print(
         f"[green]matched:\t{matched:,} / {unmatched_len_init:,}\t[white]{matched_perc:.2f}%")
 
-    word_count = len(matches_dict)
+    word_count = len(words)
     match_count = 0
 
-    for __word__, matches in matches_dict.items():
-        match_count += len(matches)
+    for word in words:
+        match_count += len(done_dict[word][0])
 
     match_average = match_count / word_count
 
     print(f"[green]match count:\t{match_count:,}")
     print(f"[green]match average:\t{match_average:.4f}")
-
+    
 
 if __name__ == "__main__":
     main()
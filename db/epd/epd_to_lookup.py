@@ -6,10 +6,10 @@ import re
 from sqlalchemy.orm import Session
 
 from db.db_helpers import get_db_session
-from db.models import DpdHeadword, DpdRoot, Lookup
+from db.models import DpdRoot, Lookup
 from tools.configger import config_test
+from tools.headword_snapshot import HeadwordRow, get_headword_snapshot
 from tools.lookup_is_another_value import is_another_value
-from tools.pali_sort_key import pali_sort_key
 from tools.paths import ProjectPaths
 from tools.printer import p_counter, p_green, p_green_title, p_title, p_white, p_yes
 from tools.tic_toc import tic, toc
@@ -23,8 +23,8 @@ class ProgData():
     pth: ProjectPaths = ProjectPaths()
     db_session: Session = get_db_session(pth.dpd_db_path)
     
-    dpd_db: list[DpdHeadword] = db_session.query(DpdHeadword).all()
-    dpd_db = sorted(dpd_db, key=lambda x: pali_sort_key(x.lemma_1))
+    # shared read-only snapshot, already in pali alphabetical order
+    dpd_db = get_headword_snapshot(pth.dpd_db_path)
     dpd_db_length = len(dpd_db)
     
     roots_db: list = db_session.query(DpdRoot).all()
@@ -95,7 +95,7 @@ def compile_roots_data(g: ProgData):
     p_yes(counter)
 
 
-def make_clean_meaning_list(i: DpdHeadword) -> list[str]:
+def make_clean_meaning_list(i: HeadwordRow) -> list[str]:
     "Cleanup meaning_1"
 
     # remove double ??
@@ -119,7 +119,7 @@ def make_clean_meaning_list(i: DpdHeadword) -> list[str]:
     return meanings_clean.split(";")
 
 
-def make_meaning_plus_case(i: DpdHeadword):
+def make_meaning_plus_case(i: HeadwordRow):
     """Return meaning and optionally (plus_case)"""
 
     if i.plus_case:
@@ -153,7 +153,7 @@ def extract_sutta_numbers(meaning_2) -> list[str]:
     return combined_numbers
 
 
-def update_epd_sutta(g:ProgData, combined_numbers, i:DpdHeadword):
+def update_epd_sutta(g:ProgData, combined_numbers, i:HeadwordRow):
     """Use Sutta number as key in EPD"""
 
     for combined_number in combined_numbers:
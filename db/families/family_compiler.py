@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+
+"""Compile root, word, compound, set and idiom families in a single pass
+over the headwords and save them to the database in one transaction.
+
+Produces the same tables as family_root.py, family_word.py,
+family_compound.py, family_set.py and family_idiom.py run one after another.
+"""
+
+import json
+import re
+import time
+
+from rich import print
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, joinedload
+
+from family_compound import make_anki_data as make_cf_anki_data
+from family_root import make_anki_data as make_rf_anki_data
+from family_root import make_anki_matrix_data
+from family_root import make_root_header, make_root_header_ru
+from family_root import update_lookup_table
+from family_set import print_errors_list as print_sf_errors_list
+from family_word import make_anki_data as make_wf_anki_data
+from family_word import print_errors_list as print_wf_errors_list
+from root_info import generate_root_info_html
+from root_matrix import generate_root_matrix
+
+from db.db_helpers import get_db_session
+from db.models import DbInfo, DpdHeadword, DpdRoot
+from db.models import FamilyCompound, FamilyIdiom, FamilyRoot, FamilySet, FamilyWord
+
+from scripts.build.anki_updater import family_updater
+
+from tools.configger import config_test
+from tools.meaning_construction import clean_construction
+from tools.meaning_construction import degree_of_completion
+from tools.meaning_construction import make_meaning_combo
+from tools.pali_sort_key import pali_sort_key
+from tools.paths import ProjectPaths
+from tools.superscripter import superscripter_uni
+from tools.tic_toc import tic, toc
+
+from exporter.goldendict.ru_components.tools.tools_for_ru_exporter import make_short_ru_meaning, ru_replace_abbreviations, populate_set_ru_and_check_errors
+
+
+comp_re = re.compile(r"\bcomp\b")
+digit_re = re.compile(r"\d")
+base_re = re.compile(r"^.+> ")
+
+families = ["root", "word", "compound", "set", "idiom"]
+
+
+class FamilyRow():
+    """Html and data rows of one headword, shared by all its families."""
+
+    def __init__(self, i: DpdHeadword) -> None:
+        self.meaning = make_meaning_combo(i)
+        self.ru_meaning = make_short_ru_meaning(i, i.ru)
+        self.pos_ru = ru_replace_abbreviations(i.pos)
+        completion_html = degree_of_completion(i)
+        completion = degree_of_completion(i, html=False)
+        lemma = superscripter_uni(i.lemma_1)
+
+        self.html = (
+            f"<tr><th>{lemma}</th><td><b>{i.pos}</b></td>"
+            f"<td>{self.meaning}</td><td>{completion_html}</td></tr>")
+        self.html_ru = (
+            f"<tr><th>{lemma}</th><td><b>{self.pos_ru}</b></td>"
+            f"<td>{self.ru_meaning}</td><td>{completion_html}</td></tr>")
+        self.data = (i.lemma_1, i.pos, self.meaning, completion)
+        self.data_ru = (i.lemma_1, self.pos_ru, self.ru_meaning, completion)
+
+
+def new_family(**kwargs) -> dict:
+    family = {
+        "headwords": [],
+        "html_rows": [],
+        "html_ru_rows": [],
+        "html": "",
+        "html_ru": "",
+        "data": [],
+        "data_ru": [],
+        "anki": [],
+    }
+    family.update(kwargs)
+    return family
+
+
+def add_row(family: dict, row: FamilyRow) -> None:
+    family["html_rows"].append(row.html)
+    family["html_ru_rows"].append(row.html_ru)
+    family["data"].append(row.data)
+    family["data_ru"].append(row.data_ru)
+
+
+def close_tables(family_dict: dict) -> None:
+    """Join the html rows into tables."""
+    for family in family_dict.values():
+        if family["html_rows"]:
+            family["html"] = "<table class='family'>" + "".join(family["html_rows"])
+            family["html_ru"] = "<table class='family'>" + "".join(family["html_ru_rows"])
+        family["html"] += "</table>"
+        family["html_ru"] += "</table>"
+
+
+def sync_idiom_number(i: DpdHeadword) -> bool:
+    """Same as family_idiom.sync_idiom_numbers_with_family_compound"""
+    if (
+        i.family_compound
+        and digit_re.search(i.family_compound)
+        and " " not in i.family_compound
+        and "idioms" not in i.pos
+        and "sandhi" not in i.pos
+        and not comp_re.search(i.grammar)
+        and not i.family_idioms
+    ):
+        i.family_idioms = i.family_compound
+        return True
+    return False
+
+
+class FamilyCompiler():
+    """Walk the headwords once and build all five families."""
+
+    def __init__(self, db_session: Session) -> None:
+        self.db_session = db_session
+        self.rf_dict: dict[str, dict] = {}
+        self.bases_dict: dict[str, set[str]] = {}
+        self.wf_dict: dict[str, dict] = {}
+        self.cf_dict: dict[str, dict] = {}
+        self.sets_dict: dict[str, dict] = {}
+        self.idioms_dict: dict[str, dict] = {}
+        self.idioms_synced = 0
+        self.seconds: dict[str, float] = {family: 0.0 for family in families}
+        self.seconds["load"] = 0.0
+
+    def timer(self, family: str, start: float) -> float:
+        now = time.perf_counter()
+        self.seconds[family] += now - start
+        return now
+
+    def compile(self) -> None:
+        print("[green]loading headwords", end=" ")
+        start = time.perf_counter()
+        dpd_db = self.db_session \
+            .query(DpdHeadword) \
+            .options(joinedload(DpdHeadword.ru), joinedload(DpdHeadword.rt)) \
+            .all()
+        dpd_db = sorted(dpd_db, key=lambda x: pali_sort_key(x.lemma_1))
+        self.timer("load", start)
+        print(len(dpd_db))
+
+        print("[green]compiling families")
+        for i in dpd_db:
+            start = time.perf_counter()
+            if sync_idiom_number(i):
+                self.idioms_synced += 1
+            start = self.timer("idiom", start)
+
+            if not (
+                i.family_root or i.family_word or i.family_compound
+                or i.family_set or i.family_idioms
+            ):
+                continue
+            row = FamilyRow(i)
+            self.timer("load", start)
+
+            if i.family_root:
+                start = time.perf_counter()
+                self.add_root(i, row)
+                self.timer("root", start)
+            if i.family_word:
+                start = time.perf_counter()
+                self.add_word(i, row)
+                self.timer("word", start)
+            if i.family_compound:
+                start = time.perf_counter()
+                self.add_compound(i, row)
+                self.timer("compound", start)
+            if i.family_set:
+                start = time.perf_counter()
+                self.add_set(i, row)
+                self.timer("set", start)
+            if i.family_idioms:
+                start = time.perf_counter()
+                self.add_idiom(i, row)
+                self.timer("idiom", start)
+
+        start = time.perf_counter()
+        for rf, family in self.rf_dict.items():
+            family["html"] = (
+                make_root_header(self.rf_dict, rf)
+                + "<table class='family'>" + "".join(family["html_rows"])
+                + "</table>")
+            family["html_ru"] = (
+                make_root_header_ru(self.rf_dict, rf)
+                + "<table class='family'>" + "".join(family["html_ru_rows"])
+                + "</table>")
+        start = self.timer("root", start)
+        close_tables(self.wf_dict)
+        start = self.timer("word", start)
+        close_tables(self.cf_dict)
+        start = self.timer("compound", start)
+        populate_set_ru_and_check_errors(self.sets_dict)
+        close_tables(self.sets_dict)
+        start = self.timer("set", start)
+        close_tables(self.idioms_dict)
+        self.timer("idiom", start)
+
+    def add_root(self, i: DpdHeadword, row: FamilyRow) -> None:
+        family_key = i.root_family_key
+        family = self.rf_dict.get(family_key)
+        if family is None:
+            family = self.rf_dict[family_key] = new_family(
+                root_key=i.root_key,
+                root_family=i.family_root,
+                root_meaning=i.rt.root_meaning,
+                root_ru_meaning=i.rt.root_ru_meaning,
+                count=0,
+                meaning=i.rt.root_meaning,
+                meaning_ru=i.rt.root_ru_meaning)
+        family["headwords"].append(i.lemma_1)
+        family["count"] += 1
+        add_row(family, row)
+
+        anki_family = f"<b>{i.family_root}</b> "
+        anki_family += f"{i.rt.root_group} ({i.rt.root_meaning})"
+        construction = clean_construction(i.construction)
+        if not i.meaning_1:
+            construction = f"-{construction}"
+        family["anki"].append(
+            (anki_family, i.lemma_1, i.pos, row.meaning, construction))
+
+        base = base_re.sub("", i.root_base)
+        if base:
+            self.bases_dict.setdefault(i.root_key, set()).add(base)
+
+    def add_word(self, i: DpdHeadword, row: FamilyRow) -> None:
+        wf = i.family_word
+        if " " in wf:
+            print("[bright_red]ERROR: spaces found please remove!")
+        family = self.wf_dict.get(wf)
+        if family is None:
+            family = self.wf_dict[wf] = new_family()
+        family["headwords"].append(i.lemma_1)
+        add_row(family, row)
+        construction = clean_construction(
+            i.construction) if i.meaning_1 else ""
+        family["anki"].append((i.lemma_1, i.pos, row.meaning, construction))
+
+    def add_compound(self, i: DpdHeadword, row: FamilyRow) -> None:
+        include = (
+            comp_re.search(i.grammar) is not None
+            and len(i.lemma_clean) < 30
+            and i.meaning_1)
+        for cf in i.family_compound_list:
+            if cf == " ":
+                print("[bright_red]ERROR: spaces found please remove!")
+            elif not cf:
+                print("[bright_red]ERROR: '' found please remove!")
+            elif cf == "+":
+                print("[bright_red]ERROR: + found please remove!")
+
+            if include:
+                family = self.cf_dict.get(cf)
+                if family is None:
+                    family = self.cf_dict[cf] = new_family()
+                family["headwords"].append(i.lemma_1)
+                add_row(family, row)
+                construction = clean_construction(i.construction)
+                family["anki"].append(
+                    (i.lemma_1, i.pos, row.meaning, construction))
+
+    def add_set(self, i: DpdHeadword, row: FamilyRow) -> None:
+        for fs in i.family_set_list:
+            if fs == " ":
+                print("[bright_red]ERROR: spaces found please remove!")
+            elif not fs:
+                print("[bright_red]ERROR: '' found please remove!")
+            elif fs == "+":
+                print("[bright_red]ERROR: + found please remove!")
+
+            if i.meaning_1:
+                family = self.sets_dict.get(fs)
+                if family is None:
+                    family = self.sets_dict[fs] = new_family(set_ru="")
+                family["headwords"].append(i.lemma_1)
+                add_row(family, row)
+
+    def add_idiom(self, i: DpdHeadword, row: FamilyRow) -> None:
+        if not i.meaning_1:
+            return
+        for word in i.family_idioms_list:
+            family = self.idioms_dict.get(word)
+            if family is None:
+                family = self.idioms_dict[word] = new_family(count=0)
+            family["headwords"].append(i.lemma_1)
+            if i.pos in ["idiom", "sandhi"]:
+                add_row(family, row)
+                family["count"] += 1
+
+    def save(self) -> tuple[list[str], list[str]]:
+        """Replace all five tables and the cached sets in one transaction.
+        Return word and set family errors."""
+
+        print("[green]adding to db")
+
+        start = time.perf_counter()
+        rf_rows = [
+            {
+                "root_family_key": rf,
+                "root_key": family["root_key"],
+                "root_family": family["root_family"],
+                "root_meaning": family["root_meaning"],
+                "root_ru_meaning": family["root_ru_meaning"],
+                "html": family["html"],
+                "html_ru": family["html_ru"],
+                "count": len(family["headwords"]),
+                "data": pack(family["data"]),
+                "data_ru": pack(family["data_ru"]),
+            }
+            for rf, family in self.rf_dict.items()]
+        replace_table(self.db_session, FamilyRoot, rf_rows)
+        start = self.timer("root", start)
+
+        wf_errors = []
+        wf_rows = []
+        for wf, family in self.wf_dict.items():
+            if len(family["headwords"]) < 2:
+                wf_errors.append(wf)
+            wf_rows.append({
+                "word_family": wf,
+                "html": family["html"],
+                "html_ru": family["html_ru"],
+                "count": len(family["headwords"]),
+                "data": pack(family["data"]),
+                "data_ru": pack(family["data_ru"]),
+            })
+        replace_table(self.db_session, FamilyWord, wf_rows)
+        start = self.timer("word", start)
+
+        cf_rows = [
+            {
+                "compound_family": cf,
+                "html": family["html"],
+                "html_ru": family["html_ru"],
+                "count": len(family["headwords"]),
+                "data": pack(family["data"]),
+                "data_ru": pack(family["data_ru"]),
+            }
+            for cf, family in self.cf_dict.items()]
+        replace_table(self.db_session, FamilyCompound, cf_rows)
+        save_db_info(self.db_session, "cf_set", list(self.cf_dict))
+        start = self.timer("compound", start)
+
+        sf_errors = []
+        sf_rows = []
+        for sf, family in self.sets_dict.items():
+            if len(family["headwords"]) < 3:
+                sf_errors.append(sf)
+            sf_rows.append({
+                "set": sf,
+                "html": family["html"],
+                "html_ru": family["html_ru"],
+                "set_ru": family["set_ru"],
+                "count": len(family["headwords"]),
+                "data": pack(family["data"]),
+                "data_ru": pack(family["data_ru"]),
+            })
+        replace_table(self.db_session, FamilySet, sf_rows)
+        start = self.timer("set", start)
+
+        idiom_rows = [
+            {
+                "idiom": idiom,
+                "html": family["html"],
+                "html_ru": family["html_ru"],
+                "count": family["count"],
+                "data": pack(family["data"]),
+                "data_ru": pack(family["data_ru"]),
+            }
+            for idiom, family in self.idioms_dict.items()
+            if family["data"]]
+        replace_table(self.db_session, FamilyIdiom, idiom_rows)
+        save_db_info(
+            self.db_session, "idioms_set",
+            [idiom for idiom, family in self.idioms_dict.items() if family["count"] > 0])
+
+        # synced idiom numbers are saved with the families
+        self.db_session.commit()
+        self.timer("idiom", start)
+
+        return wf_errors, sf_errors
+
+    def print_timings(self) -> None:
+        counts = {
+            "root": len(self.rf_dict),
+            "word": len(self.wf_dict),
+            "compound": len(self.cf_dict),
+            "set": len(self.sets_dict),
+            "idiom": sum(1 for family in self.idioms_dict.values() if family["data"]),
+        }
+        print(f"[green]{'loading and rows':<20}[white]{'':>10}{self.seconds['load']:>10.2f}")
+        for family in families:
+            print(f"[green]{family:<20}[white]{counts[family]:>10,}{self.seconds[family]:>10.2f}")
+        print(f"[green]{'idioms synced':<20}[white]{self.idioms_synced:>10,}")
+
+
+def pack(data: list) -> str:
+    """Same as Family*.data_pack"""
+    return json.dumps(data, ensure_ascii=False, indent=1)
+
+
+def replace_table(db_session: Session, table, rows: list[dict]) -> None:
+    db_session.execute(table.__table__.delete())
+    if rows:
+        db_session.execute(insert(table), rows)
+
+
+def save_db_info(db_session: Session, key: str, value: list[str]) -> None:
+    db_info = db_session.query(DbInfo).filter_by(key=key).first()
+    if not db_info:
+        db_info = DbInfo()
+    db_info.key = key
+    db_info.value = json.dumps(value, ensure_ascii=False, indent=1)
+    db_session.add(db_info)
+
+
+def main():
+    tic()
+    print("[bright_yellow]families compiler")
+
+    if not (
+        config_test("exporter", "make_dpd", "yes") or
+        config_test("regenerate", "db_rebuild", "yes") or
+        config_test("exporter", "make_tpr", "yes") or
+        config_test("exporter", "make_ebook", "yes")
+    ):
+        print("[green]disabled in config.ini")
+        toc()
+        return
+
+    pth = ProjectPaths()
+    db_session = get_db_session(pth.dpd_db_path)
+
+    if config_test("dictionary", "show_ru_data", "yes"):
+        show_ru_data = True
+    else:
+        show_ru_data = False
+
+    compiler = FamilyCompiler(db_session)
+    compiler.compile()
+    wf_errors, sf_errors = compiler.save()
+    print_wf_errors_list(wf_errors)
+    print_sf_errors_list(sf_errors)
+
+    # root data which depends on the root families
+    update_lookup_table(db_session)
+    roots_db = db_session.query(DpdRoot).all()
+    roots_db = sorted(roots_db, key=lambda x: pali_sort_key(x.root))
+    generate_root_info_html(db_session, roots_db, compiler.bases_dict, show_ru_data)
+    html_dict = generate_root_matrix(
+        db_session, keep_html=config_test("anki", "update", "yes"))
+
+    compiler.print_timings()
+
+    if config_test("anki", "update", "yes"):
+        family_updater(make_rf_anki_data(pth, compiler.rf_dict), ["Family Root"])
+        family_updater(
+            make_anki_matrix_data(pth, html_dict, db_session), ["Root Matrix"])
+        family_updater(make_wf_anki_data(compiler.wf_dict), ["Family Word"])
+        family_updater(make_cf_anki_data(compiler.cf_dict), ["Family Compound"])
+
+    db_session.close()
+    toc()
+
+
+if __name__ == "__main__":
+    main()
@@ -71,7 +71,8 @@ def main():
     add_rf_to_db(db_session, rf_dict)
     update_lookup_table(db_session)
     generate_root_info_html(db_session, roots_db, bases_dict, show_ru_data)
-    html_dict = generate_root_matrix(db_session)
+    html_dict = generate_root_matrix(
+        db_session, keep_html=config_test("anki", "update", "yes"))
     db_session.close()
 
     if config_test("anki", "update", "yes"):
@@ -1,1405 +1,299 @@
+"""Generate the root matrix html for every root in dpd_roots.
+
+Headwords are streamed from the db ordered by root_key, so only the
+headwords of one root are held in memory at a time. Each root is classified
+into a RootMatrix, rendered into html with templates which are built once,
+and written back to dpd_roots in batches.
+"""
 
 import re
 
+from itertools import groupby
+from typing import Iterator, Optional
+
 from rich import print
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
 
 from db.models import DpdHeadword, DpdRoot
 from tools.superscripter import superscripter_uni
 
 
-def generate_root_matrix(db_session):
-    print("[green]generating root matrix")
-    root_matrix = {}
-    total_counter = 0
-    word_counter = 0
-
-    dpd_db = db_session.query(DpdHeadword).all()
-
-    for counter, i in enumerate(dpd_db):
-
-        headword = i.lemma_1
-
-        if i.root_key:
-            if i.root_key not in root_matrix:
-                root_matrix[i.root_key] = {
-                    'verbs': {
-                        'pr': [],
-                        'pr caus': [],
-                        'pr caus & pass': [],
-                        'pr pass': [],
-                        'pr desid': [],
-                        'pr desid & caus': [],
-                        'pr intens': [],
-                        'pr intens & caus': [],
-                        'pr deno': [],
-                        'pr deno & caus': [],
-                        'pr ✗': [],
-
-                        'imp': [],
-                        'imp caus': [],
-                        'imp caus & pass': [],
-                        'imp pass': [],
-                        'imp desid': [],
-                        'imp desid & caus': [],
-                        'imp intens': [],
-                        'imp deno': [],
-                        'imp deno & caus': [],
-                        'imp ✗': [],
-
-                        'opt': [],
-                        'opt caus': [],
-                        'opt caus & pass': [],
-                        'opt pass': [],
-                        'opt desid': [],
-                        'opt desid & caus': [],
-                        'opt intens': [],
-                        'opt deno': [],
-                        'opt deno & caus': [],
-                        'opt ✗': [],
-
-                        'perf': [],
-                        'perf caus': [],
-                        'perf caus & pass': [],
-                        'perf pass': [],
-                        'perf desid': [],
-                        'perf desid & caus': [],
-                        'perf intens': [],
-                        'perf deno': [],
-                        'perf deno & caus': [],
-                        'perf ✗': [],
-
-                        'imperf': [],
-                        'imperf caus': [],
-                        'imperf caus & pass': [],
-                        'imperf pass': [],
-                        'imperf desid': [],
-                        'imperf desid & caus': [],
-                        'imperf intens': [],
-                        'imperf deno': [],
-                        'imperf deno & caus': [],
-                        'imperf ✗': [],
-
-                        'aor': [],
-                        'aor caus': [],
-                        'aor caus & pass': [],
-                        'aor pass': [],
-                        'aor desid': [],
-                        'aor desid & caus': [],
-                        'aor intens': [],
-                        'aor deno': [],
-                        'aor deno & caus': [],
-                        'aor ✗': [],
-
-                        'fut': [],
-                        'fut caus': [],
-                        'fut caus & pass': [],
-                        'fut pass': [],
-                        'fut desid': [],
-                        'fut desid & caus': [],
-                        'fut intens': [],
-                        'fut deno': [],
-                        'fut deno & caus': [],
-                        'fut ✗': [],
-
-                        'cond': [],
-                        'cond caus': [],
-                        'cond caus & pass': [],
-                        'cond pass': [],
-                        'cond desid': [],
-                        'cond desid & caus': [],
-                        'cond intens': [],
-                        'cond deno': [],
-                        'cond deno & caus': [],
-                        'cond ✗': [],
-
-                        'abs': [],
-                        'abs caus': [],
-                        'abs caus & pass': [],
-                        'abs pass': [],
-                        'abs desid': [],
-                        'abs desid & caus': [],
-                        'abs intens': [],
-                        'abs deno': [],
-                        'abs deno & caus': [],
-                        'abs ✗': [],
-
-                        'ger': [],
-                        'ger caus': [],
-                        'ger caus & pass': [],
-                        'ger pass': [],
-                        'ger desid': [],
-                        'ger desid & caus': [],
-                        'ger intens': [],
-                        'ger deno': [],
-                        'ger deno & caus': [],
-                        'ger ✗': [],
-
-                        'inf': [],
-                        'inf caus': [],
-                        'inf caus & pass': [],
-                        'inf pass': [],
-                        'inf desid': [],
-                        'inf desid & caus': [],
-                        'inf intens': [],
-                        'inf deno': [],
-                        'inf deno & caus': [],
-                        'inf ✗': [],
-                    },
-
-                    'participles': {
-                        'prp': [],
-                        'prp caus': [],
-                        'prp caus & pass': [],
-                        'prp pass': [],
-                        'prp desid': [],
-                        'prp desid & caus': [],
-                        'prp desid & pass': [],
-                        'prp intens': [],
-                        'prp deno': [],
-                        'prp deno & caus': [],
-                        'prp ✗': [],
-
-                        'pp': [],
-                        'pp caus': [],
-                        'pp caus & pass': [],
-                        'pp pass': [],
-                        'pp desid': [],
-                        'pp desid & caus': [],
-                        'pp intens': [],
-                        'pp deno': [],
-                        'pp deno & caus': [],
-                        'pp ✗': [],
-
-                        'app': [],
-                        'app ✗': [],
-
-                        'ptp': [],
-                        'ptp caus': [],
-                        'ptp caus & pass': [],
-                        'ptp pass': [],
-                        'ptp desid': [],
-                        'ptp desid & caus': [],
-                        'ptp intens': [],
-                        'ptp deno': [],
-                        'ptp deno & caus': [],
-                        'ptp ✗': [],
-
-                    },
-
-                    'nouns': {
-                        'masc': [],
-                        'masc caus': [],
-                        'masc caus & pass': [],
-                        'masc pass': [],
-                        'masc desid': [],
-                        'masc desid & caus': [],
-                        'masc intens': [],
-                        'masc deno': [],
-                        'masc deno & caus': [],
-                        'masc ✗': [],
-
-                        'fem': [],
-                        'fem caus': [],
-                        'fem caus & pass': [],
-                        'fem pass': [],
-                        'fem desid': [],
-                        'fem desid & caus': [],
-                        'fem intens': [],
-                        'fem deno': [],
-                        'fem deno & caus': [],
-                        'fem ✗': [],
-
-                        'nt': [],
-                        'nt caus': [],
-                        'nt caus & pass': [],
-                        'nt pass': [],
-                        'nt desid': [],
-                        'nt desid & caus': [],
-                        'nt intens': [],
-                        'nt deno': [],
-                        'nt deno & caus': [],
-                        'nt ✗': [],
-                        },
-
-                    'adjectives': {
-                        'adj': [],
-                        'adj caus': [],
-                        'adj caus & pass': [],
-                        'adj pass': [],
-                        'adj desid': [],
-                        'adj desid & caus': [],
-                        'adj intens': [],
-                        'adj deno': [],
-                        'adj deno & caus': [],
-                        'adj ✗': [],
-                    },
-
-                    'adverbs': {
-                        'ind': [],
-                        'ind caus': [],
-                        'ind caus & pass': [],
-                        'ind pass': [],
-                        'ind desid': [],
-                        'ind desid & caus': [],
-                        'ind intens': [],
-                        'ind deno': [],
-                        'ind deno & caus': [],
-                        'ind ✗': [],
-                        },
-                    }
-
-            # assign words to dict categories
-            if i.pos == 'pr':
-                # first caus & pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['pr caus & pass'] += [headword]
-                    word_counter += 1
-
-                # desid & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdesid\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['pr desid & caus'] += [headword]
-                    word_counter += 1
-
-                # intens & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bintens\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['pr intens & caus'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['pr deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['pr caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['pr pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['pr intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['pr desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['pr deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['verbs']['pr'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'imp':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['imp caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['imp deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['imp caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['imp pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['imp intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['imp desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['imp deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['verbs']['imp'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'opt':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['opt caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['opt deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['opt caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['opt pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['opt intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['opt desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['opt deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['verbs']['opt'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'perf':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['perf caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['perf deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['perf caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['perf pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['perf intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['perf desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['perf deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['verbs']['perf'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'imperf':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['imperf caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['imperf deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['imperf caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['imperf pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['imperf intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['imperf desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['imperf deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['verbs']['imperf'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'aor':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['aor caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['aor deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['aor caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['aor pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['aor intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['aor desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['aor deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['verbs']['aor'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'fut':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['fut caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['aor deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['fut caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['fut pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['fut intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['fut desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['fut deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['verbs']['fut'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'cond':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['cond caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['cond deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['cond caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['cond pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['cond intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['cond desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['cond deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['verbs']['cond'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'abs':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['abs caus & pass'] += [headword]
-                    word_counter += 1
-
-                # desid & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdesid\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['abs desid & caus'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['abs deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['abs caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['abs pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['abs intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['abs desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['abs deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['verbs']['abs'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'ger':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['ger caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['ger deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['ger caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['ger pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['ger intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['ger desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['ger deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['verbs']['ger'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'inf':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['inf caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['verbs']['inf deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['inf caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['inf pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['inf intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['inf desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['verbs']['inf deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['verbs']['inf'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'prp':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['participles']['prp caus & pass'] += [headword]
-                    word_counter += 1
-
-                # desid and pass
-                elif (re.findall(r"\bdesid\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['participles']['prp desid & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['participles']['prp deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['prp caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['prp pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['prp intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['prp desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['prp deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['participles']['prp'] += [headword]
-                    word_counter += 1
+# the layout of the matrix, in display order
+variants = [
+    "", "caus", "caus & pass", "pass", "desid", "desid & caus",
+    "intens", "deno", "deno & caus", "✗"]
+
+
+def _pos_keys(pos: str, extra: Optional[tuple[str, str]] = None) -> list[str]:
+    """All the keys of one pos, with an extra variant inserted after another."""
+    pos_variants = variants.copy()
+    if extra:
+        after, variant = extra
+        pos_variants.insert(pos_variants.index(after) + 1, variant)
+    return [f"{pos} {variant}".strip() for variant in pos_variants]
+
+
+matrix_layout: list[tuple[str, list[str]]] = [
+    ("verbs",
+        _pos_keys("pr", ("intens", "intens & caus"))
+        + _pos_keys("imp") + _pos_keys("opt") + _pos_keys("perf")
+        + _pos_keys("imperf") + _pos_keys("aor") + _pos_keys("fut")
+        + _pos_keys("cond") + _pos_keys("abs") + _pos_keys("ger")
+        + _pos_keys("inf")),
+    ("participles",
+        _pos_keys("prp", ("desid & caus", "desid & pass"))
+        + _pos_keys("pp") + ["app", "app ✗"] + _pos_keys("ptp")),
+    ("nouns",
+        _pos_keys("masc") + _pos_keys("fem") + _pos_keys("nt")),
+    ("adjectives",
+        _pos_keys("adj")),
+    ("adverbs",
+        _pos_keys("ind")),
+]
+
+
+# templates, built once
+
+table_open = "<table class='root_matrix'>"
+table_close = "</table>"
+category_templates = {
+    category: f"<tr><th colspan='2'>{category}</th></tr>"
+    for category, __pos_keys__ in matrix_layout}
+row_templates = {
+    key: f"<tr><td><b>{key}</b></td><td>{{}}</td></tr>"
+    for __category__, pos_keys in matrix_layout
+    for key in pos_keys}
+
+
+# classification of the root_base, tested in order, first match wins
+
+re_caus = re.compile(r"\bcaus\b")
+re_pass = re.compile(r"\bpass\b")
+re_desid = re.compile(r"\bdesid\b")
+re_intens = re.compile(r"\bintens\b")
+re_deno = re.compile(r"\bdeno\b")
+re_pp = re.compile(r"\bpp\b")
+re_app = re.compile(r"\bapp\b")
+
+variant_tests: dict[str, tuple[re.Pattern, ...]] = {
+    "caus & pass": (re_caus, re_pass),
+    "desid & caus": (re_caus, re_desid),
+    "desid & pass": (re_desid, re_pass),
+    "intens & caus": (re_caus, re_intens),
+    "deno & caus": (re_caus, re_deno),
+    "caus": (re_caus,),
+    "pass": (re_pass,),
+    "intens": (re_intens,),
+    "desid": (re_desid,),
+    "deno": (re_deno,),
+}
+
+standard_order = [
+    "caus & pass", "deno & caus", "caus", "pass", "intens", "desid", "deno"]
+
+
+def _variant_rules(
+    pos: str,
+    order: list[str] = standard_order,
+    renamed: Optional[dict[str, str]] = None
+) -> tuple[tuple[tuple[re.Pattern, ...], str], ...]:
+    """(tests, key) for each variant of a pos, ending with the plain pos."""
+    renamed = renamed or {}
+    rules = [
+        (variant_tests[variant], renamed.get(variant, f"{pos} {variant}"))
+        for variant in order]
+    rules.append(((), pos))
+    return tuple(rules)
+
+
+def _with(*extra: str) -> list[str]:
+    """The standard order with combined variants added after caus & pass."""
+    return standard_order[:1] + list(extra) + standard_order[1:]
+
+
+verb_rules = {
+    pos: _variant_rules(pos) for pos in [
+        "imp", "opt", "perf", "imperf", "aor", "cond", "ger", "inf"]}
+verb_rules["pr"] = _variant_rules("pr", _with("desid & caus", "intens & caus"))
+verb_rules["abs"] = _variant_rules("abs", _with("desid & caus"))
+# fut deno & caus has always been listed under aor
+verb_rules["fut"] = _variant_rules(
+    "fut", renamed={"deno & caus": "aor deno & caus"})
+
+prp_rules = _variant_rules("prp", _with("desid & pass"))
+prp_adj_rules = _variant_rules("prp")
+pp_rules = _variant_rules("pp")
+ptp_rules = _variant_rules("ptp")
+masc_rules = _variant_rules("masc")
+fem_rules = _variant_rules("fem")
+nt_rules = _variant_rules("nt")
+adj_rules = _variant_rules("adj")
+ind_rules = _variant_rules("ind")
+app_rules = _variant_rules("app", [])
+sogandhika_rules = _variant_rules("nt", [])
+
+
+def pick_rules(lemma_1: str, pos: str, grammar: str, root_base: str):
+    """Which variant rules apply to a headword, None if it does not fit."""
+
+    if pos in verb_rules:
+        return verb_rules[pos]
+    elif pos == "prp":
+        return prp_rules
+    elif pos == "adj" and "prp" in grammar:
+        return prp_adj_rules
+    elif pos == "pp":
+        return pp_rules
+    elif pos == "adj" and re_pp.search(grammar):
+        return pp_rules
+    elif re_app.search(grammar):
+        return app_rules
+    elif pos == "ptp":
+        return ptp_rules
+    elif pos == "adj" and "ptp" in grammar:
+        return ptp_rules
+    elif pos == "masc":
+        return masc_rules
+    elif pos == "root" and "masc" in grammar:
+        return masc_rules
+    elif pos == "fem":
+        return fem_rules
+    elif pos == "card" and "fem" in grammar:
+        return fem_rules
+    elif pos == "nt":
+        return nt_rules
+    # special case
+    elif lemma_1 == "sogandhika 3":
+        return sogandhika_rules
+    elif pos == "adj":
+        return adj_rules
+    elif pos == "suffix" and "adj" in root_base:
+        return adj_rules
+    elif pos == "ind":
+        return ind_rules
+    elif pos == "suffix":
+        return ind_rules
+    else:
+        return None
+
+
+def classify(lemma_1: str, pos: str, grammar: str, root_base: str) -> Optional[str]:
+    """The matrix key of a headword, e.g. 'pr caus', None if it does not fit."""
+
+    rules = pick_rules(lemma_1, pos, grammar, root_base)
+    if rules is None:
+        return None
+    for tests, key in rules:
+        if all(test.search(root_base) for test in tests):
+            return key
+
+
+class RootMatrix:
+    """The headwords of one root, by matrix key."""
+
+    __slots__ = ["root_key", "cells", "word_count", "total_count"]
+
+    def __init__(self, root_key: str) -> None:
+        self.root_key = root_key
+        self.cells: dict[str, list[str]] = {}
+        self.word_count = 0
+        self.total_count = 0
+
+    def add(self, lemma_1: str, pos: str, grammar: str, root_base: str) -> None:
+        self.total_count += 1
+        key = classify(lemma_1, pos, grammar, root_base)
+        if key is None:
+            print(f"[bright_red]ERROR: {lemma_1}[white]")
+        else:
+            self.cells.setdefault(key, []).append(lemma_1)
+            self.word_count += 1
+
+    def render(self) -> str:
+        html = [table_open]
+        for category, pos_keys in matrix_layout:
+            category_open = False
+            for key in pos_keys:
+                words = self.cells.get(key)
+                if words:
+                    if not category_open:
+                        html.append(category_templates[category])
+                        category_open = True
+                    html.append(row_templates[key].format(
+                        ", ".join(superscripter_uni(word) for word in words)))
+        html.append(table_close)
+        return "".join(html)
+
+
+def stream_root_matrices(db_session: Session) -> Iterator[RootMatrix]:
+    """Yield a RootMatrix for each root_key, one at a time.
+    Headwords keep their id order within a root."""
+
+    results = db_session.execute(
+        select(
+            DpdHeadword.root_key,
+            DpdHeadword.lemma_1,
+            DpdHeadword.pos,
+            DpdHeadword.grammar,
+            DpdHeadword.root_base)
+        .where(DpdHeadword.root_key != "")
+        .order_by(DpdHeadword.root_key, DpdHeadword.id)
+        .execution_options(yield_per=2000))
+
+    for root_key, rows in groupby(results, key=lambda x: x[0]):
+        matrix = RootMatrix(root_key)
+        for __root_key__, lemma_1, pos, grammar, root_base in rows:
+            matrix.add(lemma_1, pos, grammar, root_base)
+        yield matrix
+
+
+def generate_root_matrix(
+    db_session: Session,
+    keep_html: bool = False,
+    batch_size: int = 500
+) -> Optional[dict[str, str]]:
+    """Generate the root matrix of every root and save it in dpd_roots.
+    Return a dict of root_key: html if keep_html, e.g. for anki."""
 
-            elif i.pos == 'adj' and re.findall("prp", i.grammar):
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['participles']['prp caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['participles']['prp deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['prp caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['prp pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['prp intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['prp desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['prp deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['participles']['prp'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'pp':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['participles']['pp caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['participles']['pp deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['pp caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['pp pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['pp intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['pp desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['pp deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['participles']['pp'] += [headword]
-                    word_counter += 1
-
-            # adj and pp
-            elif i.pos == 'adj' and re.findall(r"\bpp\b", i.grammar):
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['participles']['pp caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['participles']['pp deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['pp caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['pp pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['pp intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['pp desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['pp deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['participles']['pp'] += [headword]
-                    word_counter += 1
-
-            # app
-            elif re.findall(r"\bapp\b", i.grammar):
-                root_matrix[i.root_key]['participles']['app'] += [headword]
-                word_counter += 1
-
-            elif i.pos == 'ptp':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['participles']['ptp caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['participles']['ptp deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['ptp caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['ptp pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['ptp intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['ptp desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['ptp deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['participles']['ptp'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'adj' and re.findall("ptp", i.grammar):
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['participles']['ptp caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['participles']['ptp deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['ptp caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['ptp pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['ptp intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['ptp desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['participles']['ptp deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['participles']['ptp'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'masc':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['nouns']['masc caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['nouns']['masc deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['masc caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['masc pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['masc intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['masc desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['masc deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['nouns']['masc'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'root' and re.findall('masc', i.grammar):
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['nouns']['masc caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['nouns']['masc deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['masc caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['masc pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['masc intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['masc desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['masc deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['nouns']['masc'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'fem':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['nouns']['fem caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['nouns']['fem deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['fem caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['fem pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['fem intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['fem desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['fem deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['nouns']['fem'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'card' and re.findall("fem", i.grammar):
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['nouns']['fem caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['nouns']['fem deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['fem caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['fem pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['fem intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['fem desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['fem deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['nouns']['fem'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'nt':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['nouns']['nt caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['nouns']['nt deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['nt caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['nt pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['nt intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['nt desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['nouns']['nt deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['nouns']['nt'] += [headword]
-                    word_counter += 1
-
-            # special case
-            elif headword == 'sogandhika 3':
-                root_matrix[i.root_key]['nouns']['nt'] += [headword]
-                word_counter += 1
-
-
-            elif i.pos == 'adj':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['adjectives']['adj caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['adjectives']['adj deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['adjectives']['adj caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['adjectives']['adj pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['adjectives']['adj intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['adjectives']['adj desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['adjectives']['adj deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['adjectives']['adj'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'suffix' and re.findall('adj', i.root_base):
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['adjectives']['adj caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['adjectives']['adj deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['adjectives']['adj caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['adjectives']['adj pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['adjectives']['adj intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['adjectives']['adj desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['adjectives']['adj deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['adjectives']['adj'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'ind':
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['adverbs']['ind caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['adverbs']['ind deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['adverbs']['ind caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['adverbs']['ind pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['adverbs']['ind intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['adverbs']['ind desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['adverbs']['ind deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['adverbs']['ind'] += [headword]
-                    word_counter += 1
-
-            elif i.pos == 'suffix': # and re.findall('ind', 'root_base'):
-                # first caus and pass
-                if (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bpass\b", i.root_base)):
-                    root_matrix[i.root_key]['adverbs']['ind caus & pass'] += [headword]
-                    word_counter += 1
-
-                # deno & caus
-                elif (re.findall(r"\bcaus\b", i.root_base) and re.findall(r"\bdeno\b", i.root_base)):
-                    root_matrix[i.root_key]['adverbs']['ind deno & caus'] += [headword]
-                    word_counter += 1
-
-                # caus
-                elif re.findall(r"\bcaus\b", i.root_base):
-                    root_matrix[i.root_key]['adverbs']['ind caus'] += [headword]
-                    word_counter += 1
-
-                # pass
-                elif re.findall(r"\bpass\b", i.root_base):
-                    root_matrix[i.root_key]['adverbs']['ind pass'] += [headword]
-                    word_counter += 1
-
-                # intens
-                elif re.findall(r"\bintens\b", i.root_base):
-                    root_matrix[i.root_key]['adverbs']['ind intens'] += [headword]
-                    word_counter += 1
-
-                # desid
-                elif re.findall(r"\bdesid\b", i.root_base):
-                    root_matrix[i.root_key]['adverbs']['ind desid'] += [headword]
-                    word_counter += 1
-
-                # deno
-                elif re.findall(r"\bdeno\b", i.root_base):
-                    root_matrix[i.root_key]['adverbs']['ind deno'] += [headword]
-                    word_counter += 1
-
-                # normal
-                else:
-                    root_matrix[i.root_key]['adverbs']['ind'] += [headword]
-                    word_counter += 1
+    print("[green]generating root matrix")
 
-            else:
-                print(f"[bright_red]ERROR: {headword}[white]")
+    roots = set(db_session.scalars(select(DpdRoot.root)))
+    html_dict: dict[str, str] = {}
+    done: set[str] = set()
+    batch: list[dict[str, str]] = []
+    word_counter = 0
+    total_counter = 0
 
-            total_counter += 1
+    def write_batch() -> None:
+        if batch:
+            db_session.execute(update(DpdRoot), batch)
+            batch.clear()
+
+    for matrix in stream_root_matrices(db_session):
+        word_counter += matrix.word_count
+        total_counter += matrix.total_count
+        html = matrix.render()
+        if keep_html:
+            html_dict[matrix.root_key] = html
+        if matrix.root_key in roots:
+            done.add(matrix.root_key)
+            batch.append({"root": matrix.root_key, "root_matrix": html})
+            if len(batch) >= batch_size:
+                write_batch()
 
     print(f"[green]roots added: {word_counter:,} / {total_counter:,}")
 
-    # generate html
-
-    print("[green]generating html")
-
-    html_dict = {}
-
-    for counter, (root_key, data1) in enumerate(root_matrix.items()):
-        html = "<table class='root_matrix'>"
-        total_count = 0
-
-        for category, data2 in data1.items():
-            cflag = True
-            for pos, words  in data2.items():
-                total_count += len(words)
-                if words != []:
-
-                    if cflag:
-                        html += f"<tr><th colspan='2'>{category}</th></tr>"
-                        html += f"<tr><td><b>{pos}</b></td><td>"
-                        cflag = False
-
-                    else:
-                        html += f"<tr><td><b>{pos}</b></td><td>"
-
-                    for word in words:
-                        if word != words[-1]:
-                            html += f"{superscripter_uni(word)}, "
-                        else:
-                            html += f"{superscripter_uni(word)}</td></tr>"
-
-        html += "</table>"
-
-        html_dict[root_key] = html
-
     # add back into db
-    print("[green]adding to db", end= " ")
-    roots_db = db_session.query(DpdRoot).all()
-    for counter, i in enumerate(roots_db):
-        try:
-            i.root_matrix = html_dict[i.root]
-        except KeyError:
-            print(f"[bright_red]!!! ERROR: {i.root} [red]does not exist, consider deleting it.", end=" ")
-            i.root_matrix = ""
-
-    print(f"[green]{counter}")
+    print("[green]adding to db", end=" ")
+    for root in sorted(roots - done):
+        print(f"[bright_red]!!! ERROR: {root} [red]does not exist, consider deleting it.", end=" ")
+        batch.append({"root": root, "root_matrix": ""})
+    write_batch()
+    print(f"[green]{len(roots)}")
 
     db_session.commit()
 
-    return html_dict
\ No newline at end of file
+    if keep_html:
+        return html_dict
+    else:
+        return None
@@ -1,24 +1,47 @@
 #!/usr/bin/env python3
 
 """External tests examine the relationship between a word's data and other
-    words in the db. """
+    words in the db.
 
+Every test is a rule which declares the columns it reads. The headwords are
+loaded once with only those columns, and all the rules run in one pass over
+the rows, split across all cores. Rules which compare a row with the rest of
+the db read from a context made from all the rows first.
+
+Results are saved as json. With --changed, rules only run on the rows whose
+columns have changed since the last run, and all other results are kept.
+
+Usage:
+    python db_tests/tests_external.py
+    python db_tests/tests_external.py --changed --no-input
+"""
+
+import argparse
+import hashlib
+import json
+import pickle
 import re
+import psutil
 import pyperclip
 
-from typing import Dict, Optional
+from collections import Counter
+from functools import lru_cache
+from multiprocessing import Manager, Process
+from multiprocessing.managers import ListProxy
+from typing import Callable, NamedTuple, Optional
 from rich import print
 
+from sqlalchemy.orm import load_only
+
 from db.db_helpers import get_db_session
-from db.models import DpdRoot
 from db.models import DpdHeadword
-from db.models import FamilyCompound
 from tools.tic_toc import tic, toc
 from tools.pali_alphabet import consonants
 from tools.paths import ProjectPaths
 from tools.sandhi_contraction import make_sandhi_contraction_dict
+from tools.utils import list_into_batches
 
-# generic tests that return tuples of results
+# generic tests that return lists of results
 # that can be printed or displayed in gui
 
 # run through the db once generting all the necessary sets and lists
@@ -27,81 +50,279 @@ from tools.sandhi_contraction import make_sandhi_contraction_dict
 # describe each test in detail
 
 
-def run_external_tests():
+class Context(NamedTuple):
+    """Sets and counts made from all the rows, used by rules
+    which compare a row with the rest of the db."""
+
+    compound_family_numbered: set[str]
+    clean_headwords_count: Counter[str]
+    root_families: set[str]
+
+
+# columns the context is made from
+context_fields = ("lemma_1", "family_compound", "family_root")
+
+
+class Rule(NamedTuple):
+    name: str
+    solution: str
+    fields: tuple[str, ...]
+    test: Callable[[DpdHeadword, Context], list[str]]
+    uses_context: bool
+    # results are unique and sorted, instead of in row order
+    distinct: bool
+
+
+# all rules in the order they are shown
+rules: list[Rule] = []
+
+
+def rule(
+    name: str,
+    solution: str,
+    fields: list[str],
+    uses_context: bool = False,
+    distinct: bool = False
+):
+    """Register a test of one row, which returns a list of results."""
+
+    def register(test):
+        rules.append(Rule(
+            name, solution, tuple(fields), test, uses_context, distinct))
+        return test
+    return register
+
+
+def run_external_tests(changed_only: bool, show: bool):
 
     print("[bright_yellow]run external db tests")
     pth = ProjectPaths()
     db_session = get_db_session(pth.dpd_db_path)
 
-    print("[green]make searches")
-    searches: dict = make_searches(db_session)
-
-    for item in searches:
-        print(item, len(searches[item]))
-    print()
-
-    # tests
-    results_list = []
-    results_list.append(family_compound_no_number(searches))
-    results_list.append(suffix_does_not_match_lemma_1(searches))
-    results_list.append(construction_line1_does_not_match_lemma_1(searches))
-    results_list.append(construction_line2_does_not_match_lemma_1(searches))
-    results_list.append(lemma_1_missing_a_number(searches))
-    results_list.append(lemma_1_contains_extra_number(searches))
-    results_list.append(derived_from_not_in_headwords(searches))
-    results_list.append(pali_words_in_english_meaning(searches))
-    results_list.append(derived_from_not_in_family_compound(searches))
-    results_list.append(pos_does_not_equal_grammar(searches))
-    results_list.append(pos_does_not_equal_pattern(searches))
-    results_list.append(base_contains_extra_star(searches))
-    results_list.append(base_is_missing_star(searches))
-    results_list.append(root_x_root_family_mismatch(searches))
-    results_list.append(root_x_construction_mismatch(searches))
-    results_list.append(family_root_x_construction_mismatch(searches))
-    results_list.append(root_key_x_base_mismatch(searches))
-    results_list.append(root_sign_x_base_mismatch(searches))
-    results_list.append(root_sign_x_base_mismatch(searches))
-    results_list.append(root_base_x_construction_mismatch(searches))
-    results_list.append(wrong_prefix_in_family_root(searches))
-    results_list.append(variant_equals_lemma_1(searches))
-    results_list.append(antonym_equals_lemma_1(searches))
-    results_list.append(synonym_equals_lemma_1(searches))
-    # results_list.append(sandhi_contraction_errors(db_session))
-    results_list.append(duplicate_phrases(searches))
-    results_list.append(duplicate_words(searches))
-    results_list.append(duplicate_words_meaning_2(searches))
-    results_list.append(duplicate_words_meaning_lit(searches))
-    results_list.append(identical_meaning_1_meaning_lit(searches))
-    results_list.append(synonym_equals_variant(searches))
-    results_list.append(pos_idiom_no_space_is_sandhi(searches))
+    print("[green]loading headwords", end=" ")
+    fields = sorted({field for r in rules for field in r.fields} | set(context_fields))
+    db = db_session.query(DpdHeadword) \
+        .options(load_only(*[getattr(DpdHeadword, field) for field in fields])) \
+        .order_by(DpdHeadword.id) \
+        .all()
+    # detached, so a rule which reads an undeclared column fails
+    db_session.expunge_all()
+    print(f"[white]{len(db):,}")
+
+    print("[green]making context")
+    context = make_context(db)
+    row_hashes = {i.id: hash_row(i, fields) for i in db}
+    context_hash = hash_context(db)
+
+    old_results: dict[str, dict[int, list[str]]] = {}
+    rows_to_test = db
+    context_rows = db
+
+    if changed_only:
+        old_hashes, old_context_hash, old_results = load_last_run(pth)
+        rows_to_test = [i for i in db if old_hashes.get(i.id) != row_hashes[i.id]]
+        if context_hash == old_context_hash:
+            context_rows = rows_to_test
+        print(f"[green]changed rows [white]{len(rows_to_test):,}")
+        if old_context_hash and context_hash != old_context_hash:
+            print("[green]context has changed, testing all rows on context rules")
+
+    print("[green]running rules", end=" ")
+    new_results = run_rules(rows_to_test, context_rows, context)
+    print(f"[white]{len(rules)}")
+
+    # keep the old results of rows which were not tested
+    existing_ids = set(row_hashes)
+    rows_dict: dict[str, dict[int, list[str]]] = {}
+    for r in rules:
+        tested_ids = {
+            i.id for i in (context_rows if r.uses_context else rows_to_test)}
+        rule_rows = {
+            id: values for id, values in old_results.get(r.name, {}).items()
+            if id in existing_ids and id not in tested_ids}
+        rule_rows.update(new_results.get(r.name, {}))
+        rows_dict[r.name] = dict(sorted(rule_rows.items()))
+
+    results_list = make_results_list(rows_dict)
+    save_results(pth, results_list, rows_dict)
+    save_last_run(pth, row_hashes, context_hash)
 
     for name, result, count, solution in results_list:
         print(f"[green]{name.replace('_', ' ')} [{count}]")
-        if count > 0:
+        if count > 0 and show:
             print(f"solution: {solution}")
-            print(result, end=" ")
-            pyperclip.copy(result)
+            print(regex_results(result), end=" ")
+            pyperclip.copy(regex_results(result))
             input()
         print()
 
 
-def make_searches(db_session) -> Dict[str, list]:
-    """Make a dict of all searches to be used by functions."""
+def make_context(db: list[DpdHeadword]) -> Context:
+    """One pass over all the rows for the sets and counts of the context."""
+
+    # compound_family with numbers
+    compound_family_numbered = set()
+    clean_headwords_count: Counter[str] = Counter()
+    root_families = set()
+
+    for i in db:
+        for fc in i.family_compound_list:
+            if digit_regex.search(fc):
+                fc = digit_regex.sub("", fc)
+                if fc:
+                    compound_family_numbered.add(fc)
+        clean_headwords_count[i.lemma_clean] += 1
+        if i.family_root:
+            root_families.add(i.family_root)
+
+    return Context(compound_family_numbered, clean_headwords_count, root_families)
+
 
-    searches = {}
+def hash_row(i: DpdHeadword, fields: list[str]) -> str:
+    values = "\x1f".join(str(getattr(i, field)) for field in fields)
+    return hashlib.blake2b(values.encode("utf-8"), digest_size=8).hexdigest()
 
-    dpd_headword = db_session.query(DpdHeadword).all()
-    searches["dpd_headword"] = dpd_headword
 
-    dpd_roots = db_session.query(DpdRoot).all()
-    searches["dpd_roots"] = dpd_roots
+def hash_context(db: list[DpdHeadword]) -> str:
+    """Hash of the columns of all rows the context is made from."""
+    context_hash = hashlib.blake2b(digest_size=16)
+    for i in db:
+        for field in context_fields:
+            context_hash.update(f"{getattr(i, field)}\x1f".encode("utf-8"))
+    return context_hash.hexdigest()
 
-    compound_families = db_session.query(FamilyCompound).all()
-    searches["compound_families"] = compound_families
 
+def _run_rules_batch(
+    rows: list[DpdHeadword],
+    test_ids: set[int],
+    context_ids: set[int],
+    context: Context,
+    results_list: ListProxy
+) -> None:
+    """Run all the rules on a batch of rows, in one pass.
+    Row rules run on the rows to test, context rules on the context rows."""
 
+    row_rules = [r for r in rules if not r.uses_context]
+    context_rules = [r for r in rules if r.uses_context]
+    results = []
+    for i in rows:
+        rules_of_row: list[Rule] = []
+        if i.id in test_ids:
+            rules_of_row += row_rules
+        if i.id in context_ids:
+            rules_of_row += context_rules
+        for r in rules_of_row:
+            values = r.test(i, context)
+            if values:
+                results.append((r.name, i.id, values))
+    results_list.append(results)
+
+
+def run_rules(
+    rows_to_test: list[DpdHeadword],
+    context_rows: list[DpdHeadword],
+    context: Context
+) -> dict[str, dict[int, list[str]]]:
+    """{rule name: {id: results}} of the row rules on the rows to test,
+    and the context rules on the context rows."""
+
+    test_ids = {i.id for i in rows_to_test}
+    context_ids = {i.id for i in context_rows}
+    rows = rows_to_test + [i for i in context_rows if i.id not in test_ids]
+    if not rows:
+        return {}
+
+    num_logical_cores = psutil.cpu_count()
+    batches: list[list[DpdHeadword]] = list_into_batches(rows, num_logical_cores)
+
+    processes: list[Process] = []
+    manager = Manager()
+    results_list: ListProxy = manager.list()
+
+    for batch in batches:
+        p = Process(
+            target=_run_rules_batch,
+            args=(batch, test_ids, context_ids, context, results_list))
+        p.start()
+        processes.append(p)
+
+    for p in processes:
+        p.join()
+
+    results: dict[str, dict[int, list[str]]] = {}
+    for batch_results in results_list:
+        for name, id, values in batch_results:
+            results.setdefault(name, {})[id] = values
+    return results
+
+
+def make_results_list(
+    rows_dict: dict[str, dict[int, list[str]]]
+) -> list[tuple[str, list[str], int, str]]:
+    """(name, results, count, solution) of every rule."""
 
-    return searches
+    results_list = []
+    for r in rules:
+        results = [
+            value for values in rows_dict[r.name].values() for value in values]
+        if r.distinct:
+            results = sorted(set(results))
+        results_list.append((r.name, results, len(results), r.solution))
+    return results_list
+
+
+def save_results(
+    pth: ProjectPaths,
+    results_list: list[tuple[str, list[str], int, str]],
+    rows_dict: dict[str, dict[int, list[str]]]
+) -> None:
+    """Results of every rule, and of every row, as json."""
+
+    results_json = [
+        {
+            "name": name,
+            "solution": solution,
+            "count": count,
+            "results": results,
+            "rows": rows_dict[name],
+        }
+        for name, results, count, solution in results_list]
+    with open(pth.external_tests_path, "w") as f:
+        json.dump(results_json, f, ensure_ascii=False, indent=1)
+
+
+def load_last_run(
+    pth: ProjectPaths
+) -> tuple[dict[int, str], str, dict[str, dict[int, list[str]]]]:
+    """Row hashes, context hash and results of each row of the last run."""
+
+    if not (
+        pth.external_tests_hashes_path.exists() and
+        pth.external_tests_path.exists()
+    ):
+        return {}, "", {}
+
+    with open(pth.external_tests_hashes_path, "rb") as f:
+        row_hashes, context_hash = pickle.load(f)
+    with open(pth.external_tests_path) as f:
+        old_results = {
+            item["name"]: {int(id): values for id, values in item["rows"].items()}
+            for item in json.load(f)}
+
+    # a new rule has no results yet, so test all rows
+    if any(r.name not in old_results for r in rules):
+        return {}, "", old_results
+
+    return row_hashes, context_hash, old_results
+
+
+def save_last_run(
+    pth: ProjectPaths,
+    row_hashes: dict[int, str],
+    context_hash: str
+) -> None:
+    with open(pth.external_tests_hashes_path, "wb") as f:
+        pickle.dump((row_hashes, context_hash), f)
 
 
 def regex_results(results: list) -> Optional[str]:
@@ -118,62 +339,68 @@ def regex_results(results: list) -> Optional[str]:
     return regex_string
 
 
-def family_compound_no_number(searches: dict) -> tuple:
+digit_regex = re.compile(r"\d")
+construction_line2_regex = re.compile("\n.+")
+irreg_form_regex = re.compile("irreg form of")
+comp_regex = re.compile(r"\bcomp\b")
+not_english_regex = re.compile(r"[^A-Za-zāīūṭḍḷñṅṇṃ1234567890\-'’ ]")
+grammar_pos_regex = re.compile("( |,).+$")
+pattern_last_regex = re.compile(".* ")
+pattern_middle_regex = re.compile(".* (.+) .*")
+star_plus_regex = re.compile(r"\*|\+")
+base_twice_regex = re.compile("> .+ >")
+root_base_exceptions_regex = re.compile("intens|desid|perf|fut")
+root_in_construction_regex = re.compile("(.*√)(.[^ ]*)(.*)")
+root_in_base_regex = re.compile("(√.[^ ]*)(.*)")
+root_family_prefix_regex = re.compile(".*√")
+base_prefix_regex = re.compile("^.+> ")
+base_suffix_regex = re.compile(r" \(.+$")
+brackets_regex = re.compile(r"^\(.*\)| \(.*\)")
+brackets_lazy_regex = re.compile(r"\(.+?\) | \(.+?\)")
+
+
+@rule(
+    "family_compound_no_number",
+    "add a number to family_compound with multiple meanings",
+    ["lemma_1", "family_compound"], uses_context=True)
+def family_compound_no_number(i: DpdHeadword, context: Context) -> list[str]:
     """Find words in compound_family which should have a number
     because there is more than one meaning."""
 
-    # make a list of all compound_family with numbers
-    compound_family_numbered = set()
-    results = []
+    return [
+        i.lemma_1 for fc in i.family_compound.split(" ")
+        if fc in context.compound_family_numbered]
 
-    for i in searches["dpd_headword"]:
-        for fc in i.family_compound_list:
-            if re.findall(r"\d", fc):
-                fc = re.sub(r"\d", "", fc)
-                if fc:
-                    compound_family_numbered.add(fc)
 
-    for i in searches["dpd_headword"]:
-        for fc in i.family_compound.split(" "):
-            if fc in compound_family_numbered:
-                results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "family_compound_no_number"
-    solution = "add a number to family_compound with multiple meanings"
-
-    return name, results, length, solution
-
-
-def suffix_does_not_match_lemma_1(searches: dict) -> tuple:
+@rule(
+    "suffix_does_not_match_lemma_1",
+    "change suffix",
+    ["lemma_1", "suffix"])
+def suffix_does_not_match_lemma_1(i: DpdHeadword, context: Context) -> list[str]:
     """Suffix last letter does not match the last letter of lemma_1."""
 
-    results = []
     exceptions = [
         "adhipa", "bavh", "labbhā", "munī", "gatī", "visesi", "khantī",
         "sāraṇī", "bahulī", "yānī 2", "yada", "sabbadhī", "missī"]
 
-    for i in searches["dpd_headword"]:
-        if i.suffix and i.lemma_1 not in exceptions:
-            suffix_lastletter = i.suffix[-1]
-            lemma_clean_lastletter = i.lemma_clean[-1]
+    if i.suffix and i.lemma_1 not in exceptions:
+        suffix_lastletter = i.suffix[-1]
+        lemma_clean_lastletter = i.lemma_clean[-1]
 
-            if suffix_lastletter != lemma_clean_lastletter:
-                results += [i.lemma_1]
+        if suffix_lastletter != lemma_clean_lastletter:
+            return [i.lemma_1]
+    return []
 
-    length = len(results)
-    results = regex_results(results)
-    name = "suffix_does_not_match_lemma_1"
-    solution = "change suffix"
 
-    return name, results, length, solution
-
-
-def construction_line1_does_not_match_lemma_1(searches: dict) -> tuple:
+@rule(
+    "construction_line1_does_not_match_lemma_1",
+    "edit construction or add to exceptions",
+    ["lemma_1", "construction", "meaning_1"])
+def construction_line1_does_not_match_lemma_1(
+    i: DpdHeadword, context: Context
+) -> list[str]:
     """The end of construction line 1 does not match the end of lemma_1."""
 
-    results = []
     exceptions = [
         "abhijaññā", "acc", "adhipa", "aññā 2", "aññā 3", "anujaññā",
         "anupādā", "attanī", "chettu", "devāna", "dubbalī", "gāmaṇḍala 2.1",
@@ -184,126 +411,83 @@ def construction_line1_does_not_match_lemma_1(searches: dict) -> tuple:
         "saḷ", "sat 1", "sat 2", "upādā", "vijaññā", "visesi", "govinda",
         "sivathikā", "sīvathikā", "sakad", "bahulī", "abhyati", "pasayhā"]
 
-    for i in searches["dpd_headword"]:
-        if i.lemma_1 not in exceptions:
-            if i.construction and i.meaning_1:
-                const_lastlettter = re.sub("\n.+", "", i.construction)[-1]
-                if i.lemma_clean[-1] != const_lastlettter:
-                    results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "construction_line1_does_not_match_lemma_1"
-    solution = "edit construction or add to exceptions"
-
-    return name, results, length, solution
+    if i.lemma_1 not in exceptions:
+        if i.construction and i.meaning_1:
+            const_lastlettter = construction_line2_regex.sub("", i.construction)[-1]
+            if i.lemma_clean[-1] != const_lastlettter:
+                return [i.lemma_1]
+    return []
 
 
-def construction_line2_does_not_match_lemma_1(searches: dict) -> tuple:
+@rule(
+    "construction_line2_does_not_match_lemma_1",
+    "edit construction line2",
+    ["lemma_1", "construction", "meaning_1"])
+def construction_line2_does_not_match_lemma_1(
+    i: DpdHeadword, context: Context
+) -> list[str]:
     """The end of construction line 1 does not match the end of lemma_1."""
 
-    results = []
+    if "\n" in i.construction and i.meaning_1:
+        const_lastlettter = i.construction[-1]
+        if i.lemma_clean[-1] != const_lastlettter:
+            return [i.lemma_1]
+    return []
 
-    for i in searches["dpd_headword"]:
-        if "\n" in i.construction and i.meaning_1:
-            const_lastlettter = i.construction[-1]
-            if i.lemma_clean[-1] != const_lastlettter:
-                results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "construction_line2_does_not_match_lemma_1"
-    solution = "edit construction line2"
-
-    return name, results, length, solution
 
-
-def lemma_1_missing_a_number(searches: dict) -> tuple:
+@rule(
+    "lemma_1_missing_a_number",
+    "add a number to lemma_1",
+    ["lemma_1"], uses_context=True)
+def lemma_1_missing_a_number(i: DpdHeadword, context: Context) -> list[str]:
     """lemma_1 does not contain a number, but should"""
 
-    results = []
-    clean_headwords_count: dict = {}
-
-    for i in searches["dpd_headword"]:
-        if i.lemma_clean not in clean_headwords_count:
-            clean_headwords_count[i.lemma_clean] = 1
-        else:
-            clean_headwords_count[i.lemma_clean] += 1
-
-    for i in searches["dpd_headword"]:
-        if not re.findall(r"\d", i.lemma_1):
-            if clean_headwords_count[i.lemma_clean] > 1:
-                results += [i.lemma_clean]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "lemma_1_missing_a_number"
-    solution = "add a number to lemma_1"
-
-    return name, results, length, solution
+    if not digit_regex.search(i.lemma_1):
+        if context.clean_headwords_count[i.lemma_clean] > 1:
+            return [i.lemma_clean]
+    return []
 
 
-def lemma_1_contains_extra_number(searches: dict) -> tuple:
+@rule(
+    "lemma_1_contains_extra_number",
+    "delete number from lemma_1",
+    ["lemma_1"], uses_context=True)
+def lemma_1_contains_extra_number(i: DpdHeadword, context: Context) -> list[str]:
     """lemma_1 contains a number, but shouldn't"""
 
-    results = []
-    clean_headwords_count: dict = {}
-
-    for i in searches["dpd_headword"]:
-        if i.lemma_clean not in clean_headwords_count:
-            clean_headwords_count[i.lemma_clean] = 1
-        else:
-            clean_headwords_count[i.lemma_clean] += 1
+    if digit_regex.search(i.lemma_1):
+        if context.clean_headwords_count[i.lemma_clean] == 1:
+            return [i.lemma_clean]
+    return []
 
-    for i in searches["dpd_headword"]:
-        if re.findall(r"\d", i.lemma_1):
-            if clean_headwords_count[i.lemma_clean] == 1:
-                results += [i.lemma_clean]
 
-    length = len(results)
-    results = regex_results(results)
-    name = "lemma_1_contains_extra_number"
-    solution = "delete number from lemma_1"
-    return name, results, length, solution
-
-
-def derived_from_not_in_headwords(searches: dict) -> tuple:
+@rule(
+    "derived_from_not_in_headwords",
+    "add derived from to dictionary, or edit derived_from",
+    ["lemma_1", "meaning_1", "derived_from", "grammar"], uses_context=True)
+def derived_from_not_in_headwords(i: DpdHeadword, context: Context) -> list[str]:
     """Test if derived from is not found in lemma_1."""
 
-    results = []
-    clean_headwords: set = set()
-    root_families: set = set()
-
-    for i in searches["dpd_headword"]:
-        clean_headwords.add(i.lemma_clean)
-        if i.family_root:
-            root_families.add(i.family_root)
-
-    for i in searches["dpd_headword"]:
-        if (
-            i.meaning_1 != "" and
-            i.derived_from != "" and
-            i.derived_from not in clean_headwords and
-            i.derived_from not in root_families and
-            not re.findall("irreg form of", i.grammar) and
-            not re.findall(r"\bcomp\b", i.grammar) and
-            not re.findall("√", i.derived_from)
-        ):
-            results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "derived_from_not_in_headwords"
-    solution = "add derived from to dictionary, or edit derived_from"
-
-    return name, results, length, solution
-
-
-def pali_words_in_english_meaning(searches: dict) -> tuple:
+    if (
+        i.meaning_1 != "" and
+        i.derived_from != "" and
+        i.derived_from not in context.clean_headwords_count and
+        i.derived_from not in context.root_families and
+        not irreg_form_regex.search(i.grammar) and
+        not comp_regex.search(i.grammar) and
+        "√" not in i.derived_from
+    ):
+        return [i.lemma_1]
+    return []
+
+
+@rule(
+    "pali_words_in_english_meaning",
+    "add lemma_1 to exceptions",
+    ["meaning_1"], uses_context=True, distinct=True)
+def pali_words_in_english_meaning(i: DpdHeadword, context: Context) -> list[str]:
     """Test if there are Pāḷi words in the meaning"""
-    results = []
-    pali_words = set()
-    english_words = set()
+
     exceptions: set = {
         "a", "abhidhamma", "ajātasattu", "ala", "an", "ana", "anuruddha",
         "anāthapiṇḍika", "apadāna", "arahant", "are", "assapura", "avanti",
@@ -311,27 +495,23 @@ def pali_words_in_english_meaning(searches: dict) -> tuple:
         "bhoja", "bhāradvāja", "bhātaragāma", "bhū", "bimbisāra", "bodhi",
         "bodhisatta", "brahma"}
 
-    for i in searches["dpd_headword"]:
-        pali_words.add(i.lemma_clean)
-        meaning = i.meaning_1.lower()
-        # FIXME unsupported escape sequence \-, use r"" string
-        meaning = re.sub("[^A-Za-zāīūṭḍḷñṅṇṃ1234567890\-'’ ]", "", meaning)
-        english_words.update(meaning.split())
-
-    english_words = english_words - exceptions
-    results = sorted(pali_words & english_words)
-
-    length = len(results)
-    results = regex_results(results)
-    name = "pali_words_in_english_meaning"
-    solution = "add lemma_1 to exceptions"
-
-    return name, results, length, solution
-
-
-def derived_from_not_in_family_compound(searches: dict) -> tuple:
+    meaning = not_english_regex.sub("", i.meaning_1.lower())
+    english_words = set(meaning.split()) - exceptions
+    return [
+        word for word in english_words
+        if word in context.clean_headwords_count]
+
+
+@rule(
+    "derived_from_not_in_family_compound",
+    "add lemma_1 to exceptions, or add derived_from to family compound",
+    ["lemma_1", "root_key", "pos", "meaning_1", "derived_from", "grammar",
+        "family_compound", "family_word"])
+def derived_from_not_in_family_compound(
+    i: DpdHeadword, context: Context
+) -> list[str]:
     """Test if derived from is in family compound"""
-    results = []
+
     exceptions = [
         "ana 1", "ana 2", "assā 2", "ato", "atta 2", "abhiṅkharitvā",
         "dhammani", "daddabhāyati", "pakudhaka", "vakkali", "vammika",
@@ -340,79 +520,62 @@ def derived_from_not_in_family_compound(searches: dict) -> tuple:
         "ciṅgulaka", "soṇḍi", "sudinna 2",
     ]
 
-    for i in searches["dpd_headword"]:
-        
-        if (
-
-            i.lemma_1 not in exceptions and
-            not i.root_key and
-            i.pos != "pron" and
-            i.meaning_1 and
-            i.derived_from and
-            not re.findall(r"\bcomp\b", i.grammar) and
-            not i.family_compound and
-            not i.family_word
-        ):
-            results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "derived_from_not_in_family_compound"
-    solution = "add lemma_1 to exceptions, or add derived_from to family compound"
-
-    return name, results, length, solution
-
-
-def pos_does_not_equal_grammar(searches):
+    if (
+        i.lemma_1 not in exceptions and
+        not i.root_key and
+        i.pos != "pron" and
+        i.meaning_1 and
+        i.derived_from and
+        not comp_regex.search(i.grammar) and
+        not i.family_compound and
+        not i.family_word
+    ):
+        return [i.lemma_1]
+    return []
+
+
+@rule(
+    "pos_does_not_equal_grammar",
+    "edit pos or grammar",
+    ["lemma_1", "pos", "grammar"])
+def pos_does_not_equal_grammar(i: DpdHeadword, context: Context) -> list[str]:
     """Test of pos equals pos in grammar."""
 
-    results = []
     exceptions: list = ["dve 2", "sāraṇī"]
 
-    for i in searches["dpd_headword"]:
-        if i.lemma_1 not in exceptions:
-            grammar_pos = re.sub("( |,).+$", "", i.grammar)
-            if i.pos != grammar_pos:
-                results += [i.lemma_1]
+    if i.lemma_1 not in exceptions:
+        grammar_pos = grammar_pos_regex.sub("", i.grammar)
+        if i.pos != grammar_pos:
+            return [i.lemma_1]
+    return []
 
-    length = len(results)
-    results = regex_results(results)
-    name = "pos_does_not_equal_grammar"
-    solution = "edit pos or grammar"
 
-    return name, results, length, solution
-
-
-def pos_does_not_equal_pattern(searches: dict) -> tuple:
+@rule(
+    "pos_does_not_equal_pattern",
+    "edit pos or pattern",
+    ["lemma_1", "pos", "pattern"])
+def pos_does_not_equal_pattern(i: DpdHeadword, context: Context) -> list[str]:
     """Test pos does not equal pos in pattern."""
 
-    results = []
     pos_exceptions: list = [
         'abbrev', 'abs', 'cs', 'fut', 'ger', 'idiom', 'imp', 'ind', 'inf',
         'letter', 'root', 'opt', 'prefix', 'sandhi', 'suffix', 've', 'var']
     headword_exceptions = ["paṭṭhitago", "dve 2", "sāraṇī"]
 
-    for i in searches["dpd_headword"]:
-        if (i.pos not in pos_exceptions and
-                i.lemma_1 not in headword_exceptions):
+    if (i.pos not in pos_exceptions and
+            i.lemma_1 not in headword_exceptions):
 
-            # how many spaces in the pattern?
-            if len(re.findall(" ", i.pattern)) == 1:
-                pattern_pos = re.sub(".* ", "", i.pattern)
-            elif len(re.findall(" ", i.pattern)) == 2:
-                pattern_pos = re.sub(".* (.+) .*", "\\1", i.pattern)
-            else:
-                pattern_pos = i.pattern
-
-            if i.pos != pattern_pos:
-                results += [i.lemma_1]
+        # how many spaces in the pattern?
+        if i.pattern.count(" ") == 1:
+            pattern_pos = pattern_last_regex.sub("", i.pattern)
+        elif i.pattern.count(" ") == 2:
+            pattern_pos = pattern_middle_regex.sub("\\1", i.pattern)
+        else:
+            pattern_pos = i.pattern
 
-    length = len(results)
-    results = regex_results(results)
-    name = "pos_does_not_equal_pattern"
-    solution = "edit pos or pattern"
-
-    return name, results, length, solution
+        if i.pos != pattern_pos:
+            return [i.lemma_1]
+    return []
 
 
 def vuddhi(root):
@@ -443,183 +606,157 @@ def vuddhi(root):
     return root_regex
 
 
-def base_contains_extra_star(searches: dict) -> tuple:
-    """Test if base contains a star but no vuddhi"""
-
-    results = []
+@lru_cache(maxsize=None)
+def vuddhi_in_base_regex(root_clean: str) -> re.Pattern:
+    """Compiled once per root."""
+    root_no_sign = root_clean.replace("√", "")
+    return re.compile(f" > {vuddhi(root_no_sign)}")
 
-    for i in searches["dpd_headword"]:
-        if (i.root_base and
-            "*" in i.root_base and
-                i.pos != "perf"):
-            root_no_sign = re.sub("√", "", i.root_clean)
 
-            if not re.findall(f" > {vuddhi(root_no_sign)}", i.root_base):
-                results += [i.lemma_1]
+@rule(
+    "base_contains_extra_star",
+    "delete extra star from base",
+    ["lemma_1", "root_base", "pos", "root_key"])
+def base_contains_extra_star(i: DpdHeadword, context: Context) -> list[str]:
+    """Test if base contains a star but no vuddhi"""
 
-    length = len(results)
-    results = regex_results(results)
-    name = "base_contains_extra_star"
-    solution = "delete extra star from base"
+    if (i.root_base and
+        "*" in i.root_base and
+            i.pos != "perf"):
 
-    return name, results, length, solution
+        if not vuddhi_in_base_regex(i.root_clean).search(i.root_base):
+            return [i.lemma_1]
+    return []
 
 
-def base_is_missing_star(searches: dict) -> tuple:
+@rule(
+    "base_is_missing_star",
+    "add vuddhi star to base",
+    ["lemma_1", "root_base", "root_sign", "root_key"])
+def base_is_missing_star(i: DpdHeadword, context: Context) -> list[str]:
     """Test if base is missing a star and contains vuddi"""
 
-    results = []
-
-    for i in searches["dpd_headword"]:
-        if (
-            i.root_base and
-            "*" not in i.root_base and
-            "*" in i.root_sign and
-            bool(re.findall("a|u|i", i.root_clean)) and
-            not re.findall("> .+ >", i.root_base) and
-            not re.findall("√hi|√ḍi", i.root_key)
-        ):
-            root_no_sign = re.sub("√", "", i.root_clean)
-            if re.findall(f" > {vuddhi(root_no_sign)}", i.root_base):
-                results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "base_is_missing_star"
-    solution = "add vuddhi star to base"
-
-    return name, results, length, solution
-
-
-def root_x_root_family_mismatch(searches: dict) -> tuple:
+    if (
+        i.root_base and
+        "*" not in i.root_base and
+        "*" in i.root_sign and
+        ("a" in i.root_clean or "u" in i.root_clean or "i" in i.root_clean) and
+        not base_twice_regex.search(i.root_base) and
+        "√hi" not in i.root_key and
+        "√ḍi" not in i.root_key
+    ):
+        if vuddhi_in_base_regex(i.root_clean).search(i.root_base):
+            return [i.lemma_1]
+    return []
+
+
+@rule(
+    "root_x_root_family_mismatch",
+    "edit root or family_root",
+    ["lemma_1", "root_key", "family_root"])
+def root_x_root_family_mismatch(i: DpdHeadword, context: Context) -> list[str]:
     """Test if root matches root family without prefixes."""
 
-    results = []
-
-    for i in searches["dpd_headword"]:
-        root_clean = i.root_clean.replace("√", "")
-        root_family_clean = re.sub(".*√", "", i.family_root)
+    root_clean = i.root_clean.replace("√", "")
+    root_family_clean = root_family_prefix_regex.sub("", i.family_root)
 
-        if root_clean != root_family_clean:
-            results += [i.lemma_1]
+    if root_clean != root_family_clean:
+        return [i.lemma_1]
+    return []
 
-    length = len(results)
-    results = regex_results(results)
-    name = "root_x_root_family_mismatch"
-    solution = "edit root or family_root"
 
-    return name, results, length, solution
-
-
-def root_x_construction_mismatch(searches: dict) -> tuple:
+@rule(
+    "root_x_construction_mismatch",
+    "edit root_key or root in construction",
+    ["lemma_1", "root_key", "construction"])
+def root_x_construction_mismatch(i: DpdHeadword, context: Context) -> list[str]:
     """Test if root matches root in construction."""
 
-    results = []
-
-    for i in searches["dpd_headword"]:
-        root_clean = i.root_clean.replace("√", "")
-        if "√" in i.construction and i.root_key:
-            constr_clean = re.sub("\n.+", "", i.construction)
-            constr_clean = re.sub("(.*√)(.[^ ]*)(.*)", "\\2", constr_clean)
-            if root_clean != constr_clean:
-                results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "root_x_construction_mismatch"
-    solution = "edit root_key or root in construction"
-
-    return name, results, length, solution
-
-
-def family_root_x_construction_mismatch(searches: dict) -> tuple:
+    root_clean = i.root_clean.replace("√", "")
+    if "√" in i.construction and i.root_key:
+        constr_clean = construction_line2_regex.sub("", i.construction)
+        constr_clean = root_in_construction_regex.sub("\\2", constr_clean)
+        if root_clean != constr_clean:
+            return [i.lemma_1]
+    return []
+
+
+@rule(
+    "family_root_x_construction_mismatch",
+    "edit family_root or root in construction",
+    ["lemma_1", "root_key", "family_root", "construction"])
+def family_root_x_construction_mismatch(
+    i: DpdHeadword, context: Context
+) -> list[str]:
     """Test if family_root matches root in construction."""
 
-    results = []
-
-    for i in searches["dpd_headword"]:
-        family_root_clean = re.sub(".*√", "", i.family_root)
-        if "√" in i.construction and i.root_key:
-            constr_clean = re.sub("\n.+", "", i.construction)
-            constr_clean = re.sub("(.*√)(.[^ ]*)(.*)", "\\2", constr_clean)
-            if family_root_clean != constr_clean:
-                results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "family_root_x_construction_mismatch"
-    solution = "edit family_root or root in construction"
-
-    return name, results, length, solution
+    family_root_clean = root_family_prefix_regex.sub("", i.family_root)
+    if "√" in i.construction and i.root_key:
+        constr_clean = construction_line2_regex.sub("", i.construction)
+        constr_clean = root_in_construction_regex.sub("\\2", constr_clean)
+        if family_root_clean != constr_clean:
+            return [i.lemma_1]
+    return []
 
 
-def root_key_x_base_mismatch(searches: dict) -> tuple:
+@rule(
+    "root_key_x_base_mismatch",
+    "edit root_key or root in base",
+    ["lemma_1", "root_key", "root_base"])
+def root_key_x_base_mismatch(i: DpdHeadword, context: Context) -> list[str]:
     """Test if root_key matches root in base."""
 
-    results = []
+    if i.root_key and i.root_base:
+        base_clean = root_in_base_regex.sub("\\1", i.root_base)
+        if i.root_clean != base_clean:
+            return [i.lemma_1]
+    return []
 
-    for i in searches["dpd_headword"]:
-        if i.root_key and i.root_base:
-            base_clean = re.sub("(√.[^ ]*)(.*)", "\\1", i.root_base)
-            if i.root_clean != base_clean:
-                results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "root_key_x_base_mismatch"
-    solution = "edit root_key or root in base"
-
-    return name, results, length, solution
 
-
-def root_sign_x_base_mismatch(searches: dict) -> tuple:
+@rule(
+    "root_sign_x_base_mismatch",
+    "edit root_sign or root in base",
+    ["lemma_1", "root_key", "root_base", "root_sign"])
+def root_sign_x_base_mismatch(i: DpdHeadword, context: Context) -> list[str]:
     """Test if root_sign matches root in base."""
 
-    results = []
-
-    for i in searches["dpd_headword"]:
-        if i.root_key and i.root_base:
-            root_sign_clean = re.sub(r"\*|\+", "", i.root_sign)
-            base_clean = re.sub(r"\*|\+", "", i.root_base)
+    if i.root_key and i.root_base:
+        root_sign_clean = star_plus_regex.sub("", i.root_sign)
+        base_clean = star_plus_regex.sub("", i.root_base)
 
-            if f" {root_sign_clean} " not in base_clean:
-                if not re.findall("intens|desid|perf|fut", i.root_base):
-                    results += [i.lemma_1]
+        if f" {root_sign_clean} " not in base_clean:
+            if not root_base_exceptions_regex.search(i.root_base):
+                return [i.lemma_1]
+    return []
 
-    length = len(results)
-    results = regex_results(results)
-    name = "root_sign_x_base_mismatch"
-    solution = "edit root_sign or root in base"
 
-    return name, results, length, solution
-
-
-def root_base_x_construction_mismatch(searches: dict) -> tuple:
+@rule(
+    "root_base_x_construction_mismatch",
+    "edit root_base or base in construction",
+    ["lemma_1", "root_base", "construction", "meaning_1"])
+def root_base_x_construction_mismatch(
+    i: DpdHeadword, context: Context
+) -> list[str]:
     """Test if root_base matches base in construction."""
 
-    results = []
-
-    for i in searches["dpd_headword"]:
-        if (
-            i.root_base != "" and
-            i.construction != "" and
-            i.meaning_1 != ""
-        ):
-            base_clean = re.sub("^.+> ", "", i.root_base)
-            base_clean = re.sub(r" \(.+$", "", base_clean)
-
-            if re.findall(f"(^| ){base_clean} ", i.construction) == []:
-                results += [i.lemma_1]
+    if (
+        i.root_base != "" and
+        i.construction != "" and
+        i.meaning_1 != ""
+    ):
+        base_clean = base_prefix_regex.sub("", i.root_base)
+        base_clean = base_suffix_regex.sub("", base_clean)
 
-    length = len(results)
-    results = regex_results(results)
-    name = "root_base_x_construction_mismatch"
-    solution = "edit root_base or base in construction"
+        if re.findall(f"(^| ){base_clean} ", i.construction) == []:
+            return [i.lemma_1]
+    return []
 
-    return name, results, length, solution
 
-
-def wrong_prefix_in_family_root(searches: dict) -> tuple:
+@rule(
+    "wrong_prefix_in_family_root",
+    "edit prefix in family_root",
+    ["lemma_1", "family_root"])
+def wrong_prefix_in_family_root(i: DpdHeadword, context: Context) -> list[str]:
     """Test prefixes in family_root."""
 
     results = []
@@ -628,111 +765,48 @@ def wrong_prefix_in_family_root(searches: dict) -> tuple:
         'pari', 'parā', 'pati', 'prati', 'sad', 'saṃ', 'ud', 'upa', 'vi', 'ā',
         "√"]
 
-    for i in searches["dpd_headword"]:
-        if i.family_root:
-            fr_splits = i.family_root.split()
-            for fr_split in fr_splits:
-                if (
-                    "√" not in fr_split and
-                    fr_split not in allowable_prefixes
-                ):
-                    results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "wrong_prefix_in_family_root"
-    solution = "edit prefix in family_root"
-
-    return name, results, length, solution
+    if i.family_root:
+        fr_splits = i.family_root.split()
+        for fr_split in fr_splits:
+            if (
+                "√" not in fr_split and
+                fr_split not in allowable_prefixes
+            ):
+                results += [i.lemma_1]
+    return results
 
 
-def variant_equals_lemma_1(searches: dict) -> tuple:
+@rule(
+    "variant_equals_lemma_1",
+    "add correct variant",
+    ["lemma_1", "variant"])
+def variant_equals_lemma_1(i: DpdHeadword, context: Context) -> list[str]:
     """Test if variant equals lemma_1"""
 
-    results = []
-    for i in searches["dpd_headword"]:
-        variants = i.variant.split(", ")
-        for variant in variants:
-            if variant == i.lemma_clean:
-                results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "variant_equals_lemma_1"
-    solution = "add correct variant"
-
-    return name, results, length, solution
+    variants = i.variant.split(", ")
+    return [i.lemma_1 for variant in variants if variant == i.lemma_clean]
 
 
-def antonym_equals_lemma_1(searches: dict) -> tuple:
+@rule(
+    "antonym_equals_lemma_1",
+    "add correct antonym",
+    ["lemma_1", "antonym"])
+def antonym_equals_lemma_1(i: DpdHeadword, context: Context) -> list[str]:
     """Test if antonym equals lemma_1"""
 
-    results = []
-    for i in searches["dpd_headword"]:
-        antonyms = i.antonym.split(", ")
-        for antonym in antonyms:
-            if antonym == i.lemma_clean:
-                results += [i.lemma_1]
+    antonyms = i.antonym.split(", ")
+    return [i.lemma_1 for antonym in antonyms if antonym == i.lemma_clean]
 
-    length = len(results)
-    results = regex_results(results)
-    name = "antonym_equals_lemma_1"
-    solution = "add correct antonym"
-
-    return name, results, length, solution
 
-
-def synonym_equals_lemma_1(searches: dict) -> tuple:
+@rule(
+    "synonym_equals_lemma_1",
+    "add correct synonym",
+    ["lemma_1", "synonym"])
+def synonym_equals_lemma_1(i: DpdHeadword, context: Context) -> list[str]:
     """Test if synonym equals lemma_1"""
 
-    results = []
-    for i in searches["dpd_headword"]:
-        synonyms = i.synonym.split(", ")
-        for synonym in synonyms:
-            if synonym == i.lemma_clean:
-                results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "synonym_equals_lemma_1"
-    solution = "add correct synonym"
-
-    return name, results, length, solution
-
-
-def synonym_equals_variant(searches: dict) -> tuple:
-    """Test if synonym equals variant"""
-
-    results = []
-    for i in searches["dpd_headword"]:
-        if i.synonym and i.variant:
-            synonyms = i.synonym.split(", ")
-            for synonym in synonyms:
-                if synonym in i.variant_list:
-                    results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "synonym_equals_variants"
-    solution = "delete from synonym or variant"
-
-    return name, results, length, solution
-
-
-def pos_idiom_no_space_is_sandhi(searches: dict) -> tuple:
-    """Test if idiom contains a space"""
-
-    results = []
-    for i in searches["dpd_headword"]:
-        if i.pos == "sandhi" and " " in i.lemma_clean:
-            results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "idiom contains a space is sandhi"
-    solution = "change pos to sandhi"
-
-    return name, results, length, solution
+    synonyms = i.synonym.split(", ")
+    return [i.lemma_1 for synonym in synonyms if synonym == i.lemma_clean]
 
 
 def sandhi_contraction_errors(db_session) -> tuple:
@@ -769,57 +843,63 @@ def sandhi_contraction_errors(db_session) -> tuple:
     return name, results, length, solution
 
 
-def duplicate_phrases(searches: dict) -> tuple:
+@rule(
+    "duplicate_phrases",
+    "delete dupes in meaning_1",
+    ["lemma_1", "meaning_1"])
+def duplicate_phrases(i: DpdHeadword, context: Context) -> list[str]:
     """Test for duplcate phrases in meaning_1."""
 
     exceptions = [
         "jāta 1", "jhāyati 1", "patati 1", "paresaṃ 2", "vussati"]
 
-    results = []
-    for i in searches["dpd_headword"]:
-        if i.lemma_1 not in exceptions:
-            meaning_1 = re.sub(r"^\(.*\)| \(.*\)", "", i.meaning_1)
-            meanings_list = meaning_1.split("; ")
-            meanings_set = set(meanings_list)
-            if len(meanings_list) != len(meanings_set):
-                results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "duplicate_phrases"
-    solution = "delete dupes in meaning_1"
-
-    return name, results, length, solution
+    if i.lemma_1 not in exceptions:
+        meaning_1 = brackets_regex.sub("", i.meaning_1)
+        meanings_list = meaning_1.split("; ")
+        meanings_set = set(meanings_list)
+        if len(meanings_list) != len(meanings_set):
+            return [i.lemma_1]
+    return []
 
 
-def duplicate_words(searches: dict) -> tuple:
-    """Test for consecutive duplcate words in meaning_1."""
-
-    exceptions = ["000", '"', "blah", "'"]
+def consecutive_duplicates(
+    lemma_1: str,
+    meaning: str,
+    exceptions: list[str]
+) -> list[str]:
+    """lemma_1 for each consecutive duplicate word in a meaning,
+    and once more if the last two words are the same."""
 
     results = []
-    for i in searches["dpd_headword"]:
-        if i.lemma_1 not in exceptions:
-            words = i.meaning_1.split()
-            if len(words) > 1:
-                for x in range(len(words) - 1):
-                    if words[x] == words[x+1]:
-                        if words[x] not in exceptions:
-                            results += [i.lemma_1]
-                if words and words[-1] == words[-2]:
-                    # FIXME x is possibly unbound
+    if lemma_1 not in exceptions:
+        words = meaning.split()
+        if len(words) > 1:
+            for x in range(len(words) - 1):
+                if words[x] == words[x+1]:
                     if words[x] not in exceptions:
-                        results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "duplicate_words"
-    solution = "delete dupes in meaning_1"
+                        results += [lemma_1]
+            if words[-1] == words[-2]:
+                if words[-2] not in exceptions:
+                    results += [lemma_1]
+    return results
+
+
+@rule(
+    "duplicate_words",
+    "delete dupes in meaning_1",
+    ["lemma_1", "meaning_1"])
+def duplicate_words(i: DpdHeadword, context: Context) -> list[str]:
+    """Test for consecutive duplcate words in meaning_1."""
 
-    return name, results, length, solution
+    exceptions = ["000", '"', "blah", "'"]
+    return consecutive_duplicates(i.lemma_1, i.meaning_1, exceptions)
 
 
-def duplicate_words_meaning_2(searches: dict) -> tuple:
+@rule(
+    "duplicate_words in meaning_2",
+    "delete dupes in meaning_2",
+    ["lemma_1", "meaning_2"])
+def duplicate_words_meaning_2(i: DpdHeadword, context: Context) -> list[str]:
     """Test for consecutive duplcate words in meaning_2."""
 
     exceptions = [
@@ -827,30 +907,14 @@ def duplicate_words_meaning_2(searches: dict) -> tuple:
         "pakoṭi", "taṭataṭāyamāna", "taṭatatāyati",
         "taṭatatāyāyi", "nahuta 2"
     ]
-
-    results = []
-    for i in searches["dpd_headword"]:
-        if i.lemma_1 not in exceptions:
-            words = i.meaning_2.split()
-            if len(words) > 1:
-                for x in range(len(words) - 1):
-                    if words[x] == words[x+1]:
-                        if words[x] not in exceptions:
-                            results += [i.lemma_1]
-                if words and words[-1] == words[-2]:
-                    # FIXME x is possibly unbound
-                    if words[x] not in exceptions:
-                        results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "duplicate_words in meaning_2"
-    solution = "delete dupes in meaning_2"
-
-    return name, results, length, solution
+    return consecutive_duplicates(i.lemma_1, i.meaning_2, exceptions)
 
 
-def duplicate_words_meaning_lit(searches: dict) -> tuple:
+@rule(
+    "duplicate_words in meaning_lit",
+    "delete dupes in meaning_lit",
+    ["lemma_1", "meaning_lit"])
+def duplicate_words_meaning_lit(i: DpdHeadword, context: Context) -> list[str]:
     """Test for consecutive duplcate words in meaning_lit."""
 
     exceptions = [
@@ -860,60 +924,67 @@ def duplicate_words_meaning_lit(searches: dict) -> tuple:
         "nāsūra", "samasama 1", "samasama 2", "saṇḍasaṇḍacārī",
         "suve suve", "yena yeneva", "samasamagati", "aggamagga 2.1",
         "antarantarā 1", "huṃhuṅkajātika", "huṃhuṅka", "huṃhuṅka",
-        "nihuṃhuṅka", "nihuṃhuṅka", "sabhāvatta", "appappa", 
-        "nānantavant", "nissāya nissāya", 
+        "nihuṃhuṅka", "nihuṃhuṅka", "sabhāvatta", "appappa",
+        "nānantavant", "nissāya nissāya",
     ]
+    return consecutive_duplicates(i.lemma_1, i.meaning_lit, exceptions)
 
-    results = []
-    for i in searches["dpd_headword"]:
-        if i.lemma_1 not in exceptions:
-            words = i.meaning_lit.split()
-            if len(words) > 1:
-                for x in range(len(words) - 1):
-                    if words[x] == words[x+1]:
-                        if words[x] not in exceptions:
-                            results += [i.lemma_1]
-                if words and words[-1] == words[-2]:
-                    # FIXME x is possibly unbound
-                    if words[x] not in exceptions:
-                        results += [i.lemma_1]
 
-    length = len(results)
-    results = regex_results(results)
-    name = "duplicate_words in meaning_lit"
-    solution = "delete dupes in meaning_lit"
+@rule(
+    "dupes in meaning_1 and meaning_lit",
+    "delete dupes in meaning_lit",
+    ["lemma_1", "meaning_1", "meaning_lit"])
+def identical_meaning_1_meaning_lit(
+    i: DpdHeadword, context: Context
+) -> list[str]:
+    """Test for same meaning in meaning_1 and meaning_lit."""
 
-    return name, results, length, solution
+    results = []
+    exceptions = ["kyāhaṃ karomi"]
 
+    if i.meaning_1 and i.lemma_1 not in exceptions:
+        if "(" in i.meaning_1:
+            meaning_1 = brackets_lazy_regex.sub("", i.meaning_1)
+        else:
+            meaning_1 = i.meaning_1
+        if "(" in i.meaning_lit:
+            meaning_lit = brackets_lazy_regex.sub("", i.meaning_lit)
+        else:
+            meaning_lit = i.meaning_lit
+        meaning_1_set = set(meaning_1.split("; "))
+        meaning_lit_set = set(meaning_lit.split("; "))
+        for m1 in meaning_1_set:
+            if m1 in meaning_lit_set:
+                results += [i.lemma_1]
+    return results
 
-def identical_meaning_1_meaning_lit(searches: dict) -> tuple:
-    """Test for same meaning in meaning_1 and meaning_lit."""
+
+@rule(
+    "synonym_equals_variants",
+    "delete from synonym or variant",
+    ["lemma_1", "synonym", "variant"])
+def synonym_equals_variant(i: DpdHeadword, context: Context) -> list[str]:
+    """Test if synonym equals variant"""
 
     results = []
-    exceptions = ["kyāhaṃ karomi"]
+    if i.synonym and i.variant:
+        synonyms = i.synonym.split(", ")
+        for synonym in synonyms:
+            if synonym in i.variant_list:
+                results += [i.lemma_1]
+    return results
 
-    for i in searches["dpd_headword"]:
-        if i.meaning_1 and i.lemma_1 not in exceptions:
-            if "(" in i.meaning_1:
-                meaning_1 = re.sub(r"\(.+?\) | \(.+?\)", "", i.meaning_1)
-            else:
-                meaning_1 = i.meaning_1
-            if "(" in i.meaning_lit:
-                meaning_lit = re.sub(r"\(.+?\) | \(.+?\)", "", i.meaning_lit)
-            else:
-                meaning_lit = i.meaning_lit
-            meaning_1_set = set(meaning_1.split("; "))
-            meaning_lit_set = set(meaning_lit.split("; "))
-            for m1 in meaning_1_set:
-                if m1 in meaning_lit_set:
-                    results += [i.lemma_1]
-
-    length = len(results)
-    results = regex_results(results)
-    name = "dupes in meaning_1 and meaning_lit"
-    solution = "delete dupes in meaning_lit"
 
-    return name, results, length, solution
+@rule(
+    "idiom contains a space is sandhi",
+    "change pos to sandhi",
+    ["lemma_1", "pos"])
+def pos_idiom_no_space_is_sandhi(i: DpdHeadword, context: Context) -> list[str]:
+    """Test if idiom contains a space"""
+
+    if i.pos == "sandhi" and " " in i.lemma_clean:
+        return [i.lemma_1]
+    return []
 
 
 # next
@@ -945,7 +1016,15 @@ def identical_meaning_1_meaning_lit(searches: dict) -> tuple:
 
 def main():
     tic()
-    run_external_tests()
+    parser = argparse.ArgumentParser(description="run external db tests")
+    parser.add_argument(
+        "--changed", action="store_true",
+        help="only test rows which have changed since the last run")
+    parser.add_argument(
+        "--no-input", action="store_true",
+        help="only print the counts, results are in the json")
+    args = parser.parse_args()
+    run_external_tests(args.changed, not args.no_input)
     toc()
 
 
@@ -39,8 +39,10 @@ def generate_root_html(
         header_templ = Template(filename=str(rupth.root_header_templ_path))
 
     roots_db = db_session.query(DpdRoot).all()
+    family_roots_index = make_family_roots_index(db_session)
 
     for counter, r in enumerate(roots_db):
+        frs = family_roots_index.get(r.root, [])
 
         # replace \n with html line break
         if r.panini_root:
@@ -60,7 +62,7 @@ def generate_root_html(
         html += definition
         size_dict["root_definition"] += len(definition)
 
-        root_buttons = render_root_buttons_templ(pth, r, db_session, rupth, lang)
+        root_buttons = render_root_buttons_templ(pth, r, frs, rupth, lang)
         html += root_buttons
         size_dict["root_buttons"] += len(root_buttons)
 
@@ -72,7 +74,7 @@ def generate_root_html(
         html += root_matrix
         size_dict["root_matrix"] += len(root_matrix)
 
-        root_families = render_root_families_templ(pth, r, db_session, rupth, lang)
+        root_families = render_root_families_templ(pth, r, frs, rupth, lang)
         html += root_families
         size_dict["root_families"] += len(root_families)
 
@@ -85,9 +87,6 @@ def generate_root_html(
         synonyms.add(re.sub("√", "", r.root))
         synonyms.add(re.sub("√", "", r.root_clean))
 
-        frs = db_session.query(FamilyRoot)\
-            .filter(FamilyRoot.root_key == r.root).all()
-
         for fr in frs:
             synonyms.add(fr.root_family)
             synonyms.add(re.sub("√", "", fr.root_family))
@@ -108,6 +107,20 @@ def generate_root_html(
     return root_data_list, size_dict
 
 
+def make_family_roots_index(db_session: Session) -> Dict[str, List[FamilyRoot]]:
+    """Load all root families once,
+    grouped by root_key and sorted in Pāḷi alphabetical order."""
+
+    family_roots_index: Dict[str, List[FamilyRoot]] = {}
+    for fr in db_session.query(FamilyRoot).all():
+        family_roots_index.setdefault(fr.root_key, []).append(fr)
+
+    for frs in family_roots_index.values():
+        frs.sort(key=lambda x: pali_sort_key(x.root_family))
+
+    return family_roots_index
+
+
 def render_root_header_templ(
     __pth__: Union[ProjectPaths, RuPaths],
     r: DpdRoot,
@@ -151,7 +164,7 @@ def render_root_definition_templ(
 def render_root_buttons_templ(
     pth: ProjectPaths,
     r: DpdRoot, 
-    db_session: Session,
+    frs: List[FamilyRoot],
     rupth: RuPaths,
     lang="en",
 ):
@@ -163,12 +176,6 @@ def render_root_buttons_templ(
         root_buttons_templ = Template(filename=str(rupth.root_button_templ_path))
     # add here another language elif ...
 
-    frs = db_session \
-        .query(FamilyRoot) \
-        .filter(FamilyRoot.root_key == r.root)
-
-    frs = sorted(frs, key=lambda x: pali_sort_key(x.root_family))
-
     return str(
         root_buttons_templ.render(
             r=r,
@@ -231,7 +238,7 @@ def render_root_matrix_templ(
 def render_root_families_templ(
     pth: ProjectPaths,
     r: DpdRoot, 
-    db_session: Session, 
+    frs: List[FamilyRoot],
     rupth: RuPaths,
     lang="en"
 ):
@@ -243,12 +250,6 @@ def render_root_families_templ(
         root_families_templ = Template(filename=str(rupth.root_families_templ_path))
     # add here another language elif ...
 
-    frs = db_session.query(FamilyRoot) \
-        .filter(FamilyRoot.root_key == r.root,) \
-        .all()
-
-    frs = sorted(frs, key=lambda x: pali_sort_key(x.root_family))
-
     return str(
         root_families_templ.render(
             r=r,
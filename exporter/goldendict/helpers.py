@@ -3,6 +3,7 @@
 from typing import Dict
 from datetime import date
 
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from db.models import DpdHeadword
@@ -14,14 +15,9 @@ EXCLUDE_FROM_SETS: set = {
 
 
 def make_roots_count_dict(db_session: Session) -> Dict[str, int]:
-    roots_db = db_session.query(DpdHeadword).all()
-    roots_count_dict: Dict[str, int] = dict()
-    for i in roots_db:
-        if i.root_key is None:
-            continue
-        if i.root_key in roots_count_dict:
-            roots_count_dict[i.root_key] += 1
-        else:
-            roots_count_dict[i.root_key] = 1
-
-    return roots_count_dict
+    """Count the headwords of each root_key with a GROUP BY in sqlite."""
+    return dict(
+        db_session.query(DpdHeadword.root_key, func.count())
+        .filter(DpdHeadword.root_key.isnot(None))
+        .group_by(DpdHeadword.root_key)
+        .all())
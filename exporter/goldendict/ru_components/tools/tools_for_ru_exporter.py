@@ -100,18 +100,9 @@ def make_ru_meaning_for_ebook(i: DpdHeadword, ru: Russian) -> str:
 abbreviations_dict = None
 
 
-def ru_replace_abbreviations(value, kind = "meaning"):
-
-    global abbreviations_dict
-
-    # debug
-    # print(f"original value {value}")
-
-    if abbreviations_dict is None:
-        # load_abbreviations_dict(pth.abbreviations_tsv_path)
-        abbreviations_dict = load_abbreviations_dict(pth.abbreviations_tsv_path)
+def ru_replace_basic(value, kind = "meaning"):
+    """Basic replacements of english words for each kind of value."""
 
-    # Perform basic replacements
     if kind == "meaning":
         value = value.replace(' or ', ' или ').replace(', from', ', от').replace(' of ', ' от ').replace('letter', 'буква').replace('form', 'форма').replace('normally', 'обычно')
     elif kind == "inflect":
@@ -122,11 +113,26 @@ def ru_replace_abbreviations(value, kind = "meaning"):
         value = value.replace('word', 'слово').replace('letter', 'буква').replace('indeclinable', 'несклоняемое').replace('of', 'от')
     elif kind == "base":
         value = value.replace('pass,', 'страд,').replace('pass)', 'страд)').replace('caus', 'понудит').replace('irreg', 'неправ').replace('desid', 'дезид').replace('deno', 'отымённ').replace('intens', 'усил')
-        return value
     elif kind == "phonetic":
         value = value.replace('metathesis', 'метатеза').replace('with metrically', 'с метрически').replace('lengthened', 'удлиненным').replace('doubled', 'удвоенным').replace('shortened', 'укороченным').replace('Kacc', 'Качч').replace('contraction', 'сокращение').replace('expansion', 'расширение').replace('under the influence of', 'под влиянием').replace('before', 'перед').replace('nasalization', 'назализация').replace('a vowel', 'гласным').replace('a consonant', 'согласным').replace('aphesis', 'афезис')
-        return value
+    return value
+
+
+def ru_replace_abbreviations(value, kind = "meaning"):
+
+    global abbreviations_dict
 
+    # debug
+    # print(f"original value {value}")
+
+    if abbreviations_dict is None:
+        # load_abbreviations_dict(pth.abbreviations_tsv_path)
+        abbreviations_dict = load_abbreviations_dict(pth.abbreviations_tsv_path)
+
+    # Perform basic replacements
+    value = ru_replace_basic(value, kind)
+    if kind in ["base", "phonetic"]:
+        return value
 
     # Step   3: Replace abbreviations in value
     # Use regex to match abbreviations, considering variations like "+acc" or "loc abs"
@@ -147,6 +153,34 @@ def ru_replace_abbreviations(value, kind = "meaning"):
     return value
 
 
+def make_ru_abbreviations_replacer(kind = "meaning"):
+    """Return a function which does the job of ru_replace_abbreviations
+    for one kind of value, with all the abbreviations compiled into a single
+    regex and replaced in one pass. Use it for replacing many values."""
+
+    abbreviations = load_abbreviations_dict(pth.abbreviations_tsv_path)
+    if kind == "inflect":
+        abbreviations = {
+            abbr: russian for abbr, russian in abbreviations.items()
+            if abbr != "pass"}
+
+    if kind in ["base", "phonetic"] or not abbreviations:
+        return lambda value: ru_replace_basic(value, kind)
+
+    # longest abbreviations first, the same order as ru_replace_abbreviations
+    alternatives = "|".join(re.escape(abbr) for abbr in abbreviations)
+    pattern = re.compile(
+        rf"\b\+(?P<plus>{alternatives})\b|\b(?P<bare>{alternatives})\b")
+
+    def replace_match(match: re.Match) -> str:
+        return abbreviations[match.group("plus") or match.group("bare")]
+
+    def replacer(value: str) -> str:
+        return pattern.sub(replace_match, ru_replace_basic(value, kind))
+
+    return replacer
+
+
 def ru_replace_abbreviations_list(grammar):
     ru_grammar = []
     for value in grammar:
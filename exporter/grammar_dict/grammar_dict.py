@@ -3,10 +3,13 @@
 """Compile HTML table of all grammatical possibilities of every inflected word-form."""
 
 import pickle
+import psutil
 
 # from css_html_js_minify import css_minify, js_minify
 from json import loads
 from mako.template import Template
+from multiprocessing import Process, Manager
+from multiprocessing.managers import ListProxy
 
 from db.db_helpers import get_db_session
 from db.models import DpdHeadword
@@ -14,7 +17,7 @@ from db.models import InflectionTemplates
 from db.models import Lookup
 
 from exporter.goldendict.ru_components.tools.paths_ru import RuPaths
-from exporter.goldendict.ru_components.tools.tools_for_ru_exporter import ru_replace_abbreviations
+from exporter.goldendict.ru_components.tools.tools_for_ru_exporter import make_ru_abbreviations_replacer
 
 from tools.all_tipitaka_words import make_all_tipitaka_word_set
 from tools.configger import config_test
@@ -26,9 +29,10 @@ from tools.mdict_exporter import export_to_mdict
 from tools.niggahitas import add_niggahitas
 from tools.pali_sort_key import pali_sort_key
 from tools.paths import ProjectPaths
-from tools.printer import p_counter, p_green, p_green_title, p_title, p_yes
+from tools.printer import p_green, p_green_title, p_title, p_yes
 from tools.tic_toc import tic, toc
 from tools.update_test_add import update_test_add
+from tools.utils import list_into_batches
 
 
 class ProgData():
@@ -154,6 +158,87 @@ def render_header_templ(
     return str(header_templ.render(css=css, js=js))
 
 
+def make_grammar_plans(g: ProgData) -> dict[str, list[tuple[str, str]]]:
+    """Parse every inflection template once into a plan:
+    a list of (inflection, grammar) in table order."""
+
+    # data is a nest of lists
+    # list[] table
+    # list[[]] row
+    # list[[[]]] cell
+    # row 0 is the top header
+    # column 0 is the grammar header
+    # odd rows > 0 are inflections
+    # even rows > 0 are grammar info
+
+    plans: dict[str, list[tuple[str, str]]] = {}
+    for template in g.db_session.query(InflectionTemplates).all():
+        plan: list[tuple[str, str]] = []
+        template_data = loads(template.data)
+        for row_number, row_data in enumerate(template_data):
+            if (
+                row_number == 0                     #   skip the top header
+                or row_data[0][0] == "in comps"     #   skip this row
+            ):
+                continue
+            for column_number, cell_data in enumerate(row_data):
+                if (
+                    column_number > 0                   #   skip the side header
+                    and column_number % 2 == 1          #   skip even numbers = grammar info
+                ):
+                    grammar: str = row_data[column_number+1][0]
+                    for inflection in cell_data:
+                        if inflection:
+                            plan.append((inflection, grammar))
+        plans.setdefault(template.pattern, plan)
+    return plans
+
+
+def make_grammar_cells(grammar: str) -> str:
+    """The html cells of the grammatical categories, i.e. masc nom sg"""
+
+    html = ""
+    if grammar.startswith("reflx"):
+        grammatical_categories = [grammar.split()[0] + " " + grammar.split()[1]]
+        grammatical_categories += grammar.split()[2:]
+        for grammatical_category in grammatical_categories:
+            html += f"<td>{grammatical_category}</td>"
+    elif grammar.startswith("in comps"):
+        html += f"<td colspan='3'>{grammar}</td>"
+    else:
+        grammatical_categories = grammar.split()
+        # adding empty values if there are less than 3
+        while len(grammatical_categories) < 3:
+            grammatical_categories.append("")
+        for grammatical_category in grammatical_categories:
+            html += f"<td>{grammatical_category}</td>"
+    return html
+
+
+def _parse_batch(
+    batch: list[tuple[str, str, str, str]],
+    plans: dict[str, list[tuple[str, str]]],
+    all_words_set: set[str],
+    results_list: ListProxy,
+    batch_idx: int
+) -> None:
+    """Find the inflected words of a batch of headwords in all_words_set.
+    The result is {inflected_word: {(lemma_clean, pos, grammar): None}},
+    an ordered set of data lines for each word."""
+
+    results: dict[str, dict[tuple[str, str, str], None]] = {}
+    for lemma_clean, pos, stem, pattern in batch:
+        plan = plans.get(pattern)
+        if plan is None:
+            continue
+        for inflection, grammar in plan:
+            inflected_word = f"{stem}{inflection}"
+            if inflected_word in all_words_set:
+                data_line = (lemma_clean, pos, grammar)
+                results.setdefault(inflected_word, {})[data_line] = None
+    results_list.append((batch_idx, results))
+
+
 def generate_grammar_dict(g: ProgData):
     p_green_title("generating grammar dictionary")
 
@@ -162,10 +247,6 @@ def generate_grammar_dict(g: ProgData):
     # 2. grammar_dict_table is just an html table {inflection: "html"}
     # 3. grammar_dict_html is full html page with header, style etc. {inflection: "html"}
 
-    grammar_dict = {}
-    grammar_dict_table = {}
-    grammar_dict_html = {}
-
     # create the header from a template
     header_templ = Template(filename=str(g.pth.grammar_dict_header_templ_path))
     html_header = render_header_templ(
@@ -175,155 +256,88 @@ def generate_grammar_dict(g: ProgData):
     
     html_table_header = "<body><div class='grammar_dict'><table class='grammar_dict'>"
 
-    # process the inflections of each word in DpdHeadword
-    for counter, i in enumerate(g.db):
+    p_green("parsing inflection templates")
+    plans = make_grammar_plans(g)
+    p_yes(len(plans))
 
-        # words with ! in the stem are inflected forms 
-        # and wil get dealt with under the main headwords 
-        if "!" in i.stem:
-            pass
-        
-        # words with '*' in stem are irregular inflections, remove the * for clean processing. 
-        if i.stem == "*":
-            i.stem = ""
-        
-        # process indeclinables
+    # words with ! in the stem are inflected forms 
+    # and wil get dealt with under the main headwords 
+    # words with '*' in stem are irregular inflections, remove the * for clean processing. 
+    # indeclinables with '-' in the stem are skipped
+
+    headwords: list[tuple[str, str, str, str]] = []
+    for i in g.db:
         if i.stem == "-":
             continue
-            data_line = (i.lemma_clean, i.pos, "indeclinable")
-            html_line = f"<tr><td><b>{i.pos}</b></td><td colspan='5'>indeclinable</td></tr>"
-
-            # grammar_dict update
-            if i.lemma_clean not in grammar_dict:
-                grammar_dict[i.lemma_clean] = [data_line]
+        stem = "" if i.stem == "*" else i.stem
+        headwords.append((i.lemma_clean, i.pos, stem, i.pattern))
+
+    # process the inflections of each word in parallel
+    num_logical_cores = psutil.cpu_count()
+    p_green(f"running with {num_logical_cores} cores")
+    batches = list_into_batches(headwords, num_logical_cores)
+
+    processes: list[Process] = []
+    manager = Manager()
+    results_list: ListProxy = manager.list()
+
+    for batch_idx, batch in enumerate(batches):
+        p = Process(
+            target=_parse_batch,
+            args=(batch, plans, g.all_words_set, results_list, batch_idx))
+        p.start()
+        processes.append(p)
+
+    for p in processes:
+        p.join()
+
+    # merge in headword order
+    data_lines: dict[str, dict[tuple[str, str, str], None]] = {}
+    for __batch_idx__, results in sorted(results_list, key=lambda x: x[0]):
+        for inflected_word, lines in results.items():
+            if inflected_word not in data_lines:
+                data_lines[inflected_word] = lines
             else:
-                if data_line not in grammar_dict[i.lemma_clean]:
-                    grammar_dict[i.lemma_clean].append(data_line)
+                data_lines[inflected_word].update(lines)
+    p_yes(len(data_lines))
 
-            # grammar_dict_html update
-            if i.lemma_clean not in grammar_dict_html:
-                grammar_dict_html[i.lemma_clean] = f"{html_header}{html_line}"
-                grammar_dict_table[i.lemma_clean] = f"{html_table_header}{html_line}"
-            else:
-                if html_line not in grammar_dict_html[i.lemma_clean]:
-                    grammar_dict_html[i.lemma_clean] += html_line
-                    grammar_dict_table[i.lemma_clean] += html_line
-
-        # all other words need an inflection table generated 
-        # to find out their grammatical category, i.e. masc nom sg
-        else:
-            # get template
-            template = g.db_session \
-                .query(InflectionTemplates) \
-                .filter(InflectionTemplates.pattern == i.pattern) \
-                .first()
-
-            if template is not None:
-                template_data = loads(template.data)
-                
-                # data is a nest of lists
-                # list[] table
-                # list[[]] row
-                # list[[[]]] cell
-                # row 0 is the top header
-                # column 0 is the grammar header
-                # odd rows > 0 are inflections
-                # even rows > 0 are grammar info
-
-                for row_number, row_data in enumerate(template_data):
-                    for column_number, cell_data in enumerate(row_data):
-
-                        if (
-                            row_number > 0                      #   skip the top header
-                            and column_number > 0               #   skip the side header
-                            and column_number % 2 == 1          #   skip even numbers = grammar info 
-                            and row_data[0][0] != "in comps"    #   skip this row
-                        ):
-                            grammar: str = [row_data[column_number+1]][0][0]
-
-                            for inflection in cell_data:
-                                if inflection:
-                                    inflected_word = f"{i.stem}{inflection}"
-                                    if inflected_word in g.all_words_set:
-
-                                        data_line = (i.lemma_clean, i.pos, grammar)
-                                        html_line = "<tr>"
-                                        html_line += f"<td><b>{i.pos}</b></td>"
-                                        # get grammatical_categories from grammar
-                                        grammatical_categories = []
-                                        if grammar.startswith("reflx"):
-                                            grammatical_categories.append(grammar.split()[0] + " " + grammar.split()[1])
-                                            grammatical_categories += grammar.split()[2:]
-                                            for grammatical_category in grammatical_categories:
-                                                html_line += f"<td>{grammatical_category}</td>"
-                                        elif grammar.startswith("in comps"):
-                                            html_line += f"<td colspan='3'>{grammar}</td>"
-                                        else:
-                                            grammatical_categories = grammar.split()
-                                            # adding empty values if there are less than 3
-                                            while len(grammatical_categories) < 3:
-                                                grammatical_categories.append("")
-                                            for grammatical_category in grammatical_categories:
-                                                html_line += f"<td>{grammatical_category}</td>"
-                                        html_line += "<td>of</td>"
-                                        html_line += f"<td>{i.lemma_clean}</td>"
-                                        html_line += "</tr>"
-
-                                        # grammar_dict update
-                                        if inflected_word not in grammar_dict:
-                                            grammar_dict[inflected_word] = [data_line]
-                                        else:
-                                            if data_line not in grammar_dict[inflected_word]:
-                                                grammar_dict[inflected_word].append(data_line)
-
-                                        # grammar_dict_html update
-                                        if inflected_word not in grammar_dict_html:
-                                            grammar_dict_html[inflected_word] = f"{html_header}{html_line}"
-                                            grammar_dict_table[inflected_word] = f"{html_table_header}{html_line}"
-                                        else:
-                                            if html_line not in grammar_dict_html[inflected_word]:
-                                                grammar_dict_html[inflected_word] += html_line
-                                                grammar_dict_table[inflected_word] += html_line
-
-        if counter % 5000 == 0:
-            p_counter(counter, len(g.db), i.lemma_1)
+    # assemble the html
+    p_green("compiling html")
+    grammar_cells: dict[str, str] = {}
+    for plan in plans.values():
+        for __inflection__, grammar in plan:
+            if grammar not in grammar_cells:
+                grammar_cells[grammar] = make_grammar_cells(grammar)
 
     if g.lang == "ru":
+        p_green("replacing abbreviations: en > ru")
+        ru_replace = make_ru_abbreviations_replacer(kind="gram")
+        html_header_ru = "<tr>".join(
+            ru_replace(line) if line else line
+            for line in html_header.split("<tr>"))
 
-        # !!! FIXME very slow!
+    grammar_dict = {}
+    grammar_dict_table = {}
+    grammar_dict_html = {}
 
-        print_counter = 0
-        p_green("replacing abbreviations: en > ru")
-        for inflected_word, html_content in grammar_dict_html.items():
-            # Replace abbreviations in each HTML line
-            html_lines = html_content.split('<tr>')
-            for i, line in enumerate(html_lines):
-                if line:
-                    # Replace abbreviations in the line
-                    line = ru_replace_abbreviations(line, kind="gram")
-                    # Update the HTML lines with the modified line
-                    html_lines[i] = line
-            # Join the modified lines back into a single HTML string
-            grammar_dict_html[inflected_word] = '<tr>'.join(html_lines)
-
-            print_counter += 1
-            if print_counter % 5000 == 0:
-                p_counter(print_counter, len(grammar_dict_html), inflected_word)
-
-
-    # clean up the html
-    # FIXME what about using Jinja template here?
+    for inflected_word, lines in data_lines.items():
+        grammar_dict[inflected_word] = list(lines)
+        html_lines = list(dict.fromkeys(
+            f"<td><b>{pos}</b></td>{grammar_cells[grammar]}<td>of</td><td>{lemma_clean}</td></tr>"
+            for lemma_clean, pos, grammar in lines))
 
-    for item in grammar_dict_html:
-        grammar_dict_html[item] += "</table></div></body></html>"
+        html_table = "<tr>".join([html_table_header] + html_lines)
+        grammar_dict_table[inflected_word] = f"{html_table}</table></div></tbody></table></div>"
 
-    for item in grammar_dict_table:
-        grammar_dict_table[item] += "</table></div>"
+        if g.lang == "ru":
+            html = "<tr>".join(
+                [html_header_ru] + [ru_replace(line) for line in html_lines])
+        else:
+            html = "<tr>".join([html_header] + html_lines)
+        grammar_dict_html[inflected_word] = f"{html}</table></div></body></html>"
 
+    # FIXME what about using Jinja template here?
     # FIXME find out how to remove headings from table with only 1 row
-
-    for item in grammar_dict_table:
-        grammar_dict_table[item] += "</tbody></table></div>"
     
     g.grammar_dict = grammar_dict
     g.grammar_dict_table = grammar_dict_table
@@ -5,18 +5,21 @@ The word set is limited to
 - Sutta Central EBTS
 - words in deconstructed compounds."""
 
-import os
+import psutil
 import subprocess
 
 from datetime import datetime
 from mako.template import Template
+from multiprocessing import Process, Manager
+from multiprocessing.managers import ListProxy
 from rich import print
-from typing import Dict, Union
-from zipfile import ZipFile, ZIP_DEFLATED
+from typing import NamedTuple, Union
 
 from db.db_helpers import get_db_session
 from db.models import DpdHeadword, Lookup
 
+from tools import archiver
+from tools.archiver import p_archive_stats
 from tools.configger import config_test
 from tools.cst_sc_text_sets import make_cst_text_set
 from tools.cst_sc_text_sets import make_sc_text_set
@@ -41,14 +44,19 @@ from exporter.goldendict.ru_components.tools.paths_ru import RuPaths
 from exporter.goldendict.ru_components.tools.tools_for_ru_exporter import make_ru_meaning_for_ebook, ru_replace_abbreviations, ru_make_grammar_line
 
 
-def render_xhtml(pth: ProjectPaths, rupth: RuPaths, lang="en"):
+def render_xhtml(
+    pth: ProjectPaths, rupth: RuPaths, lang="en"
+) -> tuple[int, list[str]]:
+    """Render one xhtml file for each letter of the alphabet.
+
+    Ids are given out here in sorted order, then the letters are rendered
+    in parallel, each worker streaming its entries straight to disk.
+    Return the next id for the abbreviations page
+    and the letter file names in order for content.opf."""
 
     p_green("querying dpd db")
     db_session = get_db_session(pth.dpd_db_path)
-    if lang == "en":
-        dpd_db = db_session.query(DpdHeadword).all()
-    elif lang == "ru":
-        dpd_db = db_session.query(DpdHeadword).options(joinedload(DpdHeadword.ru)).all()
+    dpd_db = db_session.query(DpdHeadword.id, DpdHeadword.lemma_1).all()
     dpd_db = sorted(dpd_db, key=lambda x: pali_sort_key(x.lemma_1))
     p_yes(len(dpd_db))
 
@@ -78,13 +86,14 @@ def render_xhtml(pth: ProjectPaths, rupth: RuPaths, lang="en"):
     # words in deconstructor in cst_text_set & sc_text_set
     p_green("querying lookup for deconstructor")
     deconstructor_db = db_session \
-        .query(Lookup) \
+        .query(Lookup.lookup_key) \
         .filter(
             Lookup.deconstructor != "", 
             Lookup.lookup_key.in_(combined_text_set)) \
         .all()
     words_in_deconstructor_set = make_words_in_deconstructions(db_session)
     p_yes(len(words_in_deconstructor_set))
+    db_session.close()
 
 
     # all_words_set = cst_text_set + sc_text_set + words in deconstructor compounds
@@ -92,93 +101,208 @@ def render_xhtml(pth: ProjectPaths, rupth: RuPaths, lang="en"):
     all_words_set = combined_text_set | words_in_deconstructor_set
     p_yes(len(all_words_set))
 
-    # only include inflections which exist in all_words_set
-    p_green("creating inflections dict")
+    # give out ids in order and group them by letter
+    p_green("making letter jobs")
+    letter_jobs: dict[str, LetterJob] = {
+        letter: LetterJob(letter_idx, letter)
+        for letter_idx, letter in enumerate(pali_alphabet)}
 
-    inflections_dict: Dict[int, list[str]] = {}
-    inflections_counter = 0
+    # add all words
+    id_counter = 1
     for i in dpd_db:
-        # only add inflections in all words set
-        inflections_set: set[str] = set(i.inflections_list_all) & all_words_set # include api ca eva iti
+        first_letter = find_first_letter(i.lemma_1)
+        letter_jobs[first_letter].headwords.append((id_counter, i.id))
+        id_counter += 1
 
-        # # add one clean inflection without diacritics
-        # inflections_set.add(diacritics_cleaner(i.lemma_clean))
+    # add deconstructor words which are in all_words_set
+    for i in deconstructor_db:
+        if bool(set(i.lookup_key) & all_words_set):
+            first_letter = find_first_letter(i.lookup_key)
+            letter_jobs[first_letter].deconstructions.append(
+                (id_counter, i.lookup_key))
+            id_counter += 1
+    p_yes(id_counter - 1)
+
+    # render the letters in parallel
+    num_logical_cores = psutil.cpu_count()
+    p_green_title(f"rendering letters with {num_logical_cores} cores")
+    batches = balance_letter_jobs(list(letter_jobs.values()), num_logical_cores)
+
+    processes: list[Process] = []
+    manager = Manager()
+    manifest_list: ListProxy = manager.list()
+
+    for batch in batches:
+        p = Process(
+            target=_render_letters,
+            args=(pth, rupth, lang, batch, all_words_set, manifest_list))
+        p.start()
+        processes.append(p)
+
+    for p in processes:
+        p.join()
+
+    # assemble the manifests of all the workers
+    manifest: list[LetterManifest] = sorted(manifest_list)
+    if len(manifest) != len(letter_jobs):
+        raise RuntimeError(
+            f"only {len(manifest)} of {len(letter_jobs)} letters were rendered")
+
+    p_green("saved entries xhtml")
+    total = sum(m.entries for m in manifest)
+    p_yes(total)
+    p_green("inflections")
+    p_yes(sum(m.inflections for m in manifest))
 
-        # add niggahitas
-        inflections_set = set(add_niggahitas(list(inflections_set), all=False))
+    # ids carry on after the last entry
+    id_counter = total + 1
+    letter_files = [m.file_name for m in manifest]
+    return id_counter+1, letter_files
 
-        # sort into pali alphabetical order
-        inflections_sorted: list[str] = pali_list_sorter(list(inflections_set))
 
-        # update dict
-        inflections_dict[i.id] = inflections_sorted
-        inflections_counter += len(inflections_sorted)
+class LetterJob():
+    """The entries of one letter, with their ids."""
 
-    p_yes(inflections_counter)
+    def __init__(self, letter_idx: int, letter: str) -> None:
+        self.letter_idx = letter_idx
+        self.letter = letter
+        self.headwords: list[tuple[int, int]] = []
+        self.deconstructions: list[tuple[int, str]] = []
 
-    # a dictionary for entries of each letter of the alphabet
-    
-    p_green_title("creating letter dict entries")
-    letter_dict: dict = {}
-    for letter in pali_alphabet:
-        letter_dict[letter] = []
+    def __len__(self) -> int:
+        return len(self.headwords) + len(self.deconstructions)
 
-    # add all words
-    id_counter = 1
-    for counter, i in enumerate(dpd_db):
-        inflection_list: list = inflections_dict[i.id]
-        first_letter = find_first_letter(i.lemma_1)
-        entry = render_ebook_entry(pth, rupth, id_counter, i, inflection_list, lang)
-        letter_dict[first_letter] += [entry]
-        id_counter += 1
+    @property
+    def file_name(self) -> str:
+        return f"{self.letter_idx}_{diacritics_cleaner(self.letter)}.xhtml"
 
-        if counter % 5000 == 0:
-            p_counter(counter, len(dpd_db), i.lemma_1)
 
-    # add deconstructor words which are in all_words_set
-    p_green_title("add deconstructor words")
-    for counter, i in enumerate(deconstructor_db):
-        if bool(set(i.lookup_key) & all_words_set):
-            first_letter = find_first_letter(i.lookup_key)
-            entry = render_deconstructor_entry(pth, id_counter, i)
-            letter_dict[first_letter] += [entry]
-            id_counter += 1
+class LetterManifest(NamedTuple):
+    """What a worker wrote for one letter."""
+    letter_idx: int
+    file_name: str
+    entries: int
+    inflections: int
 
-        if counter % 5000 == 0:
-            p_counter(counter, len(deconstructor_db), i.lookup_key)
-
-    # save to a single file for each letter of the alphabet
-    p_green("saving entries xhtml")
-    total = 0
-
-    for counter, (letter, entries) in enumerate(letter_dict.items()):
-        ascii_letter = diacritics_cleaner(letter)
-        total += len(entries)
-        entries = "".join(entries)
-        
-        if lang == "en":
-            xhtml = render_ebook_letter_templ(pth, letter, entries)
-            output_path = pth.epub_text_dir.joinpath(
-                f"{counter}_{ascii_letter}.xhtml")
-        elif lang == "ru":
-            xhtml = render_ebook_letter_templ(rupth, letter, entries)
-            output_path = rupth.epub_text_dir.joinpath(
-                f"{counter}_{ascii_letter}.xhtml")
-
-        with open(output_path, "w") as f:
-            f.write(xhtml)
 
-    p_yes(total)
+def balance_letter_jobs(
+    letter_jobs: list[LetterJob], num_batches: int
+) -> list[list[LetterJob]]:
+    """Share the letters among the workers by number of entries,
+    biggest letter first, each to the least loaded worker."""
+
+    num_batches = max(1, min(num_batches, len(letter_jobs)))
+    batches: list[list[LetterJob]] = [[] for __i__ in range(num_batches)]
+    loads = [0] * num_batches
+    for job in sorted(letter_jobs, key=len, reverse=True):
+        idx = loads.index(min(loads))
+        batches[idx].append(job)
+        loads[idx] += len(job)
+    return batches
+
+
+def make_inflections_list(i: DpdHeadword, all_words_set: set[str]) -> list[str]:
+    """Inflections which exist in all_words_set, in pali alphabetical order."""
+
+    # only add inflections in all words set
+    inflections_set: set[str] = set(i.inflections_list_all) & all_words_set # include api ca eva iti
+
+    # # add one clean inflection without diacritics
+    # inflections_set.add(diacritics_cleaner(i.lemma_clean))
+
+    # add niggahitas
+    inflections_set = set(add_niggahitas(list(inflections_set), all=False))
+
+    # sort into pali alphabetical order
+    return pali_list_sorter(list(inflections_set))
+
+
+def _render_letters(
+    pth: ProjectPaths,
+    rupth: RuPaths,
+    lang: str,
+    batch: list[LetterJob],
+    all_words_set: set[str],
+    manifest_list: ListProxy,
+    chunk_size: int = 1000
+) -> None:
+    """Render and write the xhtml of each letter in a batch,
+    querying the db in chunks so only one chunk is held in memory."""
+
+    db_session = get_db_session(pth.dpd_db_path)
+    templ = EbookTemplates(pth, rupth, lang)
+    if lang == "ru":
+        text_dir = rupth.epub_text_dir
+    else:
+        text_dir = pth.epub_text_dir
+
+    # entries change the headwords for html, never write them back
+    with db_session.no_autoflush:
+        for job in batch:
+            inflections_counter = 0
+            header, footer = render_ebook_letter_templ(templ, job.letter)
+
+            with open(text_dir.joinpath(job.file_name), "w") as f:
+                f.write(header)
+
+                for start in range(0, len(job.headwords), chunk_size):
+                    chunk = job.headwords[start:start + chunk_size]
+                    query = db_session \
+                        .query(DpdHeadword) \
+                        .options(joinedload(DpdHeadword.rt)) \
+                        .filter(DpdHeadword.id.in_([id for __counter__, id in chunk]))
+                    if lang == "ru":
+                        query = query.options(joinedload(DpdHeadword.ru))
+                    headwords_dict = {i.id: i for i in query}
+
+                    for counter, id in chunk:
+                        i = headwords_dict[id]
+                        inflection_list = make_inflections_list(i, all_words_set)
+                        inflections_counter += len(inflection_list)
+                        f.write(render_ebook_entry(
+                            templ, counter, i, inflection_list, lang))
+                    db_session.expunge_all()
+
+                for start in range(0, len(job.deconstructions), chunk_size):
+                    chunk = job.deconstructions[start:start + chunk_size]
+                    lookup_dict = {
+                        i.lookup_key: i for i in db_session
+                        .query(Lookup)
+                        .filter(Lookup.lookup_key.in_([key for __counter__, key in chunk]))}
+
+                    for counter, lookup_key in chunk:
+                        f.write(render_deconstructor_entry(
+                            templ, counter, lookup_dict[lookup_key]))
+                    db_session.expunge_all()
+
+                f.write(footer)
+
+            manifest_list.append(LetterManifest(
+                job.letter_idx, job.file_name, len(job), inflections_counter))
+            p_counter(job.letter_idx, len(pali_alphabet), job.letter)
 
     db_session.close()
-    return id_counter+1
 
 # --------------------------------------------------------------------------------------
 # functions to create the various templates
 
 
+class EbookTemplates():
+    """The mako templates of the ebook in one language, compiled once."""
+
+    def __init__(self, pth: ProjectPaths, rupth: RuPaths, lang="en") -> None:
+        lang_pth: Union[ProjectPaths, RuPaths] = rupth if lang == "ru" else pth
+        self.entry = Template(filename=str(lang_pth.ebook_entry_templ_path))
+        self.grammar = Template(filename=str(lang_pth.ebook_grammar_templ_path))
+        self.example = Template(filename=str(lang_pth.ebook_example_templ_path))
+        self.deconstructor = Template(filename=str(pth.ebook_deconstructor_templ_path))
+        self.letter = Template(filename=str(lang_pth.ebook_letter_templ_path))
+        self.abbreviation_entry = Template(
+            filename=str(lang_pth.ebook_abbrev_entry_templ_path))
+
+
 def render_ebook_entry(
-        pth: ProjectPaths, rupth:RuPaths, counter: int, i: DpdHeadword, inflections: list, lang="en") -> str:
+        templ: EbookTemplates, counter: int, i: DpdHeadword, inflections: list, lang="en") -> str:
     """Render single word entry."""
 
     summary = f"{i.pos}. "
@@ -222,21 +346,16 @@ def render_ebook_entry(
         if isinstance(attr_value, str):
             setattr(i, attr_name, html_friendly(attr_value))
 
-    grammar_table = render_grammar_templ(pth, rupth, i, lang)
+    grammar_table = render_grammar_templ(templ, i, lang)
     if "&" in grammar_table:
         if lang == "ru":
             grammar_table = grammar_table.replace(" & ", " и ")
         else:
             grammar_table = grammar_table.replace(" & ", " &amp; ")
 
-    examples = render_example_templ(pth, rupth, i, lang)
-
-    if lang == "ru":
-        ebook_entry_templ = Template(filename=str(rupth.ebook_entry_templ_path))
-    else:
-        ebook_entry_templ = Template(filename=str(pth.ebook_entry_templ_path))
+    examples = render_example_templ(templ, i)
 
-    return str(ebook_entry_templ.render(
+    return str(templ.entry.render(
             counter=counter,
             lemma_1=i.lemma_1,
             lemma_clean=i.lemma_clean,
@@ -246,7 +365,7 @@ def render_ebook_entry(
             examples=examples))
 
 
-def render_grammar_templ(pth: ProjectPaths, rupth:RuPaths, i: DpdHeadword, lang="en") -> str:
+def render_grammar_templ(templ: EbookTemplates, i: DpdHeadword, lang="en") -> str:
     """html table of grammatical information"""
 
     if i.meaning_1:
@@ -258,13 +377,8 @@ def render_grammar_templ(pth: ProjectPaths, rupth:RuPaths, i: DpdHeadword, lang=
 
         meaning = f"{make_meaning_combo_html(i)}"
 
-        if lang == "ru":
-            ebook_grammar_templ = Template(filename=str(rupth.ebook_grammar_templ_path))
-        else:
-            ebook_grammar_templ = Template(filename=str(pth.ebook_grammar_templ_path))
-        
         return str(
-            ebook_grammar_templ.render(
+            templ.grammar.render(
                 i=i,
                 grammar=grammar,
                 meaning=meaning,))
@@ -273,50 +387,47 @@ def render_grammar_templ(pth: ProjectPaths, rupth:RuPaths, i: DpdHeadword, lang=
         return ""
 
 
-def render_example_templ(pth: ProjectPaths, rupth:RuPaths, i: DpdHeadword, lang="en") -> str:
+def render_example_templ(templ: EbookTemplates, i: DpdHeadword) -> str:
     """render sutta examples html"""
 
-    if lang == "ru":
-        ebook_example_templ = Template(filename=str(rupth.ebook_example_templ_path))
-    else:
-        ebook_example_templ = Template(filename=str(pth.ebook_example_templ_path))
-
     if i.meaning_1 and i.example_1:
-        return str(ebook_example_templ.render(i=i))
+        return str(templ.example.render(i=i))
     else:
         return ""
 
 
 def render_deconstructor_entry(
-        pth: ProjectPaths, counter: int, i: Lookup) -> str:
+        templ: EbookTemplates, counter: int, i: Lookup) -> str:
     """Render deconstructor word entry."""
 
     construction = i.lookup_key
     deconstruction = "<br/>".join(i.deconstructor_unpack)
 
-    ebook_deconstructor_templ = Template(
-        filename=str(
-            pth.ebook_deconstructor_templ_path))
-
-    return str(ebook_deconstructor_templ.render(
+    return str(templ.deconstructor.render(
             counter=counter,
             construction=construction,
             deconstruction=deconstruction))
 
 
+letter_entries_placeholder = "<!-- entries -->"
+
+
 def render_ebook_letter_templ(
-        pth: Union[ProjectPaths, RuPaths], letter: str, entries: str) -> str:
-    """Render all entries for a single letter."""
-    ebook_letter_templ = Template(filename=str(pth.ebook_letter_templ_path))
-    return str(ebook_letter_templ.render(
+        templ: EbookTemplates, letter: str) -> tuple[str, str]:
+    """Render the page of a single letter,
+    split into the html before and after the entries."""
+    xhtml = str(templ.letter.render(
             letter=letter,
-            entries=entries))
+            entries=letter_entries_placeholder))
+    header, footer = xhtml.split(letter_entries_placeholder)
+    return header, footer
 
 
 def save_abbreviations_xhtml_page(pth: ProjectPaths, rupth:RuPaths, id_counter, lang="en"):
     """Render xhtml of all DPD abbreviations and save as a page."""
 
     p_green("saving abbrev xhtml")
+    templ = EbookTemplates(pth, rupth, lang)
     abbreviations_list = []
 
     file_path = pth.abbreviations_tsv_path
@@ -329,39 +440,33 @@ def save_abbreviations_xhtml_page(pth: ProjectPaths, rupth:RuPaths, id_counter,
                 value = "&gt;"
             i[key] = html_friendly(value)
         abbreviation_entries += [
-            render_abbreviation_entry(pth, rupth, id_counter, i, lang)
+            render_abbreviation_entry(templ, id_counter, i)
         ]
         id_counter += 1
 
     entries = "".join(abbreviation_entries)
     if lang == "ru":
-        xhtml = render_ebook_letter_templ(rupth, "Сокращения", entries)
+        header, footer = render_ebook_letter_templ(templ, "Сокращения")
         with open(rupth.epub_abbreviations_path, "w") as f:
-            f.write(xhtml)
+            f.write(header + entries + footer)
     else:
-        xhtml = render_ebook_letter_templ(pth, "Abbreviations", entries)
+        header, footer = render_ebook_letter_templ(templ, "Abbreviations")
         with open(pth.epub_abbreviations_path, "w") as f:
-            f.write(xhtml)
+            f.write(header + entries + footer)
 
     p_yes(len(abbreviations_list))
 
 
-def render_abbreviation_entry(pth: ProjectPaths, rupth:RuPaths, counter: int, i: dict, lang="en") -> str:
+def render_abbreviation_entry(templ: EbookTemplates, counter: int, i: dict) -> str:
     """Render a single abbreviations entry."""
 
-    if lang == "ru":
-        ebook_abbreviation_entry_templ = Template(
-            filename=str(rupth.ebook_abbrev_entry_templ_path))
-    else:
-        ebook_abbreviation_entry_templ = Template(
-            filename=str(pth.ebook_abbrev_entry_templ_path))
-
-    return str(ebook_abbreviation_entry_templ.render(
+    return str(templ.abbreviation_entry.render(
             counter=counter,
             i=i))
 
 
-def save_title_page_xhtml(pth: ProjectPaths, rupth:RuPaths, lang="en"):
+def save_title_page_xhtml(
+        pth: ProjectPaths, rupth:RuPaths, letter_files: list[str], lang="en"):
     """Save date and time in title page xhtml."""
     p_green("saving titlepage xhtml")
     current_datetime = datetime.now()
@@ -388,11 +493,12 @@ def save_title_page_xhtml(pth: ProjectPaths, rupth:RuPaths, lang="en"):
 
     p_yes("OK")
 
-    save_content_opf_xhtml(pth, rupth, current_datetime, lang)
+    save_content_opf_xhtml(pth, rupth, current_datetime, letter_files, lang)
 
 
-def save_content_opf_xhtml(pth: ProjectPaths, rupth:RuPaths, current_datetime, lang="en"):
-    """Save date and time in content.opf."""
+def save_content_opf_xhtml(
+        pth: ProjectPaths, rupth:RuPaths, current_datetime, letter_files: list[str], lang="en"):
+    """Save date and time and the letter files in content.opf."""
     p_green("saving content.opf")
 
     date_time_zulu = current_datetime.strftime("%Y-%m-%dT%H:%M:%SZ")
@@ -405,7 +511,8 @@ def save_content_opf_xhtml(pth: ProjectPaths, rupth:RuPaths, current_datetime, l
             filename=str(pth.ebook_content_opf_templ_path))
 
     content = str(ebook_content_opf_templ.render(
-            date_time_zulu=date_time_zulu))
+            date_time_zulu=date_time_zulu,
+            letter_files=letter_files))
 
     if lang == "ru":
         with open(rupth.epub_content_opf_path, "w") as f:
@@ -420,12 +527,9 @@ def save_content_opf_xhtml(pth: ProjectPaths, rupth:RuPaths, current_datetime, l
 def zip_epub(pth: Union[ProjectPaths, RuPaths]):
     """Zip up the epub dir and name it dpd-kindle.epub."""
     p_green("zipping up epub")
-    with ZipFile(pth.dpd_epub_path, "w", ZIP_DEFLATED) as zipf:
-        for root, _, files in os.walk(pth.epub_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                zipf.write(file_path, os.path.relpath(file_path, pth.epub_dir))
+    stats = archiver.zip_epub(pth.epub_dir, pth.dpd_epub_path)
     p_yes("OK")
+    p_archive_stats(stats)
 
 
 def make_mobi(pth: Union[ProjectPaths, RuPaths]):
@@ -463,9 +567,9 @@ def main():
             raise ValueError("Invalid language parameter")
         pth = ProjectPaths()
         rupth = RuPaths()
-        id_counter = render_xhtml(pth, rupth, lang)
+        id_counter, letter_files = render_xhtml(pth, rupth, lang)
         save_abbreviations_xhtml_page(pth, rupth, id_counter, lang)
-        save_title_page_xhtml(pth, rupth, lang)
+        save_title_page_xhtml(pth, rupth, letter_files, lang)
         if lang == "ru":
             zip_epub(rupth)
             make_mobi(rupth)
@@ -11,8 +11,9 @@ Export to `TBW2` and `sc-data` repos
 import json
 
 from db.db_helpers import get_db_session
-from db.models import DpdHeadword, Lookup
+from db.models import Lookup
 from tools.configger import config_test
+from tools.headword_snapshot import get_headword_snapshot
 from tools.pali_sort_key import pali_list_sorter, pali_sort_key
 from tools.printer import p_green, p_green_title, p_title, p_yes
 from tools.tic_toc import tic, toc
@@ -27,8 +28,8 @@ class ProgData():
         p_green("setting up data")
         self.pth: ProjectPaths = ProjectPaths()
         self.db_session = get_db_session(self.pth.dpd_db_path)
-        dpd_db = self.db_session.query(DpdHeadword)
-        self.dpd_db = sorted(dpd_db, key=lambda x: pali_sort_key(x.lemma_1))
+        # shared read-only snapshot, already in pali alphabetical order
+        self.dpd_db = get_headword_snapshot(self.pth.dpd_db_path)
         self.deconstructor_db = self.db_session \
             .query(Lookup) \
             .filter(Lookup.deconstructor != "") \
@@ -0,0 +1,180 @@
+"""Cache rendered search results in the webapp.
+
+Nothing changes between database builds, so rendered html fragments per
+(lookup key, language, template set) and the final response bodies are
+kept in an LRU cache bounded by bytes. Every entry is stamped with the
+db build version, and the whole cache is dropped when dpd.db changes.
+
+Cached responses carry a strong ETag and Cache-Control, and keep a
+gzipped copy of the body, so a repeat search is a dict hit, and a
+conditional request is a 304.
+"""
+
+import gzip
+import hashlib
+import threading
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+
+from fastapi import Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response
+
+from tools.date_and_time import year_month_day_dash
+
+
+# browsers revalidate after an hour, shared caches after a day
+cache_control = "public, max-age=3600, s-maxage=86400"
+
+
+def db_version_stamp(db_path: Path) -> tuple:
+    """Changes whenever dpd.db is rebuilt.
+    The date is included as rendered fragments include today's date."""
+    stat = db_path.stat()
+    return (stat.st_mtime_ns, stat.st_size, year_month_day_dash())
+
+
+class CachedResponse():
+    """A response body with its ETag and gzipped copy."""
+
+    __slots__ = ["body", "media_type", "etag", "_gzipped"]
+
+    def __init__(self, body: bytes, media_type: str) -> None:
+        self.body = body
+        self.media_type = media_type
+        self.etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        self._gzipped: Optional[bytes] = None
+
+    @property
+    def gzipped(self) -> bytes:
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=9, mtime=0)
+        return self._gzipped
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self._gzipped or b"")
+
+
+class RenderCache():
+    """A thread-safe LRU cache bounded by the size of its values in bytes."""
+
+    def __init__(self, db_path: Path, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.stamp: tuple = db_version_stamp(db_path)
+        self.entries: OrderedDict[tuple, tuple[object, int]] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def check_stamp(self) -> None:
+        """Drop everything if the db has been rebuilt."""
+        stamp = db_version_stamp(self.db_path)
+        if stamp != self.stamp:
+            with self.lock:
+                self.entries.clear()
+                self.bytes = 0
+                self.stamp = stamp
+
+    def get(self, key: tuple):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: tuple, value, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                __key__, (__value__, old_size) = self.entries.popitem(last=False)
+                self.bytes -= old_size
+
+    def resize(self, key: tuple, size: int) -> None:
+        """Update the size of an entry which has grown,
+        e.g. when a gzipped copy is added."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.bytes += size - entry[1]
+                self.entries[key] = (entry[0], size)
+
+    def fragments(
+        self,
+        lang: str,
+        template_set: str,
+        q: str,
+        render: Callable[[], tuple[str, str]]
+    ) -> tuple[str, str]:
+        """Rendered (dpd_html, summary_html) for a search."""
+        key = ("fragments", lang, template_set, q)
+        fragments = self.get(key)
+        if fragments is None:
+            fragments = render()
+            self.put(key, fragments, sum(len(x) for x in fragments))
+        return fragments
+
+    def response(
+        self,
+        request: Request,
+        q: str,
+        make_body: Callable[[], bytes],
+        media_type: str
+    ) -> Response:
+        """A cached response for a search on this path,
+        a 304 if the client already has it, gzipped if the client accepts it."""
+
+        key = ("response", request.url.path, q)
+        cached: Optional[CachedResponse] = self.get(key)
+        if cached is None:
+            cached = CachedResponse(make_body(), media_type)
+            self.put(key, cached, cached.size)
+
+        headers = {
+            "ETag": cached.etag,
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = request.headers.get("if-none-match", "")
+        if cached.etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            size = cached.size
+            body = cached.gzipped
+            if cached.size != size:
+                self.resize(key, cached.size)
+            headers["Content-Encoding"] = "gzip"
+            return Response(body, media_type=media_type, headers=headers)
+        else:
+            return Response(cached.body, media_type=media_type, headers=headers)
+
+
+class PrecompressedGZipMiddleware():
+    """GZipMiddleware for every path except the ones which serve
+    precompressed bodies from the render cache."""
+
+    def __init__(self, app, precompressed_paths: list[str], minimum_size: int = 500) -> None:
+        self.app = app
+        self.precompressed_paths = set(precompressed_paths)
+        self.gzip_app = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and scope["path"] in self.precompressed_paths:
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip_app(scope, receive, send)
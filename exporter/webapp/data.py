@@ -0,0 +1,214 @@
+"""Read-only data access for the webapp.
+
+One engine with a connection pool is shared by every request in a worker.
+Connections are opened read-only, with a large prepared statement cache,
+and all the data for a search is loaded in a fixed number of queries:
+lookup, headwords with their related rows, roots, root families and
+compound, idiom and set families.
+"""
+
+import os
+
+from functools import cache
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import Engine, create_engine, event, select
+from sqlalchemy.orm import Session, joinedload, sessionmaker
+
+from db.models import DpdHeadword
+from db.models import DpdRoot
+from db.models import FamilyCompound
+from db.models import FamilyIdiom
+from db.models import FamilyRoot
+from db.models import FamilySet
+from db.models import Lookup
+
+from tools.pali_sort_key import pali_sort_key
+
+
+# related rows used in the headword templates, all one to one
+headword_options = (
+    joinedload(DpdHeadword.rt),
+    joinedload(DpdHeadword.fr),
+    joinedload(DpdHeadword.fw),
+    joinedload(DpdHeadword.sbs),
+    joinedload(DpdHeadword.ru),
+)
+
+
+@cache
+def get_engine(db_path: Path) -> Engine:
+    """One read-only engine and connection pool per process."""
+
+    pool_size = os.cpu_count() or 4
+    engine = create_engine(
+        f"sqlite+pysqlite:///file:{db_path}?mode=ro&uri=true",
+        echo=False,
+        pool_size=pool_size,
+        max_overflow=pool_size,
+        pool_pre_ping=False,
+        connect_args={
+            "check_same_thread": False,
+            "cached_statements": 512,
+        })
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA query_only = ON")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+        cursor.execute("PRAGMA mmap_size = 268435456")
+        cursor.close()
+
+    return engine
+
+
+@cache
+def get_session_maker(db_path: Path) -> sessionmaker[Session]:
+    return sessionmaker(get_engine(db_path), autoflush=False)
+
+
+def unique(items: list) -> list:
+    """Remove duplicates, keeping the order."""
+    return list(dict.fromkeys(items))
+
+
+class SearchData():
+    """All the data needed to render one search."""
+
+    def __init__(self) -> None:
+        self.lookups: list[Lookup] = []
+        self.headwords: dict[int, DpdHeadword] = {}
+        self.roots: dict[str, DpdRoot] = {}
+        self.family_roots: dict[str, list[FamilyRoot]] = {}
+        self.family_compounds: dict[str, FamilyCompound] = {}
+        self.family_idioms: dict[str, FamilyIdiom] = {}
+        self.family_sets: dict[str, FamilySet] = {}
+
+    def headwords_for(self, ids: list[int]) -> list[DpdHeadword]:
+        results = [self.headwords[id] for id in ids if id in self.headwords]
+        return sorted(results, key=lambda x: pali_sort_key(x.lemma_1))
+
+    def roots_for(self, roots: list[str]) -> list[DpdRoot]:
+        return [self.roots[root] for root in roots if root in self.roots]
+
+    def get_family_compounds(self, i: DpdHeadword) -> list[FamilyCompound]:
+        """Same as tools.exporter_functions.get_family_compounds"""
+        if i.family_compound:
+            keys = unique(i.family_compound_list)
+        else:
+            keys = [i.lemma_clean]
+        return [
+            self.family_compounds[key] for key in keys
+            if key in self.family_compounds]
+
+    def get_family_idioms(self, i: DpdHeadword) -> list[FamilyIdiom]:
+        """Same as tools.exporter_functions.get_family_idioms"""
+        if i.family_idioms:
+            keys = unique(i.family_idioms_list)
+        else:
+            keys = [i.lemma_clean]
+        return [
+            self.family_idioms[key] for key in keys
+            if key in self.family_idioms]
+
+    def get_family_set(self, i: DpdHeadword) -> list[FamilySet]:
+        """Same as tools.exporter_functions.get_family_set"""
+        return [
+            self.family_sets[key] for key in unique(i.family_set_list)
+            if key in self.family_sets]
+
+
+def load_headwords(
+    db_session: Session,
+    data: SearchData,
+    condition
+) -> None:
+    """Load headwords, their related rows and families."""
+
+    headwords = db_session.scalars(
+        select(DpdHeadword)
+        .where(condition)
+        .options(*headword_options)
+    ).all()
+    data.headwords.update((i.id, i) for i in headwords)
+
+    compound_keys: set[str] = set()
+    idiom_keys: set[str] = set()
+    set_keys: set[str] = set()
+    for i in headwords:
+        compound_keys.update(i.family_compound_list)
+        idiom_keys.update(i.family_idioms_list)
+        set_keys.update(i.family_set_list)
+
+    if compound_keys:
+        data.family_compounds = {
+            fc.compound_family: fc for fc in db_session.scalars(
+                select(FamilyCompound)
+                .where(FamilyCompound.compound_family.in_(compound_keys)))}
+    if idiom_keys:
+        data.family_idioms = {
+            fi.idiom: fi for fi in db_session.scalars(
+                select(FamilyIdiom)
+                .where(FamilyIdiom.idiom.in_(idiom_keys)))}
+    if set_keys:
+        data.family_sets = {
+            fs.set: fs for fs in db_session.scalars(
+                select(FamilySet)
+                .where(FamilySet.set.in_(set_keys)))}
+
+
+def load_roots(
+    db_session: Session,
+    data: SearchData,
+    roots: list[str]
+) -> None:
+    """Load roots and all their root families."""
+
+    data.roots = {
+        r.root: r for r in db_session.scalars(
+            select(DpdRoot).where(DpdRoot.root.in_(roots)))}
+
+    family_roots = db_session.scalars(
+        select(FamilyRoot).where(FamilyRoot.root_key.in_(roots))).all()
+    for fr in family_roots:
+        data.family_roots.setdefault(fr.root_key, []).append(fr)
+    for root_key, frs in data.family_roots.items():
+        frs.sort(key=lambda x: pali_sort_key(x.root_family))
+
+
+def load_search_data(
+    db_session: Session,
+    q: str,
+    headword_id: Optional[int] = None,
+    lemma_1: Optional[str] = None
+) -> SearchData:
+    """Load everything for a search.
+    Search the lookup table, or a single headword by id or lemma_1."""
+
+    data = SearchData()
+
+    if headword_id is not None:
+        load_headwords(db_session, data, DpdHeadword.id == headword_id)
+
+    elif lemma_1 is not None:
+        load_headwords(db_session, data, DpdHeadword.lemma_1 == lemma_1)
+
+    else:
+        data.lookups = list(db_session.scalars(
+            select(Lookup).where(Lookup.lookup_key.ilike(q))))
+
+        headword_ids: list[int] = []
+        roots: list[str] = []
+        for lookup in data.lookups:
+            headword_ids.extend(lookup.headwords_unpack)
+            roots.extend(lookup.roots_unpack)
+
+        if headword_ids:
+            load_headwords(
+                db_session, data, DpdHeadword.id.in_(unique(headword_ids)))
+        if roots:
+            load_roots(db_session, data, unique(roots))
+
+    return data
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+"""Load test the webapp search endpoints.
+
+Sample lookup keys from dpd.db and send them from many threads to a running
+webapp, or call make_dpd_html directly to measure the data layer and
+rendering without HTTP. Report requests per second and latency percentiles
+for each concurrency level.
+
+Usage:
+    uvicorn exporter.webapp.main:app --port 8080 --workers 4
+    python exporter/webapp/load_test.py --url http://127.0.0.1:8080
+    python exporter/webapp/load_test.py --direct
+"""
+
+import argparse
+import random
+import statistics
+import time
+import urllib.parse
+import urllib.request
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from rich import print
+from rich.table import Table
+from sqlalchemy import select
+
+from db.db_helpers import get_db_session
+from db.models import Lookup
+from tools.paths import ProjectPaths
+
+
+def sample_queries(pth: ProjectPaths, count: int, seed: int) -> list[str]:
+    """A repeatable random sample of lookup keys with headwords or roots."""
+
+    db_session = get_db_session(pth.dpd_db_path)
+    keys = db_session.scalars(
+        select(Lookup.lookup_key)
+        .where((Lookup.headwords != "") | (Lookup.roots != ""))
+    ).all()
+    db_session.close()
+    random.seed(seed)
+    return random.sample(keys, min(count, len(keys)))
+
+
+def make_http_search(url: str, endpoint: str) -> Callable[[str], None]:
+    def search(q: str) -> None:
+        query = urllib.parse.urlencode({"q": q, "search": q})
+        with urllib.request.urlopen(f"{url}{endpoint}?{query}") as response:
+            response.read()
+    return search
+
+
+def make_direct_search(pth: ProjectPaths) -> Callable[[str], None]:
+    from fastapi.templating import Jinja2Templates
+    from exporter.goldendict.helpers import make_roots_count_dict
+    from exporter.webapp.tools import make_dpd_html
+
+    db_session = get_db_session(pth.dpd_db_path)
+    roots_count_dict = make_roots_count_dict(db_session)
+    db_session.close()
+    templates = Jinja2Templates(directory="exporter/webapp/templates")
+
+    def search(q: str) -> None:
+        make_dpd_html(
+            q, pth, templates, roots_count_dict, set(), defaultdict(list))
+    return search
+
+
+def run_level(
+    search: Callable[[str], None],
+    queries: list[str],
+    concurrency: int
+) -> tuple[float, float, float, float]:
+    """Return requests per second and p50, p95, p99 latency in ms."""
+
+    def timed(q: str) -> float:
+        start = time.perf_counter()
+        search(q)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(timed, queries))
+    seconds = time.perf_counter() - start
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return (
+        len(queries) / seconds,
+        quantiles[49] * 1000,
+        quantiles[94] * 1000,
+        quantiles[98] * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument(
+        "--endpoint", default="/search_json",
+        choices=["/search_json", "/search_html", "/gd"])
+    parser.add_argument(
+        "--direct", action="store_true",
+        help="call make_dpd_html in this process instead of using HTTP")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pth = ProjectPaths()
+    queries = sample_queries(pth, args.requests, args.seed)
+    if args.direct:
+        search = make_direct_search(pth)
+        title = "make_dpd_html"
+    else:
+        search = make_http_search(args.url, args.endpoint)
+        title = f"{args.url}{args.endpoint}"
+
+    # warm up templates, connections and the os page cache
+    for q in queries[:20]:
+        search(q)
+
+    table = Table(title=f"{title}, {len(queries):,} requests")
+    table.add_column("concurrency", justify="right")
+    table.add_column("req/s", justify="right")
+    table.add_column("p50 ms", justify="right")
+    table.add_column("p95 ms", justify="right")
+    table.add_column("p99 ms", justify="right")
+    for concurrency in args.concurrency:
+        rps, p50, p95, p99 = run_level(search, queries, concurrency)
+        table.add_row(
+            str(concurrency), f"{rps:,.0f}",
+            f"{p50:.1f}", f"{p95:.1f}", f"{p99:.1f}")
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,15 @@
 import uvicorn
 
 from fastapi import FastAPI
-from fastapi.middleware.gzip import GZipMiddleware
 from fastapi import Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 
 
+from exporter.webapp.cache import PrecompressedGZipMiddleware
+from exporter.webapp.cache import RenderCache
 from exporter.webapp.tools import make_headwords_clean_set
 from exporter.webapp.tools import make_ascii_to_unicode_dict
 from exporter.webapp.tools import make_dpd_html
@@ -19,7 +21,14 @@ from tools.paths import ProjectPaths
 
 
 app = FastAPI()
-app.add_middleware(GZipMiddleware, minimum_size=500)
+# search responses are gzipped once and kept in the render cache
+app.add_middleware(
+    PrecompressedGZipMiddleware,
+    precompressed_paths=[
+        "/search_html", "/ru/search_html",
+        "/search_json", "/ru/search_json",
+        "/gd", "/ru/gd"],
+    minimum_size=500)
 app.mount("/static", StaticFiles(directory="exporter/webapp/static"), name="static")
 
 pth: ProjectPaths = ProjectPaths()
@@ -32,6 +41,8 @@ headwords_clean_set_ru = make_headwords_clean_set(db_session, 'ru')
 ascii_to_unicode_dict = make_ascii_to_unicode_dict(db_session)
 db_session.close()
 
+render_cache = RenderCache(pth.dpd_db_path)
+
 # Set up templates
 templates = Jinja2Templates(directory="exporter/webapp/templates")
 templates_ru = Jinja2Templates(directory="exporter/webapp/ru_templates")
@@ -65,60 +76,52 @@ def home_page_ru(request: Request, response_class=HTMLResponse):
     )
 
 
-@app.get("/search_html", response_class=HTMLResponse)
-def db_search_html(request: Request, q: str):
-    dpd_html, summary_html = make_dpd_html(q, pth, templates, roots_count_dict, headwords_clean_set, ascii_to_unicode_dict)
-    return templates.TemplateResponse(
-        "home.html", {
-            "request": request,
-            "q": q,
-            "dpd_results": dpd_html,
-        }
-    )
+def cached_dpd_html(q: str, lang: str) -> tuple[str, str]:
+    """Rendered dpd_html and summary_html, from the render cache."""
+    if lang == "ru":
+        return render_cache.fragments(
+            "ru", "ru_templates", q,
+            lambda: make_dpd_html(q, pth, templates_ru, roots_count_dict, headwords_clean_set_ru, ascii_to_unicode_dict, "ru"))
+    else:
+        return render_cache.fragments(
+            "en", "templates", q,
+            lambda: make_dpd_html(q, pth, templates, roots_count_dict, headwords_clean_set, ascii_to_unicode_dict))
 
 
-@app.get("/ru/search_html", response_class=HTMLResponse)
-def db_search_html_ru(request: Request, q: str):
-    dpd_html, summary_html = make_dpd_html(q, pth, templates_ru, roots_count_dict, headwords_clean_set_ru, ascii_to_unicode_dict, 'ru')
-    return templates_ru.TemplateResponse(
-        "home.html", {
+def search_html_response(request: Request, q: str, lang: str) -> Response:
+    page_templates = templates_ru if lang == "ru" else templates
+
+    def make_body() -> bytes:
+        dpd_html, summary_html = cached_dpd_html(q, lang)
+        return page_templates.get_template("home.html").render({
             "request": request,
             "q": q,
             "dpd_results": dpd_html,
-        }
-    )
-
-
-@app.get("/search_json", response_class=JSONResponse)
-def db_search_json(request: Request, q: str):
-    dpd_html, summary_html = make_dpd_html(q, pth, templates, roots_count_dict, headwords_clean_set, ascii_to_unicode_dict)
-    response_data = {
-        "summary_html": summary_html,
-        "dpd_html": dpd_html
-    }
-    headers = {"Accept-Encoding": "gzip"}
-    return JSONResponse(content=response_data, headers=headers)
+        }).encode()
 
+    render_cache.check_stamp()
+    return render_cache.response(request, q, make_body, "text/html")
 
-@app.get("/ru/search_json", response_class=JSONResponse)
-def db_search_json_ru(request: Request, q: str):
-    dpd_html, summary_html = make_dpd_html(q, pth, templates_ru, roots_count_dict, headwords_clean_set_ru, ascii_to_unicode_dict, 'ru')
-    response_data = {
-        "summary_html": summary_html,
-        "dpd_html": dpd_html
-    }
-    headers = {"Accept-Encoding": "gzip"}
-    return JSONResponse(content=response_data, headers=headers)
 
+def search_json_response(request: Request, q: str, lang: str) -> Response:
+    def make_body() -> bytes:
+        dpd_html, summary_html = cached_dpd_html(q, lang)
+        response_data = {
+            "summary_html": summary_html,
+            "dpd_html": dpd_html
+        }
+        return JSONResponse(content=response_data).body
 
-@app.get("/gd", response_class=HTMLResponse)
-def db_search_gd(request: Request, search: str):
+    render_cache.check_stamp()
+    response = render_cache.response(request, q, make_body, "application/json")
+    response.headers["Accept-Encoding"] = "gzip"
+    return response
 
-    dpd_html, summary_html = make_dpd_html(search, pth, templates, roots_count_dict, headwords_clean_set, ascii_to_unicode_dict)
-    global dpd_css, dpd_js, home_simple_css
 
-    return templates.TemplateResponse(
-        "home_simple.html", {
+def search_gd_response(request: Request, search: str, lang: str) -> Response:
+    def make_body() -> bytes:
+        dpd_html, summary_html = cached_dpd_html(search, lang)
+        return templates.get_template("home_simple.html").render({
             "request": request,
             "search": search,
             "dpd_results": dpd_html,
@@ -126,27 +129,40 @@ def db_search_gd(request: Request, search: str):
             "dpd_css": dpd_css,
             "dpd_js": dpd_js,
             "home_simple_css": home_simple_css,
-        }
-    )
+        }).encode()
 
+    render_cache.check_stamp()
+    return render_cache.response(request, search, make_body, "text/html")
 
-@app.get("/ru/gd", response_class=HTMLResponse)
-def db_search_gd_ru(request: Request, search: str):
 
-    dpd_html, summary_html = make_dpd_html(search, pth, templates_ru, roots_count_dict, headwords_clean_set_ru, ascii_to_unicode_dict, "ru")
-    global dpd_css, dpd_js, home_simple_css
+@app.get("/search_html", response_class=HTMLResponse)
+async def db_search_html(request: Request, q: str):
+    return await run_in_threadpool(search_html_response, request, q, "en")
 
-    return templates.TemplateResponse(
-        "home_simple.html", {
-            "request": request,
-            "search": search,
-            "dpd_results": dpd_html,
-            "summary": summary_html,
-            "dpd_css": dpd_css,
-            "dpd_js": dpd_js,
-            "home_simple_css": home_simple_css,
-        }
-    )
+
+@app.get("/ru/search_html", response_class=HTMLResponse)
+async def db_search_html_ru(request: Request, q: str):
+    return await run_in_threadpool(search_html_response, request, q, "ru")
+
+
+@app.get("/search_json", response_class=JSONResponse)
+async def db_search_json(request: Request, q: str):
+    return await run_in_threadpool(search_json_response, request, q, "en")
+
+
+@app.get("/ru/search_json", response_class=JSONResponse)
+async def db_search_json_ru(request: Request, q: str):
+    return await run_in_threadpool(search_json_response, request, q, "ru")
+
+
+@app.get("/gd", response_class=HTMLResponse)
+async def db_search_gd(request: Request, search: str):
+    return await run_in_threadpool(search_gd_response, request, search, "en")
+
+
+@app.get("/ru/gd", response_class=HTMLResponse)
+async def db_search_gd_ru(request: Request, search: str):
+    return await run_in_threadpool(search_gd_response, request, search, "ru")
 
 
 if __name__ == "__main__":
@@ -163,6 +179,8 @@ if __name__ == "__main__":
 # run in terminal: 
 # uvicorn exporter.webapp.main:app --host 127.1.1.1 --port 8080 --reload --reload-dir exporter/webapp
 # uvicorn exporter.webapp.main:app --host 0.0.0.0 --port 8080 --reload --reload-dir exporter/webapp
+# in production run one worker per core, each has its own read-only connection pool
+# uvicorn exporter.webapp.main:app --host 0.0.0.0 --port 8080 --workers 4
 
 
 # TODO make help popup tooltips and a toggle to turn them off
@@ -1,3 +1,7 @@
+from functools import cache
+
+from sqlalchemy import inspect
+
 from db.models import DpdRoot, Lookup
 
 from tools.configger import config_test
@@ -10,6 +14,41 @@ from tools.date_and_time import year_month_day_dash
 from exporter.goldendict.ru_components.tools.tools_for_ru_exporter import make_ru_meaning, ru_replace_abbreviations, ru_make_grammar_line, ru_replace_abbreviations_list
 
 
+@cache
+def newline_columns(cls) -> frozenset[str]:
+    """Mapped columns which can have newlines converted to <br>,
+    skipping private, html and data columns."""
+    return frozenset(
+        column.key for column in inspect(cls).column_attrs
+        if not column.key.startswith("_")
+        and "html" not in column.key
+        and "data" not in column.key)
+
+
+class TemplateRow():
+    """Wrap an ORM object for the templates, without changing it.
+    String columns have newlines converted to <br>.
+    Every attribute, including properties, is computed once on first use,
+    so the cost scales with what a template actually uses."""
+
+    def __init__(self, obj, wrap: tuple[str, ...] = ()) -> None:
+        self._obj = obj
+        self._columns = newline_columns(type(obj))
+        self._wrap = wrap
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        value = getattr(self._obj, name)
+        if name in self._columns and isinstance(value, str):
+            value = value.replace("\n", "<br>")
+        elif name in self._wrap and value is not None:
+            value = TemplateRow(value)
+        # cache on the instance, __getattr__ is not called again
+        setattr(self, name, value)
+        return value
+
+
 class HeadwordData():
     def __init__(self, i, fc, fi, fs):
         self.meaning = make_meaning_combo_html(i)
@@ -21,8 +60,6 @@ class HeadwordData():
         self.ru_pos = ru_replace_abbreviations(i.pos, "gram")
         self.ru_plus_case = ru_replace_abbreviations(i.plus_case, "gram")
         self.i = self.convert_newlines(i)
-        self.i.sbs = self.convert_newlines(i.sbs)
-        self.i.ru = self.convert_newlines(i.ru)
         self.fc = fc
         self.fi = fi
         self.fs = fs
@@ -39,20 +76,9 @@ class HeadwordData():
             self.show_sbs_data = False
 
     @staticmethod
-    def convert_newlines(obj):
-        for attr_name in dir(obj):
-            if (
-                not attr_name.startswith('_')
-                and "html" not in attr_name
-                and "data" not in attr_name
-            ):  # skip private and protected attributes
-                attr_value = getattr(obj, attr_name)
-                if isinstance(attr_value, str):
-                    try:
-                        setattr(obj, attr_name, attr_value.replace("\n", "<br>"))
-                    except AttributeError:
-                        continue  # skip attributes that don't have a setter
-        return obj
+    def convert_newlines(i) -> TemplateRow:
+        """Convert newlines in the headword, sbs and ru columns."""
+        return TemplateRow(i, wrap=("sbs", "ru"))
 
 
 class RootsData():
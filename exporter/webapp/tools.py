@@ -4,8 +4,10 @@ from unidecode import unidecode
 
 from collections import defaultdict
 from sqlalchemy.orm import Session
-from sqlalchemy.orm import joinedload
 
+from exporter.webapp.data import SearchData
+from exporter.webapp.data import get_session_maker
+from exporter.webapp.data import load_search_data
 from exporter.webapp.modules import AbbreviationsData
 from exporter.webapp.modules import DeconstructorData
 from exporter.webapp.modules import EpdData
@@ -17,16 +19,10 @@ from exporter.webapp.modules import RootsData
 from exporter.webapp.modules import SpellingData
 from exporter.webapp.modules import VariantData
 
-from db.db_helpers import get_db_session
 from db.models import DpdHeadword
-from db.models import DpdRoot
-from db.models import FamilyRoot
 from db.models import Lookup
 
-from tools.exporter_functions import get_family_compounds
-from tools.exporter_functions import get_family_idioms
-from tools.exporter_functions import get_family_set
-from tools.pali_sort_key import pali_list_sorter, pali_sort_key
+from tools.pali_sort_key import pali_list_sorter
 from tools.paths import ProjectPaths
 
 
@@ -80,168 +76,136 @@ def make_ascii_to_unicode_dict(db_session: Session) -> dict[str, list[str]]:
 
 
 def make_dpd_html(q: str, pth: ProjectPaths, templates, roots_count_dict, headwords_clean_set, ascii_to_unicode_dict, lang="en") -> tuple[str, str]:
-    db_session = get_db_session(pth.dpd_db_path)
-    dpd_html = ""
-    summary_html = ""
+    dpd_html: list[str] = []
+    summary_html: list[str] = []
     q = q.replace("'", "").replace("ṁ", "ṃ").strip()
 
     if lang == "ru":
         q = q.casefold()
 
-    lookup_results = db_session.query(Lookup) \
-        .filter(Lookup.lookup_key.ilike(q)) \
-        .all()
-    
-    # first try the lookup table, if no results, then try other options
-    
-    if lookup_results:
-        for lookup_result in lookup_results:
-        
-            # headwords
-            if lookup_result.headwords:
-                headwords = lookup_result.headwords_unpack
-                headword_results = db_session\
-                    .query(DpdHeadword)\
-                    .filter(DpdHeadword.id.in_(headwords))\
-                    .options(joinedload(DpdHeadword.ru))\
-                    .all()
-                headword_results = sorted(
-                    headword_results, key=lambda x: pali_sort_key(x.lemma_1))
-                for i in headword_results:
-                    fc = get_family_compounds(i)
-                    fi = get_family_idioms(i)
-                    fs = get_family_set(i)
-                    d = HeadwordData(i, fc, fi, fs)
-                    summary_html += templates \
-                        .get_template("dpd_summary.html") \
-                        .render(d=d)
-                    dpd_html += templates \
-                        .get_template("dpd_headword.html") \
-                        .render(d=d)
-            
-            # roots
-            if lookup_result.roots:
-                roots_list = lookup_result.roots_unpack
-                root_results = db_session \
-                    .query(DpdRoot) \
-                    .filter(DpdRoot.root.in_(roots_list))\
-                    .all()
-                for r in root_results:
-                    frs = db_session \
-                        .query(FamilyRoot) \
-                        .filter(FamilyRoot.root_key == r.root)
-                    frs = sorted(frs, key=lambda x: pali_sort_key(x.root_family))
-                    d = RootsData(r, frs, roots_count_dict)
-                    summary_html += templates \
-                        .get_template("root_summary.html") \
-                        .render(d=d)
-                    dpd_html += templates \
-                        .get_template("root.html") \
-                        .render(d=d)
-
-            # deconstructor
-            if lookup_result.deconstructor:
-                d = DeconstructorData(lookup_result)
-                dpd_html += templates \
-                    .get_template("deconstructor.html") \
-                    .render(d=d)
-
-            # variant
-            if lookup_result.variant:
-                d = VariantData(lookup_result)
-                dpd_html += templates \
-                    .get_template("variant.html") \
-                    .render(d=d)
-
-            # spelling mistake
-            if lookup_result.spelling:
-                d = SpellingData(lookup_result)
-                dpd_html += templates \
-                    .get_template("spelling.html") \
-                    .render(d=d)
-
-            if lookup_result.grammar:
-                d = GrammarData(lookup_result)
-                dpd_html += templates \
-                    .get_template("grammar.html") \
-                    .render(d=d)
-
-            # help          
-            if lookup_result.help:
-                d = HelpData(lookup_result)
-                dpd_html += templates \
-                    .get_template("help.html") \
-                    .render(d=d)
-
-            # abbreviations
-            if lookup_result.abbrev:
-                d = AbbreviationsData(lookup_result)
-                dpd_html += templates \
-                    .get_template("abbreviations.html") \
-                    .render(d=d)
-
-            # epd 
-            if lookup_result.epd:
-                d = EpdData(lookup_result)
-                dpd_html += templates \
-                    .get_template("epd.html") \
-                    .render(d=d)
-
-            # rpd 
-            if lang == "ru" and lookup_result.rpd:
-                d = RpdData(lookup_result)
-                dpd_html += templates \
-                    .get_template("rpd.html") \
-                    .render(d=d)
-
-    # the two cases below search directly in the DpdHeadwords table
-
-    elif q.isnumeric(): # eg 78654
-        search_term = int(q)
-        headword_result = db_session\
-            .query(DpdHeadword)\
-            .filter(DpdHeadword.id == search_term)\
-            .options(joinedload(DpdHeadword.ru))\
-            .first()
-        if headword_result:
-            fc = get_family_compounds(headword_result)
-            fi = get_family_idioms(headword_result)
-            fs = get_family_set(headword_result)
-            d = HeadwordData(headword_result, fc, fi, fs)
-            dpd_html += templates \
-                .get_template("dpd_headword.html") \
-                .render(d=d)
-
-        # return closest matches
-        else:
-            dpd_html = find_closest_matches(q, headwords_clean_set, ascii_to_unicode_dict, lang)
-
-    elif re.search(r"\s\d", q): # eg "kata 5"
-        headword_result = db_session \
-            .query(DpdHeadword) \
-            .filter(DpdHeadword.lemma_1 == q) \
-            .options(joinedload(DpdHeadword.ru))\
-            .first()
-        if headword_result:
-            fc = get_family_compounds(headword_result)
-            fi = get_family_idioms(headword_result)
-            fs = get_family_set(headword_result)
-            d = HeadwordData(headword_result, fc, fi, fs)
-            dpd_html += templates \
-                .get_template("dpd_headword.html") \
-                .render(d=d)
-
-        # return closest matches
-        else:
-            dpd_html = find_closest_matches(q, headwords_clean_set, ascii_to_unicode_dict, lang)
+    dpd_headword_template = templates.get_template("dpd_headword.html")
+    dpd_summary_template = templates.get_template("dpd_summary.html")
+
+    def render_headword(data: SearchData, i: DpdHeadword, summary=True):
+        fc = data.get_family_compounds(i)
+        fi = data.get_family_idioms(i)
+        fs = data.get_family_set(i)
+        d = HeadwordData(i, fc, fi, fs)
+        if summary:
+            summary_html.append(dpd_summary_template.render(d=d))
+        dpd_html.append(dpd_headword_template.render(d=d))
+
+    # everything for the search is loaded in a fixed number of queries
+    with get_session_maker(pth.dpd_db_path)() as db_session:
+
+        # first try the lookup table, if no results, then try other options
+
+        data = load_search_data(db_session, q)
+        if data.lookups:
+            for lookup_result in data.lookups:
+
+                # headwords
+                if lookup_result.headwords:
+                    headwords = lookup_result.headwords_unpack
+                    for i in data.headwords_for(headwords):
+                        render_headword(data, i)
+
+                # roots
+                if lookup_result.roots:
+                    roots_list = lookup_result.roots_unpack
+                    for r in data.roots_for(roots_list):
+                        frs = data.family_roots.get(r.root, [])
+                        d = RootsData(r, frs, roots_count_dict)
+                        summary_html.append(templates \
+                            .get_template("root_summary.html") \
+                            .render(d=d))
+                        dpd_html.append(templates \
+                            .get_template("root.html") \
+                            .render(d=d))
+
+                # deconstructor
+                if lookup_result.deconstructor:
+                    d = DeconstructorData(lookup_result)
+                    dpd_html.append(templates \
+                        .get_template("deconstructor.html") \
+                        .render(d=d))
+
+                # variant
+                if lookup_result.variant:
+                    d = VariantData(lookup_result)
+                    dpd_html.append(templates \
+                        .get_template("variant.html") \
+                        .render(d=d))
+
+                # spelling mistake
+                if lookup_result.spelling:
+                    d = SpellingData(lookup_result)
+                    dpd_html.append(templates \
+                        .get_template("spelling.html") \
+                        .render(d=d))
+
+                if lookup_result.grammar:
+                    d = GrammarData(lookup_result)
+                    dpd_html.append(templates \
+                        .get_template("grammar.html") \
+                        .render(d=d))
+
+                # help
+                if lookup_result.help:
+                    d = HelpData(lookup_result)
+                    dpd_html.append(templates \
+                        .get_template("help.html") \
+                        .render(d=d))
+
+                # abbreviations
+                if lookup_result.abbrev:
+                    d = AbbreviationsData(lookup_result)
+                    dpd_html.append(templates \
+                        .get_template("abbreviations.html") \
+                        .render(d=d))
+
+                # epd
+                if lookup_result.epd:
+                    d = EpdData(lookup_result)
+                    dpd_html.append(templates \
+                        .get_template("epd.html") \
+                        .render(d=d))
+
+                # rpd
+                if lang == "ru" and lookup_result.rpd:
+                    d = RpdData(lookup_result)
+                    dpd_html.append(templates \
+                        .get_template("rpd.html") \
+                        .render(d=d))
+
+        # the two cases below search directly in the DpdHeadwords table
+
+        elif q.isnumeric(): # eg 78654
+            data = load_search_data(db_session, q, headword_id=int(q))
+            if data.headwords:
+                for i in data.headwords.values():
+                    render_headword(data, i, summary=False)
+
+            # return closest matches
+            else:
+                dpd_html.append(find_closest_matches(q, headwords_clean_set, ascii_to_unicode_dict, lang))
+
+        elif re.search(r"\s\d", q): # eg "kata 5"
+            data = load_search_data(db_session, q, lemma_1=q)
+            if data.headwords:
+                for i in data.headwords.values():
+                    render_headword(data, i, summary=False)
+
+            # return closest matches
+            else:
+                dpd_html.append(find_closest_matches(q, headwords_clean_set, ascii_to_unicode_dict, lang))
+
+        # or finally return closest matches
 
-    # or finally return closest matches
-    
-    else:
-        dpd_html = find_closest_matches(q, headwords_clean_set, ascii_to_unicode_dict, lang)
+        else:
+            dpd_html.append(find_closest_matches(q, headwords_clean_set, ascii_to_unicode_dict, lang))
 
-    db_session.close()
-    return dpd_html, summary_html
+    return "".join(dpd_html), "".join(summary_html)
 
     
 
@@ -18,6 +18,7 @@ from rich import print
 
 from db.models import DpdHeadword
 from gui.functions_db import make_all_inflections_set
+from gui.functions_value_lists import get_value_lists
 from gui.functions_db import values_to_pali_word
 from gui.functions_db import make_words_to_add_list_generic
 
@@ -952,11 +953,12 @@ def load_gui_state(pth):
     return values, words_to_add_list
 
 
-def test_construction(values, window, lemma_clean_list):
+def test_construction(values, window, db_session):
+    value_lists = get_value_lists(db_session)
     construction_list = values["construction"].split(" + ")
     error_string = ""
     for c in construction_list:
-        if c not in lemma_clean_list:
+        if not value_lists.lemma_clean_ids(c):
             error_string += f"{c} "
     window["construction_error"].update(error_string, text_color="red")
 
@@ -4,11 +4,11 @@ import re
 import csv
 
 from rich import print
-from sqlalchemy import or_
 from typing import Optional, Tuple
 
-from db.models import SBS, DpdHeadword, DpdRoot, InflectionTemplates, Russian
+from db.models import SBS, DpdHeadword, DpdRoot, Russian
 from gui.functions_daily_record import daily_record_update
+from gui.functions_value_lists import get_value_lists
 
 from tools.pali_sort_key import pali_sort_key
 from tools.paths import ProjectPaths
@@ -125,6 +125,7 @@ def update_word_in_db(
         try:
             db_session.add(word_to_add)
             db_session.commit()
+            get_value_lists(db_session).save_headword(db_session, word_id)
             window["messages"].update(
                 f"'{values['lemma_1']}' added to db",
                 text_color="white")
@@ -145,6 +146,7 @@ def update_word_in_db(
 
         try:
             db_session.commit()
+            get_value_lists(db_session).save_headword(db_session, word_id)
             window["messages"].update(
                 f"'{values['lemma_1']}' updated in db",
                 text_color="white")
@@ -211,25 +213,19 @@ def copy_word_from_db(db_session, values, window):
 
 
 def get_verb_values(db_session):
-    results = db_session.query(DpdHeadword.verb).group_by(DpdHeadword.verb).all()
-    verb_values = sorted([v[0] for v in results])
-    return verb_values
+    return get_value_lists(db_session).values("verb")
 
 # get_verb_values()
 
 
 def get_case_values(db_session):
-    results = db_session.query(DpdHeadword.plus_case).group_by(DpdHeadword.plus_case).all()
-    case_values = sorted([v[0] for v in results])
-    return case_values
+    return get_value_lists(db_session).values("plus_case")
 
 
 # get_case_values()
 
 def get_root_key_values(db_session):
-    results = db_session.query(DpdHeadword.root_key).group_by(DpdHeadword.root_key).all()
-    root_key_values = sorted([v[0] for v in results if v[0] is not None])
-    return root_key_values
+    return get_value_lists(db_session).values("root_key")
 
 
 # get_root_key_values()
@@ -269,59 +265,32 @@ def get_root_base_values(db_session, root_key):
 
 
 def get_family_word_values(db_session):
-    results = db_session.query(DpdHeadword.family_word) \
-        .group_by(DpdHeadword.family_word) \
-        .all()
-    family_word_values = sorted([v[0] for v in results if v[0] is not None])
-    return family_word_values
+    return get_value_lists(db_session).values("family_word")
 
 
 # print(get_family_word_values())
 
 
 def get_family_compound_values(db_session):
-    results = db_session.query(DpdHeadword).all()
-    family_compound_values = []
-    for i in results:
-        family_compound_values.extend(i.family_compound_list)
-
-    family_compound_values = sorted(
-        set(family_compound_values), key=pali_sort_key)
-    return family_compound_values
+    return get_value_lists(db_session).pali_values("family_compound")
 
 
 def get_family_idioms_values(db_session):
-    results = db_session.query(DpdHeadword).all()
-    family_idioms_values = []
-    for i in results:
-        i: DpdHeadword
-        family_idioms_values.extend(i.family_idioms_list)
-
-    family_idioms_values = sorted(
-        set(family_idioms_values), key=pali_sort_key)
-    return family_idioms_values
+    return get_value_lists(db_session).pali_values("family_idioms")
 
 
 # print(get_family_compound_values())
 
 
 def get_derivative_values(db_session):
-    results = db_session.query(DpdHeadword.derivative) \
-        .group_by(DpdHeadword.derivative) \
-        .all()
-    derivative_values = sorted([v[0] for v in results])
-    return derivative_values
+    return get_value_lists(db_session).values("derivative")
 
 
 # print(get_derivative_values())
 
 
 def get_compound_type_values(db_session):
-    results = db_session.query(DpdHeadword.compound_type) \
-        .group_by(DpdHeadword.compound_type) \
-        .all()
-    compound_type_values = sorted([v[0] for v in results])
-    return compound_type_values
+    return get_value_lists(db_session).values("compound_type")
 
 
 # print(get_compound_type_values())
@@ -336,34 +305,9 @@ def get_synonyms(
     # remove the number from lemma_1
     lemma_1_clean = re.sub(r" \d.*$", "", lemma_1)
 
-    # search for similar meanings
-    results = db_session.query(DpdHeadword) \
-        .filter(
-            DpdHeadword.pos == pos,
-            or_(*[DpdHeadword.meaning_1.like(f"%{meaning}%") for meaning in list_of_meanings])
-        ).all()
-
-    # make a dictioanary of all meanings
-    meaning_dict = {}
-    for i in results:
-        if i.meaning_1:  # check if it's not None and not an empty string
-            for meaning in i.meaning_1.split("; "):
-                meaning_clean = re.sub(r" \(.*?\)|\(.*?\) ", "", meaning)
-                if meaning_clean in list_of_meanings:
-                    if meaning_clean not in meaning_dict:
-                        meaning_dict[meaning_clean] = set([i.lemma_clean])
-                    else:
-                        meaning_dict[meaning_clean].add(i.lemma_clean)
-
-    # test if two meanings are the same
-    synonyms_set = set()
-    for key_1 in meaning_dict:
-        for key_2 in meaning_dict:
-            if key_1 != key_2:
-                intersection = meaning_dict[key_1].intersection(
-                    meaning_dict[key_2])
-                synonyms_set.update(intersection)
-    
+    # words of the same pos which share two or more meanings
+    synonyms_set = get_value_lists(db_session).synonyms(pos, list_of_meanings)
+
     # remove the word itself
     synonyms_set.discard(lemma_1_clean)
     
@@ -377,22 +321,38 @@ def get_synonyms(
 # print(get_synonyms_and_variants("fem", "talk; speech; statement"))
 
 
+def get_lemma_clean_headwords(
+        db_session, lemma_cleans: list[str]) -> dict[str, list[DpdHeadword]]:
+    """Headwords of each clean lemma in id order,
+    found in the clean lemma index and fetched by id in one query."""
+
+    value_lists = get_value_lists(db_session)
+    lemma_clean_ids = {
+        lemma_clean: value_lists.lemma_clean_ids(lemma_clean)
+        for lemma_clean in lemma_cleans}
+    all_ids = {id for ids in lemma_clean_ids.values() for id in ids}
+    results = db_session.query(DpdHeadword) \
+        .filter(DpdHeadword.id.in_(all_ids)) \
+        .all()
+    headwords = {i.id: i for i in results}
+    return {
+        lemma_clean: [headwords[id] for id in ids if id in headwords]
+        for lemma_clean, ids in lemma_clean_ids.items()}
+
+
 def get_sanskrit(db_session, construction: str) -> str:
     constr_splits = construction.split(" + ")
     sanskrit = ""
     already_added = []
+    constr_headwords = get_lemma_clean_headwords(db_session, constr_splits)
     for constr_split in constr_splits:
-        results = db_session.query(DpdHeadword)\
-            .filter(DpdHeadword.lemma_1.like(f"%{constr_split}%"))\
-            .all()
-        for i in results:
-            if i.lemma_clean == constr_split:
-                if i.sanskrit not in already_added:
-                    if constr_split != constr_splits[-1]:
-                        sanskrit += f"{i.sanskrit} + "
-                    else:
-                        sanskrit += f"{i.sanskrit} "
-                    already_added += [i.sanskrit]
+        for i in constr_headwords[constr_split]:
+            if i.sanskrit not in already_added:
+                if constr_split != constr_splits[-1]:
+                    sanskrit += f"{i.sanskrit} + "
+                else:
+                    sanskrit += f"{i.sanskrit} "
+                already_added += [i.sanskrit]
     
     sanskrit = re.sub(r"\[.*?\]", "", sanskrit) # remove square brackets
     sanskrit = re.sub("  ", " ", sanskrit)  # remove double spaces
@@ -405,22 +365,13 @@ def get_sanskrit(db_session, construction: str) -> str:
 # print(get_sanskrit("sāvaka + saṅgha + ika"))
 
 def get_patterns(db_session):
-    results = db_session.query(InflectionTemplates.pattern).all()
-    inflection_patterns = sorted([v[0] for v in results])
-    return inflection_patterns
+    return get_value_lists(db_session).patterns
 
 # print(get_patterns())
 
 
 def get_family_set_values(db_session):
-    results = db_session.query(DpdHeadword.family_set).all()
-
-    family_sets = []
-    for r in results:
-        if r.family_set is not None:
-            sets = r.family_set.split("; ")
-            family_sets += [set for set in sets]
-    return sorted(set(family_sets))
+    return get_value_lists(db_session).values("family_set")
 
 
 # print(get_family_set_values())
@@ -428,25 +379,22 @@ def get_family_set_values(db_session):
 
 def make_all_inflections_set(db_session):
 
-    inflections_db = db_session.query(DpdHeadword).all()
-
-    all_inflections_set = set()
-    for i in inflections_db:
-        all_inflections_set.update(i.inflections_list)
+    all_inflections_set = get_value_lists(db_session).all_inflections_set
 
     print(f"all_inflections_set: {len(all_inflections_set)}")
     return all_inflections_set
 
 
 def get_lemma_clean_list(db_session):
-    results = db_session.query(DpdHeadword).all()
-    return [i.lemma_clean for i in results]
+    return get_value_lists(db_session).lemma_clean_list
 
 
 def delete_word(pth, db_session, values, window):
     try:
         word_id = values["id"]
         word_lemma = values["lemma_1"]
+        inflections = db_session.query(DpdHeadword.inflections) \
+            .filter(word_id == DpdHeadword.id).scalar()
 
         db_session.query(DpdHeadword).filter(word_id == DpdHeadword.id).delete()
         db_session.commit()
@@ -484,6 +432,8 @@ def delete_word(pth, db_session, values, window):
             print("[red]no SBS word found")
 
         db_session.commit()
+        get_value_lists(db_session).delete_headword(
+            db_session, word_id, inflections)
         daily_record_update(window, pth, "delete", word_id)
         return True
     except Exception as e:
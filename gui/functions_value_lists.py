@@ -0,0 +1,280 @@
+"""Value lists of the GUI's combo boxes, completers and tests,
+an index of meanings to find synonyms,
+and an index of clean lemmas to find the parts of constructions.
+
+All the lists are made from one columnar select of the headwords, and
+saved with a stamp of the db: the count and max id of the headwords and the
+time the db file was last written. So the saved lists are only used if
+nothing else has written to the db since.
+
+Words saved or deleted in the GUI update the lists in place and take a new
+stamp, and the lists are saved again when the GUI closes.
+"""
+
+import atexit
+import pickle
+import re
+
+from collections import Counter
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from rich import print
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from db.models import DpdHeadword, InflectionTemplates
+from tools.pali_sort_key import pali_sort_key
+from tools.paths import ProjectPaths
+
+
+class ValueRow(NamedTuple):
+    """The columns of one headword which the lists are made from."""
+
+    lemma_1: str
+    pos: str
+    meaning_1: str
+    verb: str
+    plus_case: str
+    root_key: Optional[str]
+    family_word: Optional[str]
+    family_compound: str
+    family_idioms: str
+    family_set: Optional[str]
+    derivative: str
+    compound_type: str
+
+
+value_columns = [getattr(DpdHeadword, field) for field in ValueRow._fields]
+
+
+def lemma_clean(lemma_1: str) -> str:
+    return re.sub(r" \d.*$", "", lemma_1)
+
+
+def row_values(row: ValueRow) -> dict[str, list[str]]:
+    """{list name: values} of one headword."""
+
+    return {
+        "verb": [row.verb],
+        "plus_case": [row.plus_case],
+        "root_key": [row.root_key] if row.root_key is not None else [],
+        "family_word": [row.family_word] if row.family_word is not None else [],
+        "family_set": row.family_set.split("; ") if row.family_set is not None else [],
+        "family_compound": (
+            row.family_compound.split(" ") if row.family_compound
+            else [lemma_clean(row.lemma_1)]),
+        "family_idioms": (
+            row.family_idioms.split(" ") if row.family_idioms
+            else [lemma_clean(row.lemma_1)]),
+        "derivative": [row.derivative],
+        "compound_type": [row.compound_type],
+    }
+
+
+def meaning_clean_list(meaning_1: str) -> list[str]:
+    """Meanings of one headword without brackets."""
+
+    if meaning_1:
+        return [
+            re.sub(r" \(.*?\)|\(.*?\) ", "", meaning)
+            for meaning in meaning_1.split("; ")]
+    else:
+        return []
+
+
+def inflections_list(inflections: Optional[str]) -> list[str]:
+    if inflections:
+        return inflections.split(",")
+    else:
+        return []
+
+
+def make_db_stamp(db_session: Session, db_path: Path) -> tuple:
+    """A cheap stamp of the db, which changes whenever it is written."""
+
+    count, max_id = db_session.execute(
+        select(func.count(DpdHeadword.id), func.max(DpdHeadword.id))).one()
+    return (count, max_id, db_path.stat().st_mtime_ns)
+
+
+saved_lists = [
+    "rows", "counters", "meanings", "lemma_cleans", "inflections", "patterns"]
+
+
+class ValueLists():
+    """Counts of every value in every list, kept up to date by headword."""
+
+    def __init__(self, pth: ProjectPaths) -> None:
+        self.pth = pth
+        self.stamp: tuple = ()
+        self.rows: dict[int, ValueRow] = {}
+        self.counters: dict[str, Counter[str]] = {}
+        self.meanings: dict[str, Counter[tuple[str, str]]] = {}
+        self.lemma_cleans: dict[str, set[int]] = {}
+        self.inflections: Counter[str] = Counter()
+        self.patterns: list[str] = []
+        self.changed = False
+
+    def build(self, db_session: Session) -> None:
+        """Make all the lists in one pass over the headwords."""
+
+        self.rows = {}
+        self.counters = {}
+        self.meanings = {}
+        self.lemma_cleans = {}
+        self.inflections = Counter()
+        for id, *values, inflections in db_session.execute(
+            select(DpdHeadword.id, *value_columns, DpdHeadword.inflections)
+            .order_by(DpdHeadword.id)
+        ):
+            self._add_row(id, ValueRow(*values))
+            self.inflections.update(inflections_list(inflections))
+
+        self.patterns = sorted(db_session.scalars(select(InflectionTemplates.pattern)))
+        self.stamp = make_db_stamp(db_session, self.pth.dpd_db_path)
+        self.changed = True
+
+    def _add_row(self, id: int, row: ValueRow) -> None:
+        self.rows[id] = row
+        self.lemma_cleans.setdefault(lemma_clean(row.lemma_1), set()).add(id)
+        for name, values in row_values(row).items():
+            self.counters.setdefault(name, Counter()).update(values)
+        for meaning in meaning_clean_list(row.meaning_1):
+            self.meanings.setdefault(meaning, Counter())[
+                (row.pos, lemma_clean(row.lemma_1))] += 1
+
+    def _remove_row(self, id: int) -> None:
+        row = self.rows.pop(id, None)
+        if row is not None:
+            ids = self.lemma_cleans[lemma_clean(row.lemma_1)]
+            ids.discard(id)
+            if not ids:
+                del self.lemma_cleans[lemma_clean(row.lemma_1)]
+            for name, values in row_values(row).items():
+                self.counters[name].subtract(values)
+                for value in values:
+                    if self.counters[name][value] <= 0:
+                        del self.counters[name][value]
+            for meaning in meaning_clean_list(row.meaning_1):
+                pos_lemmas = self.meanings[meaning]
+                pos_lemma = (row.pos, lemma_clean(row.lemma_1))
+                pos_lemmas[pos_lemma] -= 1
+                if pos_lemmas[pos_lemma] <= 0:
+                    del pos_lemmas[pos_lemma]
+                if not pos_lemmas:
+                    del self.meanings[meaning]
+
+    def save_headword(self, db_session: Session, word_id: int | str) -> None:
+        """Update the lists with a headword which has been added or edited."""
+
+        word_id = int(word_id)
+        result = db_session.execute(
+            select(*value_columns, DpdHeadword.inflections)
+            .where(DpdHeadword.id == word_id)
+        ).one_or_none()
+        if result is None:
+            return
+
+        *values, inflections = result
+        if word_id not in self.rows:
+            # the gui doesn't edit inflections, so only a new word can add any
+            self.inflections.update(inflections_list(inflections))
+        self._remove_row(word_id)
+        self._add_row(word_id, ValueRow(*values))
+        self.update_stamp(db_session)
+
+    def delete_headword(
+        self,
+        db_session: Session,
+        word_id: int | str,
+        inflections: Optional[str]
+    ) -> None:
+        """Update the lists with a headword which has been deleted,
+        and its inflections from before it was deleted."""
+
+        self._remove_row(int(word_id))
+        for inflection in inflections_list(inflections):
+            self.inflections[inflection] -= 1
+            if self.inflections[inflection] <= 0:
+                del self.inflections[inflection]
+        self.update_stamp(db_session)
+
+    def update_stamp(self, db_session: Session) -> None:
+        """Stamp the lists after the GUI has committed a change,
+        unless the headwords have been added to or deleted elsewhere."""
+
+        stamp = make_db_stamp(db_session, self.pth.dpd_db_path)
+        if stamp[:2] == (len(self.rows), max(self.rows, default=None)):
+            self.stamp = stamp
+        else:
+            self.stamp = ()
+        self.changed = True
+
+    def values(self, name: str) -> list[str]:
+        return sorted(self.counters.get(name, {}))
+
+    def pali_values(self, name: str) -> list[str]:
+        return sorted(self.counters.get(name, {}), key=pali_sort_key)
+
+    def synonyms(self, pos: str, list_of_meanings: list[str]) -> set[str]:
+        """Clean lemmas of the same pos which share at least two meanings."""
+
+        meanings_count: Counter[str] = Counter()
+        for meaning in set(list_of_meanings):
+            meanings_count.update({
+                lemma for lemma_pos, lemma in self.meanings.get(meaning, {})
+                if lemma_pos == pos})
+        return {lemma for lemma, count in meanings_count.items() if count > 1}
+
+    def lemma_clean_ids(self, lemma_clean: str) -> list[int]:
+        return sorted(self.lemma_cleans.get(lemma_clean, []))
+
+    @property
+    def lemma_clean_list(self) -> list[str]:
+        return [lemma_clean(self.rows[id].lemma_1) for id in sorted(self.rows)]
+
+    @property
+    def all_inflections_set(self) -> set[str]:
+        return set(self.inflections)
+
+    def save(self) -> None:
+        if self.changed and self.stamp:
+            with open(self.pth.value_lists_path, "wb") as f:
+                pickle.dump(
+                    (self.stamp,
+                        {name: getattr(self, name) for name in saved_lists}), f)
+            self.changed = False
+
+    def load(self, db_session: Session) -> bool:
+        """Load the saved lists if the db has not changed since."""
+
+        if not self.pth.value_lists_path.exists():
+            return False
+        with open(self.pth.value_lists_path, "rb") as f:
+            stamp, lists = pickle.load(f)
+        if (
+            stamp != make_db_stamp(db_session, self.pth.dpd_db_path)
+            or list(lists) != saved_lists
+        ):
+            return False
+        self.stamp = stamp
+        for name, value in lists.items():
+            setattr(self, name, value)
+        return True
+
+
+_value_lists: Optional[ValueLists] = None
+
+
+def get_value_lists(db_session: Session) -> ValueLists:
+    """The value lists of this session, loaded or made once."""
+
+    global _value_lists
+    if _value_lists is None:
+        _value_lists = ValueLists(ProjectPaths())
+        if not _value_lists.load(db_session):
+            print("[green]making gui value lists")
+            _value_lists.build(db_session)
+        atexit.register(_value_lists.save)
+    return _value_lists
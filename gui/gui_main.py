@@ -23,7 +23,6 @@ from gui.functions_db import get_synonyms
 from gui.functions_db import get_sanskrit
 from gui.functions_db import copy_word_from_db
 from gui.functions_db import edit_word_in_db
-from gui.functions_db import get_lemma_clean_list
 from gui.functions_db import delete_word
 from gui.functions_db import get_root_info
 from gui.functions_db import fetch_id_or_lemma_1
@@ -179,7 +178,6 @@ def main():
     with open(pth.hyphenations_dict_path) as f:
         hyphenations_dict = json.load(f)
 
-    lemma_clean_list: list = get_lemma_clean_list(db_session)
     window = window_layout(dpspth, db_session, username)
     daily_record_update(window, pth, "refresh", 0)
 
@@ -638,7 +636,7 @@ def main():
 
             # test construciton for missing headwords
             if not values["root_key"]:
-                test_construction(values, window, lemma_clean_list)
+                test_construction(values, window, db_session)
 
         # auto-add construction_line2
         if event == "construction_enter":
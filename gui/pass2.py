@@ -6,7 +6,7 @@ import re
 import PySimpleGUI as sg # type: ignore
 
 from rich import print
-from typing import List, Optional
+from typing import Iterable, List
 from sqlalchemy.orm import Session
 
 from db.db_helpers import get_db_session
@@ -64,6 +64,7 @@ class Pass2Data():
             ]
         self.exceptions: List[int] = [
             6664, 18055, 18054, 19159, 19162]   # irrelevant words which appear freqently
+        self.lookup_cache: dict[str, tuple[list[int], list[str]]] = {}
         self.continue_flag: str = ""
         self.pass2_window: sg.Window
         self.pass2_layout: list
@@ -404,19 +405,55 @@ def pass2_gui(p2d: Pass2Data) -> tuple[Pass2Data, WordData]:
     return p2d, wd
 
 
+def get_lookups(
+        p2d: Pass2Data,
+        lookup_keys: Iterable[str]
+    ) -> dict[str, tuple[list[int], list[str]]]:
+
+    """Get the unpacked headwords and deconstructions of lookup keys.
+    Keys which are not in the cache yet are fetched in one query."""
+
+    lookup_keys = set(lookup_keys)
+    keys_to_fetch = lookup_keys - p2d.lookup_cache.keys()
+    if keys_to_fetch:
+        results = p2d.db_session \
+            .query(Lookup.lookup_key, Lookup.headwords, Lookup.deconstructor) \
+            .filter(Lookup.lookup_key.in_(keys_to_fetch)) \
+            .all()
+        for lookup_key, headwords, deconstructor in results:
+            p2d.lookup_cache[lookup_key] = (
+                json.loads(headwords) if headwords else [],
+                json.loads(deconstructor) if deconstructor else [])
+        for lookup_key in keys_to_fetch - p2d.lookup_cache.keys():
+            p2d.lookup_cache[lookup_key] = ([], [])
+    return {key: p2d.lookup_cache[key] for key in lookup_keys}
+
+
+def get_dpd_headwords(
+        p2d: Pass2Data,
+        id_list: List[int]
+    ) -> dict[int, DpdHeadword]:
+
+    """Get the headwords of a list of ids in one query."""
+
+    if not id_list:
+        return {}
+    results = p2d.db_session \
+        .query(DpdHeadword) \
+        .filter(DpdHeadword.id.in_(id_list)) \
+        .all()
+    return {i.id: i for i in results}
+
+
 def get_headwords(        
         p2d:Pass2Data,
         word_to_find: str
     ) -> List[int] | None:
     
     """Get the headwords of an inflected word."""
-    results: Optional[Lookup]
-    results = p2d.db_session \
-        .query(Lookup) \
-        .filter_by(lookup_key=word_to_find) \
-        .first()
-    if results and results.headwords:
-        return results.headwords_unpack
+    headwords, __deconstructions__ = get_lookups(p2d, [word_to_find])[word_to_find]
+    if headwords:
+        return headwords
     else:
         return None
 
@@ -428,25 +465,15 @@ def get_deconstruction_headwords(
 
     """Lookup in deconstructions and return a list of headword ids."""
 
-    results = p2d.db_session \
-        .query(Lookup) \
-        .filter_by(lookup_key=word_to_find) \
-        .first()
-    if results and results.deconstructor:
-        deconstructions = results.deconstructor_unpack
-        
+    __headwords__, deconstructions = get_lookups(p2d, [word_to_find])[word_to_find]
+    if deconstructions:
         inflections = set()
         for d in deconstructions:
             inflections.update(d.split(" + "))
         
         headword_id_list: set[int] = set()
-        for inflection in inflections:
-            results = p2d.db_session \
-                .query(Lookup) \
-                .filter_by(lookup_key=inflection) \
-                .first()
-            if results:
-                headword_id_list.update(results.headwords_unpack)
+        for headwords, __deconstructions__ in get_lookups(p2d, inflections).values():
+            headword_id_list.update(headwords)
         return sorted(headword_id_list)
     else:
         return None
@@ -459,6 +486,7 @@ def check_example_headword(
     ) -> None:
 
     if id_list:
+        dpd_headwords = get_dpd_headwords(p2d, id_list)
         for id in id_list:
             if p2d.continue_flag == "new":
                 return
@@ -472,10 +500,7 @@ def check_example_headword(
                 break 
 
             wd.update_id(id)
-            dpd_headword = p2d.db_session \
-                .query(DpdHeadword) \
-                .filter_by(id=wd.id) \
-                .first()
+            dpd_headword = dpd_headwords.get(id)
             
             if dpd_headword:
                 wd.update_headword(dpd_headword.lemma_1)
@@ -646,6 +671,8 @@ def test_words_in_construction(
         construction_clean = re.sub(
             r" >.+?\+ ", " + ", dpd_headword.construction)
         construction_parts = construction_clean.split(" + ")
+        # fetch all the parts in one query
+        get_lookups(p2d, construction_parts)
         for word in construction_parts:
             headwords_list = get_headwords(p2d, word)
             if headwords_list:
@@ -685,10 +712,8 @@ def update_main_window(p2d: Pass2Data, wd: WordData):
         p2d.main_window["example_1"].update(value=wd.example)
 
     elif p2d.continue_flag == "yes":
-        headword = p2d.db_session \
-            .query(DpdHeadword) \
-            .filter(DpdHeadword.id == wd.id) \
-            .first()
+        # already in the session from check_example_headword
+        headword = p2d.db_session.get(DpdHeadword, int(wd.id))
         if headword:
             attrs = headword.__dict__
             for key in attrs.keys():
@@ -1,4 +1,5 @@
 # update db and generate DPD in all formats
+# see scripts/build/run_build.py for the steps, their inputs and outputs
 
 set -e
 
@@ -7,18 +8,4 @@ if [ ! -e "dpd.db" ]; then
     exit 1
 fi
 
-scripts/build/config_uposatha_day.py
-scripts/bash/generate_components.sh
-
-exporter/grammar_dict/grammar_dict.py
-exporter/goldendict/main.py
-exporter/deconstructor/deconstructor_exporter.py
-
-exporter/tpr/tpr_exporter.py
-exporter/kindle/kindle_exporter.py
-exporter/tbw/tbw_exporter.py
-exporter/pdf/pdf_exporter.py
-
-scripts/build/zip_goldendict_mdict.py
-scripts/build/tarball_db.py
-scripts/build/summary.py
+scripts/build/run_build.py all "$@"
@@ -2,15 +2,21 @@
 
 """Update Anki with latest data directly from the DB."""
 
-import copy
+import hashlib
+import unicodedata
 
-from anki.collection import Collection
+from collections import Counter
+from typing import List, Dict, Iterable, NamedTuple
+
+from anki.collection import AddNoteRequest, Collection
+from anki.config import Config
 from anki.errors import DBError
 from anki.notes import Note
 from anki.cards import Card
+from anki.utils import ids2str
 
 from rich import print
-from typing import List, Dict
+from sqlalchemy.orm import joinedload
 
 from db.db_helpers import get_db_session
 from db.models import DpdHeadword
@@ -29,21 +35,18 @@ def main():
     print(f"[green]{'setup dbs':<20}", end="")
     pth = ProjectPaths()
     db_session = get_db_session(pth.dpd_db_path)
-    db = db_session.query(DpdHeadword).all()
+    db = db_session \
+        .query(DpdHeadword) \
+        .options(joinedload(DpdHeadword.rt)) \
+        .all()
     print(f"{'ok':>10}{bop():>10}")
 
     decks = ["Vocab", "Commentary", "Pass1"]
-    (
-        col,
-        data_dict,
-        deck_dict,
-        model_dict,
-        carry_on
-    ) = setup_anki_updater(decks)
-
-    if carry_on:
-        update_from_db(
-            db, col, data_dict, deck_dict, model_dict)
+    col = get_anki_collection()
+    if col:
+        backup_anki_db(col)
+        update_from_db(db, col, decks)
+        col.close()
     
     toc()
 
@@ -65,25 +68,11 @@ def setup_anki_updater(decks):
 
 def family_updater(anki_data_list, deck):
     print(f"[white]updating {deck[0].lower()}")
-    (
-        col,
-        data_dict,
-        deck_dict,
-        model_dict,
-        carry_on
-    ) = setup_anki_updater(deck)
-
-    if carry_on:
-        update_family(
-            col,
-            deck,
-            data_dict,
-            deck_dict,
-            model_dict,
-            anki_data_list)
-
-        if col:
-            col.close()
+    col = get_anki_collection()
+    if col:
+        backup_anki_db(col)
+        update_family(col, deck, anki_data_list)
+        col.close()
     else:
         return
 
@@ -233,101 +222,269 @@ def make_data_dict(
     return data_dict
 
 
-def update_from_db(db, col, data_dict, deck_dict, model_dict) -> None:    
+# an index of existing notes, read in one query
+
+class IndexedNote(NamedTuple):
+    """An existing note and its card, as stored in the collection."""
+    nid: int
+    mid: int
+    fields: list[str]
+    fields_hash: bytes
+    cid: int
+    did: int
+
+
+def hash_fields(fields: Iterable[str]) -> bytes:
+    """Hash of all the fields of a note, as stored by anki."""
+    return hashlib.blake2b(
+        "\x1f".join(fields).encode("utf-8"), digest_size=16).digest()
+
+
+def index_notes(col: Collection, decks: List[str]) -> Dict[str, IndexedNote]:
+    """Index the notes of a list of decks by their first field,
+    i.e. the dpd id or family key, straight from the collection db."""
+
+    bip()
+    print(f"[green]{'index notes':<20}", end="")
+
+    card_ids = col.find_cards(make_search_query(decks))
+    index: Dict[str, IndexedNote] = {}
+    duplicates = 0
+    rows = col.db.all(
+        f"select notes.id, notes.mid, notes.flds, cards.id, cards.did "
+        f"from cards join notes on notes.id = cards.nid "
+        f"where cards.id in {ids2str(card_ids)} "
+        f"order by cards.id")
+
+    for nid, mid, flds, cid, did in rows:
+        fields = flds.split("\x1f")
+        key = fields[0]
+        if key in index:
+            if index[key].nid != nid:
+                duplicates += 1
+                print(f"[red]key {key} already exists")
+            continue
+        index[key] = IndexedNote(nid, mid, fields, hash_fields(fields), cid, did)
+
+    print(f"{len(index):>10}{bop():>10}")
+    if duplicates:
+        print(f"[red]{'duplicates':<20}{duplicates:>10}")
+    return index
+
+
+class FieldNames():
+    """Field names of each model, looked up once."""
+
+    def __init__(self, col: Collection) -> None:
+        self.col = col
+        self.names: Dict[int, List[str]] = {}
+
+    def __getitem__(self, mid: int) -> List[str]:
+        if mid not in self.names:
+            model = self.col.models.get(mid)  # type: ignore
+            self.names[mid] = [field["name"] for field in model["flds"]]  # type: ignore
+        return self.names[mid]
+
+
+class SyncResult():
+    """Everything which needs to change in the collection."""
+
+    def __init__(self) -> None:
+        self.added: list[tuple[str, str, dict[str, str]]] = []
+        self.updated: dict[int, list[str]] = {}
+        self.updated_keys: list[str] = []
+        self.changed_deck: list[tuple[str, IndexedNote, str]] = []
+        self.deleted: list[int] = []
+        self.changed_fields: Counter = Counter()
+        self.unchanged = 0
+
+
+def diff_notes(
+    index: Dict[str, IndexedNote],
+    rendered: Dict[str, tuple[str, dict[str, str]]],
+    field_names: FieldNames,
+    deck_dict: Dict,
+    check_deck: bool = True,
+    normalize: bool = True
+) -> SyncResult:
+    """Compare each rendered note {key: (deck, {field: value})}
+    with the existing note by hash, and note the fields which changed.
+    Fields which are not rendered keep their existing values.
+    Anki saves text as NFC if normalize is on, so compare the same."""
+
+    result = SyncResult()
+    for key, (deck, fields) in rendered.items():
+        if normalize:
+            fields = {
+                name: unicodedata.normalize("NFC", value)
+                for name, value in fields.items()}
+        existing = index.get(key)
+        if existing is None:
+            result.added.append((key, deck, fields))
+            continue
+
+        names = field_names[existing.mid]
+        new_fields = [
+            fields.get(name, old_value)
+            for name, old_value in zip(names, existing.fields)]
+
+        if hash_fields(new_fields) != existing.fields_hash:
+            result.updated[existing.nid] = new_fields
+            result.updated_keys.append(key)
+            for name, old_value, new_value in zip(names, existing.fields, new_fields):
+                if old_value != new_value:
+                    result.changed_fields[name] += 1
+        else:
+            result.unchanged += 1
+
+        if check_deck and deck_dict[existing.did] != deck:
+            result.changed_deck.append((key, existing, deck))
+
+    return result
+
+
+def apply_sync(
+    col: Collection,
+    result: SyncResult,
+    deck_dict: Dict,
+    model_dict: Dict,
+    field_names: FieldNames,
+    batch_size: int = 1000
+) -> None:
+    """Write the changes to the collection in batches."""
+
+    # notes whose fields or deck changed
+    new_mids = {
+        existing.nid: model_dict[deck]
+        for __key__, existing, deck in result.changed_deck}
+    nids = list(dict.fromkeys(list(result.updated) + list(new_mids)))
+    for start in range(0, len(nids), batch_size):
+        notes: list[Note] = []
+        for nid in nids[start:start + batch_size]:
+            note = col.get_note(nid)  # type: ignore
+            if nid in result.updated:
+                note.fields = result.updated[nid]
+            if nid in new_mids:
+                note.mid = new_mids[nid]
+            notes.append(note)
+        col.update_notes(notes)
+
+    # cards which changed deck
+    for start in range(0, len(result.changed_deck), batch_size):
+        cards: list[Card] = []
+        for __key__, existing, deck in result.changed_deck[start:start + batch_size]:
+            card = col.get_card(existing.cid)  # type: ignore
+            card.did = deck_dict[deck]
+            card.queue = 0  # type: ignore
+            card.lapse = 0
+            card.due = 0
+            cards.append(card)
+        col.update_cards(cards)
+
+    # new notes
+    for start in range(0, len(result.added), batch_size):
+        requests: list[AddNoteRequest] = []
+        for __key__, deck, fields in result.added[start:start + batch_size]:
+            note = col.new_note(model_dict[deck])
+            for name in field_names[note.mid]:
+                if name in fields:
+                    note[name] = fields[name]
+            requests.append(AddNoteRequest(note, deck_dict[deck]))
+        col.add_notes(requests)
+
+    # deleted notes
+    if result.deleted:
+        col.remove_notes(result.deleted)  # type: ignore
+
+
+def p_sync_result(result: SyncResult, check_deck: bool = True) -> None:
+    print(f"[green]{'added':<20}{len(result.added):>10}")
+    print(f"[green]{'updated':<20}{len(result.updated):>10}")
+    if check_deck:
+        print(f"[green]{'changed deck':<20}{len(result.changed_deck):>10}")
+    print(f"[green]{'deleted':<20}{len(result.deleted):>10}")
+    print(f"[green]{'unchanged':<20}{result.unchanged:>10}")
+    for name, count in result.changed_fields.most_common():
+        print(f"[white]{name:<20}{count:>10}")
+
+
+def update_from_db(db, col, decks) -> None:    
     # update from db
     bip()
     print(f"[green]{'updating':<20}")
-    
-    added_list = []
-    updated_list = []
-    deleted_list = []
-    changed_deck_list = []
-    
-    for counter, i in enumerate(db):
+
+    index = index_notes(col, decks)
+    deck_dict = get_decks(col)
+    model_dict = get_models(col)
+    field_names = FieldNames(col)
+
+    bip()
+    print(f"[green]{'render notes':<20}", end="")
+    rendered: Dict[str, tuple[str, dict[str, str]]] = {}
+    not_in_deck_list = []
+    for i in db:
         id = str(i.id)
         deck = deck_selector(i)
         if deck:
-            # update
-            if id in data_dict:
-                note = data_dict[id]["note"]
-                note, is_updated = update_note_values(col, note, i)
-                if is_updated:
-                    updated_list += [i.id]
-                    col.update_note(note)
-                if update_deck(col, note, i, data_dict[id], deck_dict, model_dict):
-                    changed_deck_list += [i.id]
-                
-            # add note
-            else:
-                added_list += [i.id]
-                make_new_note(col, deck, model_dict, deck_dict, i)
-            if counter % 5000 == 0:
-                print(f"{counter:>5} {i.lemma_1[:23]:<24}{bop():>10}")
-                bip()
+            rendered[id] = (deck, make_note_fields(i))
+        elif id in index:
+            not_in_deck_list += [i.id]
+    print(f"{len(rendered):>10}{bop():>10}")
 
-        else:
-            # delete
-            if i.id in data_dict:
-                print(data_dict[id])
-                deleted_list += [i.id]
-
-    print(f"[green]{'added':<20}{len(added_list):>10}")
-    print(f"[green]{'updated':<20}{len(updated_list):>10}")
-    print(f"[green]{'changed deck':<20}{len(changed_deck_list):>10}")
-    print(f"[green]{'deleted':<20}{len(deleted_list):>10}")
-
-    print(f"{added_list=}")
-    print(f"{updated_list=}")
-    print(f"{changed_deck_list=}")
-    print(f"{deleted_list=}")
-
-
-def update_family(
-        col,
-        deck,
-        data_dict,
-        deck_dict,
-        model_dict,
-        anki_data
-) -> None:    
+    bip()
+    print(f"[green]{'diff notes':<20}", end="")
+    result = diff_notes(
+        index, rendered, field_names, deck_dict,
+        normalize=col.get_config_bool(Config.Bool.NORMALIZE_NOTE_TEXT))
+    print(f"{len(result.updated):>10}{bop():>10}")
+
+    bip()
+    print(f"[green]{'apply changes':<20}", end="")
+    apply_sync(col, result, deck_dict, model_dict, field_names)
+    print(f"{'ok':>10}{bop():>10}")
+
+    p_sync_result(result)
+    # notes of words which no longer belong in a deck are left in anki
+    print(f"[green]{'not in a deck':<20}{len(not_in_deck_list):>10}")
+
+    print(f"added_list={[key for key, __deck__, __fields__ in result.added]}")
+    print(f"updated_list={result.updated_keys}")
+    print(f"changed_deck_list={[key for key, __existing__, __deck__ in result.changed_deck]}")
+    print(f"{not_in_deck_list=}")
+
+
+def update_family(col, deck, anki_data) -> None:    
 
     bip()
     print("[green]updating anki collection")
-    
-    added_list = []
-    updated_list = []
-    deleted_list = []
 
-    for i in anki_data:
-        key, html = i
-        if key in data_dict:
-            note = data_dict[key]["note"]
-            note, is_updated = update_family_note(note, i)
-            if is_updated:
-                updated_list += [key]
-                col.update_note(note)
-            
-            # add note
-        else:
-            added_list += [key]
-            make_new_family_note(col, deck, model_dict, deck_dict, i)
+    index = index_notes(col, deck)
+    deck_dict = get_decks(col)
+    model_dict = get_models(col)
+    field_names = FieldNames(col)
+
+    rendered: Dict[str, tuple[str, dict[str, str]]] = {
+        key: (deck[0], {"Front": key, "Back": html})
+        for key, html in anki_data}
+
+    result = diff_notes(
+        index, rendered, field_names, deck_dict, check_deck=False,
+        normalize=col.get_config_bool(Config.Bool.NORMALIZE_NOTE_TEXT))
+    deleted_keys = [key for key in index if key not in rendered]
+    result.deleted = [index[key].nid for key in deleted_keys]
+    apply_sync(col, result, deck_dict, model_dict, field_names)
 
-    for key, data in data_dict.items():
-        if data["note"]["Front"] not in [item[0] for item in anki_data]:
-            note = data["note"]
-            col.remove_notes([note.id])
-            deleted_list += [key]
+    p_sync_result(result, check_deck=False)
+    print(f"added_list={[key for key, __deck__, __fields__ in result.added]}")
+    print(f"updated_list={result.updated_keys}")
+    print(f"deleted_list={deleted_keys}")
 
-    print(f"[green]{'added':<20}{len(added_list):>10}")
-    print(f"[green]{'updated':<20}{len(updated_list):>10}")
-    print(f"[green]{'deleted':<20}{len(deleted_list):>10}")
-    print(f"{added_list=}")
-    print(f"{updated_list=}")
-    print(f"{deleted_list=}")
 
+def make_note_fields(i: DpdHeadword) -> dict[str, str]:
+    """The fields of a vocab note. Root fields are only set for words
+    with a root, otherwise the note keeps its existing values."""
 
-def update_note_values(col, note, i):
-    old_fields = copy.copy(note.fields)
+    fields: dict[str, str] = {}
     if i.meaning_1 and i.sutta_1:
         fin = "√√"
     elif i.meaning_1 and not i.sutta_1:
@@ -335,89 +492,62 @@ def update_note_values(col, note, i):
     else:
         fin = ""
     
-    note["id"] = str(i.id)
-    note["lemma_1"] = str(i.lemma_1)
-    note["lemma_2"] = str(i.lemma_2)
-    note["fin"] = fin
-    note["pos"] = str(i.pos)
-    note["grammar"] = str(i.grammar)
-    note["derived_from"] = str(i.derived_from)
-    note["neg"] = str(i.neg)
-    note["verb"] = str(i.verb)
-    note["trans"] = str(i.trans)
-    note["plus_case"] = str(i.plus_case)
-    note["meaning_1"] = str(i.meaning_1)
-    note["meaning_lit"] = str(i.meaning_lit)
-    note["non_ia"] = str(i.non_ia)
-    note["sanskrit"] = str(i.sanskrit)
-    note["root_key"] = str(i.root_clean)
-    note["root_sign"] = str(i.root_sign)
-    note["root_base"] = str(i.root_base)
+    fields["id"] = str(i.id)
+    fields["lemma_1"] = str(i.lemma_1)
+    fields["lemma_2"] = str(i.lemma_2)
+    fields["fin"] = fin
+    fields["pos"] = str(i.pos)
+    fields["grammar"] = str(i.grammar)
+    fields["derived_from"] = str(i.derived_from)
+    fields["neg"] = str(i.neg)
+    fields["verb"] = str(i.verb)
+    fields["trans"] = str(i.trans)
+    fields["plus_case"] = str(i.plus_case)
+    fields["meaning_1"] = str(i.meaning_1)
+    fields["meaning_lit"] = str(i.meaning_lit)
+    fields["non_ia"] = str(i.non_ia)
+    fields["sanskrit"] = str(i.sanskrit)
+    fields["root_key"] = str(i.root_clean)
+    fields["root_sign"] = str(i.root_sign)
+    fields["root_base"] = str(i.root_base)
     if i.root_key:
-        note["sanskrit_root"] = str(i.rt.sanskrit_root)
-        note["sanskrit_root_meaning"] = str(i.rt.sanskrit_root_meaning)
-        note["sanskrit_root_class"] = str(i.rt.sanskrit_root_class)
-        note["root_meaning"] = str(i.rt.root_meaning)
-        note["root_in_comps"] = str(i.rt.root_in_comps)
-        note["root_has_verb"] = str(i.rt.root_has_verb)
-        note["root_group"] = str(i.rt.root_group)
-    note["family_root"] = str(i.family_root)
-    note["family_word"] = str(i.family_word)
-    note["family_compound"] = str(i.family_compound)
-    note["family_idioms"] = str(i.family_idioms)
-    note["construction"] = str(i.construction).replace("\n", "<br>")
-    note["derivative"] = str(i.derivative)
-    note["suffix"] = str(i.suffix)
-    note["phonetic"] = str(i.phonetic).replace("\n", "<br>")
-    note["compound_type"] = str(i.compound_type)
-    note["compound_construction"] = str(i.compound_construction)
-    note["non_root_in_comps"] = str(i.non_root_in_comps)
-    note["source_1"] = str(i.source_1)
-    note["sutta_1"] = str(i.sutta_1).replace("\n", "<br>")
-    note["example_1"] = str(i.example_1).replace("\n", "<br>")
-    note["source_2"] = str(i.source_2)
-    note["sutta_2"] = str(i.sutta_2).replace("\n", "<br>")
-    note["example_2"] = str(i.example_2).replace("\n", "<br>")
-    note["antonym"] = str(i.antonym)
-    note["synonym"] = str(i.synonym)
-    note["variant"] = str(i.variant)
-    note["commentary"] = str(i.commentary).replace("\n", "<br>")
-    note["notes"] = str(i.notes).replace("\n", "<br>")
-    note["cognate"] = str(i.cognate)
-    note["family_set"] = str(i.family_set)
-    note["link"] = str(i.link).replace("\n", "<br>")
-    note["stem"] = str(i.stem)
-    note["pattern"] = str(i.pattern)
-    note["meaning_2"] = str(i.meaning_2)
-    note["origin"] = str(i.origin)
-    is_updated = None
-    if note.fields == old_fields:
-        is_updated = False
-    elif note.fields != old_fields:
-        is_updated = True
-        def unicode_combo_characters():
-            for index, (old_value, new_value) in enumerate(zip(old_fields, note.fields)):
-                if old_value != new_value:
-                    print(f"Field at index {index} has changed:")
-                    print(f"  Old value: {old_value}")
-                    print(f"  New value: {new_value}")
-        # unicode_combo_characters()
-    return note, is_updated
-
-
-def update_family_note(note, i):
-    old_fields = copy.copy(note.fields)
-    key, html = i
-
-    note["Front"] = key
-    note["Back"] = html
-
-    is_updated = None
-    if note.fields == old_fields:
-        is_updated = False
-    elif note.fields != old_fields:
-        is_updated = True
-    return note, is_updated
+        fields["sanskrit_root"] = str(i.rt.sanskrit_root)
+        fields["sanskrit_root_meaning"] = str(i.rt.sanskrit_root_meaning)
+        fields["sanskrit_root_class"] = str(i.rt.sanskrit_root_class)
+        fields["root_meaning"] = str(i.rt.root_meaning)
+        fields["root_in_comps"] = str(i.rt.root_in_comps)
+        fields["root_has_verb"] = str(i.rt.root_has_verb)
+        fields["root_group"] = str(i.rt.root_group)
+    fields["family_root"] = str(i.family_root)
+    fields["family_word"] = str(i.family_word)
+    fields["family_compound"] = str(i.family_compound)
+    fields["family_idioms"] = str(i.family_idioms)
+    fields["construction"] = str(i.construction).replace("\n", "<br>")
+    fields["derivative"] = str(i.derivative)
+    fields["suffix"] = str(i.suffix)
+    fields["phonetic"] = str(i.phonetic).replace("\n", "<br>")
+    fields["compound_type"] = str(i.compound_type)
+    fields["compound_construction"] = str(i.compound_construction)
+    fields["non_root_in_comps"] = str(i.non_root_in_comps)
+    fields["source_1"] = str(i.source_1)
+    fields["sutta_1"] = str(i.sutta_1).replace("\n", "<br>")
+    fields["example_1"] = str(i.example_1).replace("\n", "<br>")
+    fields["source_2"] = str(i.source_2)
+    fields["sutta_2"] = str(i.sutta_2).replace("\n", "<br>")
+    fields["example_2"] = str(i.example_2).replace("\n", "<br>")
+    fields["antonym"] = str(i.antonym)
+    fields["synonym"] = str(i.synonym)
+    fields["variant"] = str(i.variant)
+    fields["commentary"] = str(i.commentary).replace("\n", "<br>")
+    fields["notes"] = str(i.notes).replace("\n", "<br>")
+    fields["cognate"] = str(i.cognate)
+    fields["family_set"] = str(i.family_set)
+    fields["link"] = str(i.link).replace("\n", "<br>")
+    fields["stem"] = str(i.stem)
+    fields["pattern"] = str(i.pattern)
+    fields["meaning_2"] = str(i.meaning_2)
+    fields["origin"] = str(i.origin)
+    return fields
 
 
 def deck_selector(i):
@@ -432,49 +562,6 @@ def deck_selector(i):
         return None
 
 
-def update_deck(col, note, i, data, deck_dict, model_dict):
-    """When deck changes, update."""
-    new_deck = deck_selector(i)
-    old_deck = deck_dict[data["did"]]
-
-    if old_deck != new_deck:
-
-        # update note
-        note.mid = model_dict[new_deck]
-        col.update_note(note)
-        
-        # update card
-        card = data["card"]
-        card.did = deck_dict[new_deck]
-        card.queue = 0
-        card.lapse = 0
-        card.due = 0
-        col.update_card(card)
-
-        return True
-    else:
-        return False
-
-
-def make_new_note(col, deck, model_dict, deck_dict, i):
-    """Make a new note."""
-    model_id = model_dict[deck]
-    deck_id = deck_dict[deck]
-    note = col.new_note(model_id)
-    note, is_updated = update_note_values(col, note, i)
-    col.add_note(note, deck_id)
-
-
-def make_new_family_note(col, deck, model_dict, deck_dict, i):
-    """Make a new note for family decks."""
-    deck = deck[0]
-    model_id = model_dict[deck]
-    deck_id = deck_dict[deck]
-    note = col.new_note(model_id)
-    note, is_updated = update_family_note(note, i)
-    col.add_note(note, deck_id)
-
-
 if __name__ == "__main__":
     if config_test("anki", "update", "yes"):
         main()
@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 
 """
-Calculate the number of occurrences of a word's inflections 
+Calculate the number of occurrences of a word's inflections
 in early texts and add to db.
 EBT books are VIN1, VIN2, DN, MN, SN, AN and KN1
 """
 
 import json
+
+from collections import Counter
+
+from sqlalchemy import select, update
+
 from db.db_helpers import get_db_session
 from db.models import DpdHeadword
 from tools.paths import ProjectPaths
@@ -14,6 +19,19 @@ from tools.printer import p_green, p_title, p_yes
 from tools.tic_toc import tic, toc
 from tools.pali_text_files import ebts
 
+
+def make_ebt_freq_dict(
+    cst_file_freq_dict: dict[str, dict[str, int]],
+    ebt_files: list[str]
+) -> Counter[str]:
+    """{inflection: total frequency in all the ebt files}"""
+
+    ebt_freq_dict: Counter[str] = Counter()
+    for ebt_file in ebt_files:
+        ebt_freq_dict.update(cst_file_freq_dict[ebt_file])
+    return ebt_freq_dict
+
+
 def main():
 
     tic()
@@ -25,25 +43,36 @@ def main():
 
     with open(pth.cst_file_freq) as f:
         cst_file_freq_dict = json.load(f)
-    
-    db = db_session.query(DpdHeadword).all()
 
     ebt_files = [ebt_file.replace(".txt", ".xml") for ebt_file in ebts]
-    p_yes("ok")
+    ebt_freq_dict = make_ebt_freq_dict(cst_file_freq_dict, ebt_files)
+    p_yes(len(ebt_freq_dict))
 
     p_green("calculating")
-    for i in db:
+    db = db_session.execute(
+        select(
+            DpdHeadword.id,
+            DpdHeadword.inflections,
+            DpdHeadword.inflections_api_ca_eva_iti,
+            DpdHeadword.ebt_count))
+
+    # only the counts which have changed
+    updates: list[dict[str, int]] = []
+    for id, inflections, inflections_api_ca_eva_iti, ebt_count in db:
         total = 0
-        inflections = i.inflections_list_all
-        for ebt_file in ebt_files:
-            file_freq = cst_file_freq_dict[ebt_file]
-            for inflection in inflections:
-                total += file_freq.get(inflection, 0)
-        i.ebt_count = total
-    p_yes("ok")
+        for inflection in inflections.split(","):
+            total += ebt_freq_dict.get(inflection, 0)
+        for inflection in inflections_api_ca_eva_iti.split(","):
+            total += ebt_freq_dict.get(inflection, 0)
+        if total != ebt_count:
+            updates.append({"id": id, "ebt_count": total})
+    p_yes(len(updates))
 
     p_green("saving to db")
-    db_session.commit()
+    if updates:
+        # bulk update by primary key
+        db_session.execute(update(DpdHeadword), updates)
+        db_session.commit()
     p_yes("ok")
 
     toc()
@@ -51,4 +80,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
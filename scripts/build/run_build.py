@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+
+"""Build dpd.db components and export all dictionaries
+with dependency tracking.
+
+Replaces the strict sequence of
+- scripts/bash/generate_components.sh
+- scripts/bash/makedict.sh
+
+Usage:
+    scripts/build/run_build.py components
+    scripts/build/run_build.py all --jobs 4
+    scripts/build/run_build.py all --dry-run
+    scripts/build/run_build.py export --force
+    scripts/build/run_build.py all --warm
+"""
+
+import argparse
+import sys
+
+from tools.build_dag import BuildDag, Step, step_from_script
+from tools.configger import config_test
+from tools.paths import ProjectPaths
+from tools.printer import p_red, p_title
+from tools.tic_toc import tic, toc
+
+
+def any_config(*options: tuple[str, str, str]):
+    """Make a step condition which is true if any config option matches."""
+    return lambda: any(config_test(*option) for option in options)
+
+
+# families are needed for these exporters
+families_needed = any_config(
+    ("exporter", "make_dpd", "yes"),
+    ("regenerate", "db_rebuild", "yes"),
+    ("exporter", "make_tpr", "yes"),
+    ("exporter", "make_ebook", "yes"))
+
+use_premade_deconstructor = any_config(
+    ("deconstructor", "use_premade", "yes"))
+
+family_tables = [
+    "db:family_compound",
+    "db:family_idiom",
+    "db:family_root",
+    "db:family_set",
+    "db:family_word",
+]
+
+all_tables = family_tables + [
+    "db:dpd_headwords",
+    "db:dpd_roots",
+    "db:inflection_templates",
+    "db:lookup",
+    "db:russian",
+    "db:sbs",
+]
+
+
+def component_steps() -> list[Step]:
+    """The steps in scripts/bash/generate_components.sh."""
+
+    return [
+        step_from_script(
+            "tools/version.py",
+            outputs=["pyproject.toml"],
+            always=True),
+
+        # inflections
+
+        step_from_script(
+            "db/inflections/create_inflection_templates.py",
+            inputs=["db/inflections/inflection_templates.xlsx"],
+            outputs=[
+                "db:inflection_templates",
+                "shared_data/changed_templates"]),
+        step_from_script(
+            "db/inflections/generate_inflection_tables.py",
+            inputs=[
+                "db:inflection_templates",
+                "shared_data/all_tipitaka_words",
+                "shared_data/changed_templates",
+                "config:regenerate.inflections",
+                "config:regenerate.db_rebuild"],
+            outputs=[
+                "db:dpd_headwords",
+                "shared_data/changed_headwords",
+                "shared_data/headword_stem_pattern_dict"],
+            cold=True),
+        step_from_script(
+            "scripts/build/sanskrit_root_families_updater.py",
+            inputs=["db:dpd_headwords"],
+            outputs=[
+                "db:dpd_headwords",
+                "db/sanskrit/root_families_sanskrit.tsv"]),
+
+        # families
+
+        step_from_script(
+            "db/families/family_compiler.py",
+            inputs=[
+                "db:dpd_headwords",
+                "db:russian",
+                "db/families/family_root.py",
+                "db/families/family_word.py",
+                "db/families/family_compound.py",
+                "db/families/family_set.py",
+                "db/families/root_info.py",
+                "db/families/root_matrix.py",
+                "config:dictionary.show_ru_data"],
+            outputs=family_tables + [
+                "db:dpd_roots",
+                "db:lookup",
+                "db:dpd_headwords",
+                "db:db_info"],
+            when=families_needed),
+        step_from_script(
+            "scripts/build/families_to_json.py",
+            inputs=family_tables + ["config:exporter.language"],
+            outputs=[
+                "exporter/goldendict/javascript/family_compound_json.js",
+                "exporter/goldendict/javascript/family_idiom_json.js",
+                "exporter/goldendict/javascript/family_root_json.js",
+                "exporter/goldendict/javascript/family_set_json.js",
+                "exporter/goldendict/javascript/family_word_json.js"]),
+        step_from_script(
+            "scripts/build/anki_updater.py",
+            inputs=["db:dpd_headwords"],
+            when=any_config(("anki", "update", "yes")),
+            always=True),
+
+        # deconstructor
+
+        step_from_script(
+            "scripts/build/deconstructor_extract_archive.py",
+            inputs=["resources/deconstructor_output/deconstructor_output.json.tar.gz"],
+            outputs=["resources/deconstructor_output/deconstructor_output.json"],
+            when=use_premade_deconstructor),
+        step_from_script(
+            "scripts/build/deconstructor_output_add_to_db.py",
+            inputs=["resources/deconstructor_output/deconstructor_output.json"],
+            outputs=["db:lookup"],
+            when=use_premade_deconstructor),
+        Step(
+            "deconstructor_go",
+            ["go", "run", "go_modules/deconstructor/main.go"],
+            inputs=[
+                "go_modules/deconstructor",
+                "go_modules/tools",
+                "shared_data/deconstructor",
+                "db:dpd_headwords",
+                "config:deconstructor.use_premade"],
+            outputs=["db:lookup"]),
+
+        # inflections and lookup
+
+        step_from_script(
+            "scripts/build/api_ca_evi_iti.py",
+            inputs=["db:lookup", "db:dpd_headwords"],
+            outputs=["db:dpd_headwords"]),
+        step_from_script(
+            "db/inflections/transliterate_inflections.py",
+            inputs=[
+                "shared_data/changed_headwords",
+                "shared_data/changed_templates",
+                "config:regenerate.transliterations",
+                "config:regenerate.db_rebuild"],
+            outputs=["db:dpd_headwords"],
+            cold=True),
+        step_from_script(
+            "db/inflections/inflections_to_headwords.py",
+            inputs=["db:dpd_headwords"],
+            outputs=["db:lookup", "exporter/tpr/output/i2h.tsv"]),
+        step_from_script(
+            "db/lookup/variants_and_spelling_mistakes.py",
+            inputs=[
+                "shared_data/deconstructor/variant_readings.tsv",
+                "shared_data/deconstructor/spelling_mistakes.tsv"],
+            outputs=["db:lookup"]),
+        step_from_script(
+            "db/lookup/transliterate_lookup_table.py",
+            inputs=[
+                "config:regenerate.transliterations",
+                "config:regenerate.db_rebuild"],
+            outputs=["db:lookup"],
+            cold=True),
+        step_from_script(
+            "db/lookup/help_abbrev_add_to_lookup.py",
+            inputs=[
+                "exporter/goldendict/help/help.tsv",
+                "exporter/goldendict/help/abbreviations.tsv"],
+            outputs=["db:lookup"]),
+
+        # frequency
+
+        step_from_script(
+            "scripts/build/ebt_counter.py",
+            inputs=["shared_data/frequency/cst_file_freq.json"],
+            outputs=["db:dpd_headwords"]),
+        Step(
+            "frequency_go",
+            ["go", "run", "go_modules/frequency/main.go"],
+            inputs=[
+                "go_modules/frequency",
+                "go_modules/tools",
+                "shared_data/frequency",
+                "config:regenerate.freq_maps"],
+            outputs=["db:dpd_headwords"]),
+
+        # english and russian to pali
+
+        step_from_script(
+            "db/epd/epd_to_lookup.py",
+            inputs=[
+                "db:dpd_headwords",
+                "db:dpd_roots",
+                "config:dictionary.make_link"],
+            outputs=["db:lookup"]),
+        step_from_script(
+            "db/rpd/rpd_to_lookup.py",
+            inputs=[
+                "db:dpd_headwords",
+                "db:dpd_roots",
+                "db:russian",
+                "config:dictionary.make_link"],
+            outputs=["db:lookup"]),
+
+        # a failure here blocks every step after it
+        step_from_script(
+            "scripts/build/dealbreakers.py",
+            outputs=["db:dpd_headwords"],
+            barrier=True),
+    ]
+
+
+def export_steps() -> list[Step]:
+    """The exporters in scripts/bash/makedict.sh."""
+
+    dictionary_config = [
+        "config:dictionary.make_mdict",
+        "config:dictionary.make_link",
+        "config:dictionary.link_url",
+        "config:dictionary.extended_synonyms",
+        "config:dictionary.show_id",
+        "config:dictionary.show_ebt_count",
+        "config:dictionary.show_sbs_data",
+        "config:dictionary.show_ru_data",
+        "config:dictionary.data_limit",
+        "config:exporter.language",
+    ]
+
+    return [
+        # the grammar dict writes to the lookup table, so runs first
+        step_from_script(
+            "exporter/grammar_dict/grammar_dict.py",
+            inputs=["db:dpd_headwords", "db:inflection_templates"]
+                + dictionary_config,
+            outputs=[
+                "db:lookup",
+                "exporter/share/dpd-grammar",
+                "exporter/grammar_dict/output"],
+            when=any_config(("exporter", "make_grammar", "yes")),
+            cold=True),
+
+        # all the exporters below only read from the db
+        step_from_script(
+            "exporter/goldendict/main.py",
+            name="goldendict",
+            inputs=all_tables + dictionary_config + [
+                "exporter/goldendict/templates",
+                "exporter/goldendict/css",
+                "exporter/goldendict/javascript"],
+            outputs=["exporter/share/dpd"],
+            when=any_config(("exporter", "make_dpd", "yes")),
+            cold=True),
+        step_from_script(
+            "exporter/deconstructor/deconstructor_exporter.py",
+            inputs=["db:lookup", "exporter/deconstructor/templates"]
+                + dictionary_config,
+            outputs=["exporter/share/dpd-deconstructor"],
+            when=any_config(("exporter", "make_deconstructor", "yes"))),
+        step_from_script(
+            "exporter/tpr/tpr_exporter.py",
+            inputs=all_tables + ["config:tpr.db_path"],
+            outputs=["exporter/tpr/output"],
+            when=any_config(("exporter", "make_tpr", "yes"))),
+        step_from_script(
+            "exporter/kindle/kindle_exporter.py",
+            inputs=all_tables + ["exporter/kindle/templates"]
+                + dictionary_config,
+            outputs=[
+                "exporter/share/dpd-kindle.epub",
+                "exporter/share/dpd-kindle.mobi"],
+            when=any_config(("exporter", "make_ebook", "yes")),
+            cold=True),
+        step_from_script(
+            "exporter/tbw/tbw_exporter.py",
+            inputs=["db:dpd_headwords", "db:lookup"],
+            outputs=["resources/bw2/js", "resources/sc-data/dpd"],
+            when=any_config(("exporter", "make_tbw", "yes"))),
+        step_from_script(
+            "exporter/pdf/pdf_exporter.py",
+            inputs=all_tables,
+            outputs=["exporter/share/dpd.pdf", "exporter/share/dpd-pdf.zip"],
+            when=any_config(("exporter", "make_pdf", "yes"))),
+
+        # packaging
+        step_from_script(
+            "scripts/build/zip_goldendict_mdict.py",
+            inputs=[
+                "exporter/share/dpd",
+                "exporter/share/dpd-grammar",
+                "exporter/share/dpd-deconstructor",
+                "exporter/share/dpd-mdict.mdx",
+                "exporter/share/dpd-mdict.mdd",
+                "exporter/share/dpd-grammar-mdict.mdx",
+                "exporter/share/dpd-grammar-mdict.mdd",
+                "exporter/share/dpd-deconstructor-mdict.mdx",
+                "exporter/share/dpd-deconstructor-mdict.mdd"],
+            outputs=[
+                "exporter/share/dpd-goldendict.zip",
+                "exporter/share/dpd-mdict.zip"],
+            after=["goldendict", "grammar_dict", "deconstructor_exporter"]),
+        step_from_script(
+            "scripts/build/tarball_db.py",
+            inputs=["dpd.db"],
+            outputs=["exporter/share/dpd.db.tar.bz2"],
+            when=any_config(("exporter", "tarball_db", "yes"))),
+        step_from_script(
+            "scripts/build/summary.py",
+            inputs=["db:dpd_headwords", "db:dpd_roots", "db:lookup"],
+            outputs=["exporter/share/summary.md"],
+            when=any_config(("exporter", "summary", "yes")),
+            always=True),
+    ]
+
+
+def main():
+    tic()
+    p_title("building dpd")
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "target", nargs="?", default="components",
+        choices=["components", "export", "all"])
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="maximum steps to run in parallel, defaults to the cpu count")
+    parser.add_argument(
+        "-f", "--force", action="store_true",
+        help="run every enabled step even if nothing changed")
+    parser.add_argument(
+        "-n", "--dry-run", action="store_true",
+        help="show which steps would run")
+    parser.add_argument(
+        "-w", "--warm", action="store_true",
+        help="run Python steps in one warm process, sharing loaded data")
+    args = parser.parse_args()
+
+    pth = ProjectPaths()
+    if not pth.dpd_db_path.exists():
+        p_red("dpd.db file not found")
+        sys.exit(1)
+
+    uposatha_steps = [step_from_script(
+        "scripts/build/config_uposatha_day.py",
+        always=True,
+        barrier=True)]
+    components = component_steps()
+    exports = export_steps()
+
+    # every step is declared, so the selected ones see
+    # which tables the others last wrote
+    selected: list[Step] = []
+    if args.target in ["export", "all"]:
+        selected.extend(uposatha_steps)
+    if args.target in ["components", "all"]:
+        selected.extend(components)
+    if args.target in ["export", "all"]:
+        selected.extend(exports)
+
+    dag = BuildDag(
+        uposatha_steps + components + exports,
+        base_dir=pth.dpd_db_path.parent,
+        state_path=pth.build_state_path,
+        db_path=pth.dpd_db_path,
+        jobs=args.jobs,
+        force=args.force,
+        dry_run=args.dry_run,
+        warm=args.warm,
+        selected={step.name for step in selected})
+    ok = dag.run()
+    toc()
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
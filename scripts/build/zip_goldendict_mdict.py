@@ -4,8 +4,7 @@
 1. dpd.zip, 2. dpd-grammar.zip, 3. dpd-deconstructor.zip
 1. dpd.mdx .mdd, 2. dpd-grammar.mdx .mdd, 3. dpd-deconstructor.mdx .mdd"""
 
-import os
-from zipfile import ZipFile, ZIP_DEFLATED
+from tools.archiver import p_archive_stats, zip_dir_members, zip_files
 from tools.paths import ProjectPaths
 from tools.tic_toc import bip, tic, toc
 from tools.printer import p_title, p_green, p_red, p_yes, p_no
@@ -26,20 +25,13 @@ def zip_goldendict(pth: ProjectPaths):
             (pth.grammar_dict_goldendict_dir, "dpd-grammar"),
             (pth.deconstructor_goldendict_dir, "dpd-deconstructor")]
 
-        output_zip_file = pth.dpd_goldendict_zip_path
-
-        with ZipFile(output_zip_file, "w", compression=ZIP_DEFLATED, compresslevel=5) as output_zip:
-            for input_dir, dir_name in input_dirs:
-                for root, dirs, files in os.walk(input_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        # Calculate the relative path from the root of the input directory
-                        relative_path = os.path.relpath(file_path, input_dir)
-                        # Prepend the directory name to the relative path
-                        archive_name = os.path.join(dir_name, relative_path)
-                        output_zip.write(file_path, archive_name)
+        members = []
+        for input_dir, dir_name in input_dirs:
+            members += zip_dir_members(input_dir, dir_name)
 
+        stats = zip_files(members, pth.dpd_goldendict_zip_path, compresslevel=5)
         p_yes("ok")
+        p_archive_stats(stats)
     else:
         p_no("error")
         p_red("no dpd dir file found")
@@ -66,18 +58,13 @@ def zip_mdict(pth: ProjectPaths):
             p_red("mdict file found")
             return
     
-    output_mdict_zip = pth.dpd_mdict_zip_path
-
-    with ZipFile(
-        output_mdict_zip, "w",
-        compression=ZIP_DEFLATED,
-        compresslevel=5
-    ) as mdict_zip:
-        for mdict_file in mdict_files:
-            file_content = mdict_file.read_bytes()
-            mdict_zip.writestr(mdict_file.name, file_content)
+    stats = zip_files(
+        [(mdict_file, mdict_file.name) for mdict_file in mdict_files],
+        pth.dpd_mdict_zip_path,
+        compresslevel=5)
 
     p_yes("ok")
+    p_archive_stats(stats)
 
 
 def main():
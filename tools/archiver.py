@@ -0,0 +1,346 @@
+"""Make release archives using all cores.
+
+Files are split into blocks which are compressed in a thread pool
+(bz2 and zlib release the GIL while compressing) and written in order,
+with a bounded number of blocks in flight.
+
+- tar.bz2: every block is a separate bz2 stream. Multi-stream bz2 is
+  standard and read by bzip2, pbzip2, tar and Python.
+- zip: every block of a member is raw deflate, ended with a sync flush and
+  primed with the last 32 KB of the previous block, like pigz. The blocks
+  join into one valid deflate stream per member. ZipFile writes the central
+  directory.
+- epub: a zip with the uncompressed mimetype first, as the spec requires.
+
+Usage:
+    from tools.archiver import tar_bz2, zip_files, zip_dir_members
+    stats = tar_bz2([(pth.dpd_db_path, "dpd.db")], output_path)
+    p_archive_stats(stats)
+"""
+
+import bz2
+import os
+import tarfile
+import time
+import zipfile
+import zlib
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from rich import print
+
+
+block_size = 8 * 1024 * 1024
+zdict_size = 32 * 1024
+
+
+class ArchiveStats():
+    """Sizes and time of making one archive."""
+
+    def __init__(self, output_path: Path, workers: int) -> None:
+        self.output_path = output_path
+        self.workers = workers
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.seconds = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Uncompressed MB per second."""
+        if self.seconds:
+            return self.input_bytes / 1024 / 1024 / self.seconds
+        else:
+            return 0.0
+
+    @property
+    def ratio(self) -> float:
+        if self.input_bytes:
+            return self.output_bytes / self.input_bytes
+        else:
+            return 0.0
+
+    def __repr__(self) -> str:
+        return (
+            f"ArchiveStats: {self.output_path.name} "
+            f"{self.input_bytes:,} > {self.output_bytes:,} bytes "
+            f"{self.seconds:.2f} sec {self.throughput:.1f} MB/s "
+            f"{self.workers} workers")
+
+
+def p_archive_stats(stats: ArchiveStats) -> None:
+    print(f"[green]{'archive':<20}[white]{stats.output_path.name}")
+    print(f"[green]{'size':<20}[white]{stats.input_bytes / 1024 / 1024:,.1f} MB > {stats.output_bytes / 1024 / 1024:,.1f} MB ({stats.ratio:.1%})")
+    print(f"[green]{'throughput':<20}[white]{stats.throughput:,.1f} MB/s with {stats.workers} workers in {stats.seconds:.2f} sec")
+
+
+def _default_workers(workers: Optional[int]) -> int:
+    return workers or os.cpu_count() or 1
+
+
+def _ordered(
+    pool: ThreadPoolExecutor,
+    jobs: Iterator[tuple],
+    window: int
+) -> Iterator[tuple]:
+    """Submit jobs of (function, args, tag) and yield (tag, result) in order,
+    keeping at most window jobs in flight."""
+
+    in_flight: deque[tuple[object, Future]] = deque()
+    for function, args, tag in jobs:
+        in_flight.append((tag, pool.submit(function, *args)))
+        if len(in_flight) >= window:
+            tag, future = in_flight.popleft()
+            yield tag, future.result()
+    while in_flight:
+        tag, future = in_flight.popleft()
+        yield tag, future.result()
+
+
+# tar.bz2
+
+class _ParallelBz2Writer():
+    """A write-only file object which compresses each block
+    as a separate bz2 stream in a thread pool."""
+
+    def __init__(
+        self,
+        fileobj,
+        pool: ThreadPoolExecutor,
+        window: int,
+        compresslevel: int
+    ) -> None:
+        self.fileobj = fileobj
+        self.pool = pool
+        self.window = window
+        self.compresslevel = compresslevel
+        self.buffer = bytearray()
+        self.in_flight: deque[Future] = deque()
+        self.input_bytes = 0
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        self.input_bytes += len(data)
+        while len(self.buffer) >= block_size:
+            self._submit(bytes(self.buffer[:block_size]))
+            del self.buffer[:block_size]
+        return len(data)
+
+    def _submit(self, block: bytes) -> None:
+        self.in_flight.append(
+            self.pool.submit(bz2.compress, block, self.compresslevel))
+        while len(self.in_flight) >= self.window:
+            self.fileobj.write(self.in_flight.popleft().result())
+
+    def close(self) -> None:
+        if self.buffer or not self.input_bytes:
+            self._submit(bytes(self.buffer))
+            self.buffer.clear()
+        while self.in_flight:
+            self.fileobj.write(self.in_flight.popleft().result())
+
+
+def tar_bz2(
+    sources: list[tuple[Path, str]],
+    output_path: Path,
+    compresslevel: int = 9,
+    workers: Optional[int] = None
+) -> ArchiveStats:
+    """Tar a list of (path, arcname) into a multi-stream tar.bz2."""
+
+    workers = _default_workers(workers)
+    stats = ArchiveStats(output_path, workers)
+    start = time.perf_counter()
+
+    with (
+        open(output_path, "wb") as f,
+        ThreadPoolExecutor(max_workers=workers) as pool
+    ):
+        writer = _ParallelBz2Writer(f, pool, workers * 2, compresslevel)
+        with tarfile.open(fileobj=writer, mode="w|") as tar:  # type: ignore
+            for path, arcname in sources:
+                tar.add(path, arcname=arcname)
+        writer.close()
+        stats.input_bytes = writer.input_bytes
+
+    stats.seconds = time.perf_counter() - start
+    stats.output_bytes = output_path.stat().st_size
+    return stats
+
+
+# zip
+
+def _deflate_block(
+    block: bytes,
+    zdict: bytes,
+    compresslevel: int,
+    last: bool
+) -> bytes:
+    """Raw deflate one block of a member, primed with the end of the
+    previous block, ending on a byte boundary unless it is the last."""
+
+    if zdict:
+        compressor = zlib.compressobj(
+            compresslevel, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, zdict)
+    else:
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15, 9)
+    if last:
+        return compressor.compress(block) + compressor.flush(zlib.Z_FINISH)
+    else:
+        return compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def _store_block(block: bytes, *__args__) -> bytes:
+    return block
+
+
+Member = tuple[Union[Path, bytes], str]
+
+
+def _read_blocks(source: Union[Path, bytes]) -> Iterator[bytes]:
+    """Blocks of a file or bytes, at least one, maybe empty."""
+    if isinstance(source, bytes):
+        for offset in range(0, max(len(source), 1), block_size):
+            yield source[offset:offset + block_size]
+    else:
+        with open(source, "rb") as f:
+            block = f.read(block_size)
+            yield block
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                yield block
+
+
+def _make_zipinfo(
+    source: Union[Path, bytes],
+    arcname: str,
+    compress_type: int
+) -> zipfile.ZipInfo:
+    if isinstance(source, bytes):
+        zinfo = zipfile.ZipInfo(arcname, time.localtime(time.time())[:6])
+        zinfo.external_attr = 0o600 << 16
+        zinfo.file_size = len(source)
+    else:
+        zinfo = zipfile.ZipInfo.from_file(source, arcname)
+    zinfo.compress_type = compress_type
+    return zinfo
+
+
+def zip_files(
+    members: list[Member],
+    output_path: Path,
+    compresslevel: int = 6,
+    stored: tuple[str, ...] = (),
+    workers: Optional[int] = None
+) -> ArchiveStats:
+    """Zip a list of (path or bytes, arcname), deflating blocks in parallel.
+    Members named in stored are written uncompressed."""
+
+    workers = _default_workers(workers)
+    stats = ArchiveStats(output_path, workers)
+    start = time.perf_counter()
+
+    zinfos = [
+        _make_zipinfo(
+            source, arcname,
+            zipfile.ZIP_STORED if arcname in stored else zipfile.ZIP_DEFLATED)
+        for source, arcname in members]
+
+    def jobs() -> Iterator[tuple]:
+        for (source, __arcname__), zinfo in zip(members, zinfos):
+            compress = (
+                _store_block if zinfo.compress_type == zipfile.ZIP_STORED
+                else _deflate_block)
+            blocks = _read_blocks(source)
+            block = next(blocks)
+            zdict = b""
+            for next_block in blocks:
+                yield compress, (block, zdict, compresslevel, False), (zinfo, block, False)
+                zdict = block[-zdict_size:]
+                block = next_block
+            yield compress, (block, zdict, compresslevel, True), (zinfo, block, True)
+
+    with (
+        zipfile.ZipFile(output_path, "w", allowZip64=True) as zf,
+        ThreadPoolExecutor(max_workers=workers) as pool
+    ):
+        current: Optional[zipfile.ZipInfo] = None
+        zip64 = False
+        crc = 0
+        compress_size = 0
+
+        for (zinfo, block, last), compressed in _ordered(pool, jobs(), workers * 2):
+            if zinfo is not current:
+                # local header with placeholders, rewritten when done
+                current = zinfo
+                zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+                zinfo.header_offset = zf.fp.tell()  # type: ignore
+                zinfo.CRC = 0
+                zinfo.compress_size = 0
+                zf.fp.write(zinfo.FileHeader(zip64))  # type: ignore
+                crc = 0
+                compress_size = 0
+
+            zf.fp.write(compressed)  # type: ignore
+            crc = zlib.crc32(block, crc)
+            compress_size += len(compressed)
+
+            if last:
+                if not zip64 and compress_size > zipfile.ZIP64_LIMIT:
+                    raise RuntimeError(
+                        f"{zinfo.filename} compressed size exceeds the zip64 limit")
+                zinfo.CRC = crc
+                zinfo.compress_size = compress_size
+                end = zf.fp.tell()  # type: ignore
+                zf.fp.seek(zinfo.header_offset)  # type: ignore
+                zf.fp.write(zinfo.FileHeader(zip64))  # type: ignore
+                zf.fp.seek(end)  # type: ignore
+                zf.filelist.append(zinfo)
+                zf.NameToInfo[zinfo.filename] = zinfo
+                zf.start_dir = end  # type: ignore
+                zf._didModify = True  # type: ignore
+                stats.input_bytes += zinfo.file_size
+
+    stats.seconds = time.perf_counter() - start
+    stats.output_bytes = output_path.stat().st_size
+    return stats
+
+
+def zip_dir_members(input_dir: Path, prefix: str = "") -> list[Member]:
+    """(path, arcname) of every file in a dir, in sorted order,
+    with the arcname relative to the dir and an optional prefix dir."""
+
+    members: list[Member] = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for file in sorted(files):
+            file_path = Path(root) / file
+            arcname = file_path.relative_to(input_dir).as_posix()
+            if prefix:
+                arcname = f"{prefix}/{arcname}"
+            members.append((file_path, arcname))
+    return members
+
+
+def zip_epub(
+    epub_dir: Path,
+    output_path: Path,
+    workers: Optional[int] = None
+) -> ArchiveStats:
+    """Zip an epub dir with the mimetype first and uncompressed."""
+
+    members = [
+        member for member in zip_dir_members(epub_dir)
+        if member[1] != "mimetype"]
+    mimetype_path = epub_dir / "mimetype"
+    if mimetype_path.exists():
+        mimetype: Member = (mimetype_path, "mimetype")
+    else:
+        mimetype = (b"application/epub+zip", "mimetype")
+    return zip_files(
+        [mimetype] + members, output_path,
+        compresslevel=9, stored=("mimetype",), workers=workers)
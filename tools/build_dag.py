@@ -0,0 +1,513 @@
+"""A small build orchestrator for the dpd.db build and export pipeline.
+
+Every step is a command (usually a Python script) which declares the
+resources it reads and writes. Resources are:
+1. "db:<table>" a table in dpd.db,
+2. "config:<section>.<option>" a value in config.ini,
+3. anything else is a file or directory path relative to the project root.
+
+Steps are ordered by declaration. Two steps conflict if one writes
+a resource the other reads or writes, and conflicting steps always run in
+declaration order. Everything after a barrier step, e.g. one which
+rewrites config.ini, waits for it. Everything else runs in parallel.
+
+Before a step runs, its fingerprint is compared with the one recorded at
+its last successful run. If nothing changed, the step is skipped.
+Resources which no step writes are fingerprinted by content hash.
+Resources which steps write, e.g. db:dpd_headwords, change every time one of
+those steps runs, so their content at any point of the build can't be
+compared between runs. They are fingerprinted instead by a version, which
+only changes when they are edited outside the build, and by the recorded
+fingerprints of the earlier steps which write them.
+
+Only the selected steps run. The others still count as writers, so a
+step of the export target sees what the last components run changed.
+
+Each run reports per-step wall time and peak RSS.
+
+In warm mode, Python script steps run inside the runner process, so data
+loaded by one step, e.g. the shared headword snapshot in
+tools/headword_snapshot.py, is reused by the next. A warm step changes
+sys.argv, sys.path and the working directory, so it runs in the main thread
+while no other step is running. Other steps still run in parallel in
+subprocesses. Steps which start worker processes must be marked cold,
+so they never fork from the runner.
+"""
+
+import hashlib
+import json
+import os
+import resource
+import runpy
+import sqlite3
+import subprocess
+import sys
+import time
+import traceback
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Optional
+
+from rich import print
+from rich.table import Table
+
+from tools.configger import config, config_read
+from tools.headword_snapshot import invalidate_headword_snapshot
+
+
+class Step:
+    """A single build step."""
+
+    def __init__(
+        self,
+        name: str,
+        cmd: list[str],
+        inputs: Optional[list[str]] = None,
+        outputs: Optional[list[str]] = None,
+        after: Optional[list[str]] = None,
+        when: Optional[Callable[[], bool]] = None,
+        always: bool = False,
+        barrier: bool = False,
+        cold: bool = False,
+    ) -> None:
+        self.name = name
+        self.cmd = cmd
+        self.inputs = inputs or []
+        self.outputs = outputs or []
+        self.after = after or []
+        self.when = when
+        self.always = always
+        self.barrier = barrier
+        # always run in a subprocess, even in warm mode
+        self.cold = cold
+
+        # filled in by the runner
+        self.deps: set[str] = set()
+        self.status: str = "pending"
+        self.fingerprint: Optional[dict[str, str]] = None
+        self.seconds: float = 0.0
+        self.peak_rss_mb: float = 0.0
+
+    def __repr__(self) -> str:
+        return f"Step: {self.name} {self.status}"
+
+
+def step_from_script(
+    script: str,
+    name: Optional[str] = None,
+    **kwargs
+) -> Step:
+    """Make a step which runs a Python script with the current interpreter."""
+    if name is None:
+        name = Path(script).stem
+    return Step(name, [sys.executable, script], **kwargs)
+
+
+class BuildDag:
+    """Resolve dependencies between steps and run them."""
+
+    def __init__(
+        self,
+        steps: list[Step],
+        base_dir: Path,
+        state_path: Path,
+        db_path: Path,
+        jobs: Optional[int] = None,
+        force: bool = False,
+        dry_run: bool = False,
+        warm: bool = False,
+        selected: Optional[set[str]] = None,
+    ) -> None:
+        self.steps: dict[str, Step] = {}
+        for step in steps:
+            if step.name in self.steps:
+                raise ValueError(f"duplicate step name: {step.name}")
+            self.steps[step.name] = step
+            if selected is not None and step.name not in selected:
+                step.status = "unselected"
+        self.positions = {name: i for i, name in enumerate(self.steps)}
+
+        # the steps which write each resource, in declaration order
+        self.writers: dict[str, list[str]] = {}
+        for step in steps:
+            for resource in step.outputs:
+                self.writers.setdefault(resource, []).append(step.name)
+
+        self.base_dir = base_dir
+        self.state_path = state_path
+        self.db_path = db_path
+        self.jobs = jobs or os.cpu_count() or 1
+        self.force = force
+        self.dry_run = dry_run
+        self.warm = warm
+
+        self.state: dict[str, dict] = self.load_state()
+        # the version and last known hash of every written resource
+        self.resources: dict[str, dict] = self.state.setdefault("_resources", {})
+        self.hash_cache: dict[str, str] = {}
+        self.resolve_deps()
+
+    # dependencies
+
+    def resolve_deps(self) -> None:
+        """Add an edge to every earlier step which conflicts."""
+
+        ordered = list(self.steps.values())
+        for counter, step in enumerate(ordered):
+            reads = set(step.inputs)
+            writes = set(step.outputs)
+            for earlier in ordered[:counter]:
+                earlier_writes = set(earlier.outputs)
+                if (
+                    earlier.barrier
+                    or earlier_writes & (reads | writes)
+                    or set(earlier.inputs) & writes
+                ):
+                    step.deps.add(earlier.name)
+            earlier_names = {earlier.name for earlier in ordered[:counter]}
+            for name in step.after:
+                if name not in earlier_names:
+                    raise ValueError(
+                        f"{step.name}: {name} is not an earlier step")
+                step.deps.add(name)
+
+    # hashing
+
+    def resource_hash(self, resource: str) -> str:
+        """Content hash of a resource, cached until a step writes it.
+        Steps can update config.ini without declaring it, so config
+        values are never cached."""
+
+        if resource.startswith("config:"):
+            self.reload_config()
+            section, option = resource[7:].split(".", 1)
+            value = config_read(section, option, default_value="")
+            return hashlib.blake2b(str(value).encode()).hexdigest()
+
+        if resource not in self.hash_cache:
+            if resource.startswith("db:"):
+                digest = self.table_hash(resource[3:])
+            else:
+                digest = self.path_hash(self.base_dir / resource)
+            self.hash_cache[resource] = digest
+        return self.hash_cache[resource]
+
+    def table_hash(self, table: str) -> str:
+        """Hash every row of a table in rowid order."""
+
+        if not self.db_path.exists():
+            return "missing"
+        h = hashlib.blake2b()
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            cursor = conn.execute(f'SELECT * FROM "{table}" ORDER BY rowid')
+            for row in cursor:
+                h.update(repr(row).encode())
+        except sqlite3.OperationalError:
+            return "missing"
+        finally:
+            conn.close()
+        return h.hexdigest()
+
+    def path_hash(self, path: Path) -> str:
+        """Hash a file, or every file in a directory in sorted order."""
+
+        if path.is_file():
+            return self.file_hash(path)
+        elif path.is_dir():
+            h = hashlib.blake2b()
+            for file_path in sorted(p for p in path.rglob("*") if p.is_file()):
+                h.update(str(file_path.relative_to(path)).encode())
+                h.update(self.file_hash(file_path).encode())
+            return h.hexdigest()
+        else:
+            return "missing"
+
+    @staticmethod
+    def file_hash(path: Path) -> str:
+        h = hashlib.blake2b()
+        with open(path, "rb") as f:
+            while chunk := f.read(1 << 20):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def fingerprint(self, step: Step) -> dict[str, str]:
+        """All the hashes which decide if a step needs to run."""
+
+        cmd = ["python" if arg == sys.executable else arg for arg in step.cmd]
+        fingerprint = {"cmd": " ".join(cmd)}
+        # scripts named in the command are implicit inputs
+        script_paths = [
+            arg for arg in step.cmd[1:] if (self.base_dir / arg).exists()]
+        for resource in script_paths + step.inputs + step.outputs:
+            if resource in self.writers:
+                fingerprint[resource] = self.written_resource_token(
+                    step, resource)
+            else:
+                fingerprint[resource] = self.resource_hash(resource)
+        return fingerprint
+
+    def written_resource_token(self, step: Step, resource: str) -> str:
+        """The version of a resource which steps write, and the recorded
+        fingerprints of the steps before this one which write it."""
+
+        position = self.positions[step.name]
+        earlier_writers = [
+            self.state.get(name) for name in self.writers[resource]
+            if self.positions[name] < position]
+        version = self.resources.get(resource, {}).get("version", 0)
+        token = json.dumps([version, earlier_writers], sort_keys=True)
+        return hashlib.blake2b(token.encode()).hexdigest()
+
+    def check_resources(self) -> None:
+        """Give a new version to every written resource
+        which was changed outside the build since the last run."""
+
+        for resource in self.writers:
+            digest = self.resource_hash(resource)
+            recorded = self.resources.setdefault(
+                resource, {"version": 0, "hash": digest})
+            if recorded["hash"] != digest:
+                recorded["version"] += 1
+                recorded["hash"] = digest
+
+    def record_resources(self) -> None:
+        """Remember every written resource as the build left it."""
+
+        for resource in self.writers:
+            self.resources[resource]["hash"] = self.resource_hash(resource)
+
+    def reload_config(self) -> None:
+        config.read(self.base_dir / "config.ini")
+
+    # state
+
+    def load_state(self) -> dict[str, dict]:
+        if self.state_path.exists():
+            with open(self.state_path) as f:
+                return json.load(f)
+        else:
+            return {}
+
+    def save_state(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.state_path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.state_path)
+
+    def is_up_to_date(self, step: Step) -> bool:
+        step.fingerprint = self.fingerprint(step)
+        if self.force or step.always:
+            return False
+        recorded = self.state.get(step.name)
+        return recorded is not None and recorded == step.fingerprint
+
+    # running
+
+    def run_step(self, step: Step) -> tuple[int, float, float]:
+        """Run a step in a subprocess.
+        Return the exit code, wall time and peak RSS in MB."""
+
+        env = os.environ.copy()
+        env["PYTHONPATH"] = os.pathsep.join(
+            filter(None, [str(self.base_dir), env.get("PYTHONPATH")]))
+
+        start = time.perf_counter()
+        proc = subprocess.Popen(step.cmd, cwd=self.base_dir, env=env)
+        __pid__, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        seconds = time.perf_counter() - start
+
+        # ru_maxrss is kilobytes on linux and bytes on mac
+        if sys.platform == "darwin":
+            peak_rss_mb = rusage.ru_maxrss / 1024 / 1024
+        else:
+            peak_rss_mb = rusage.ru_maxrss / 1024
+
+        return proc.returncode, seconds, peak_rss_mb
+
+    def is_warm(self, step: Step) -> bool:
+        return (
+            self.warm
+            and not step.cold
+            and len(step.cmd) > 1
+            and step.cmd[0] == sys.executable
+            and step.cmd[1].endswith(".py"))
+
+    def run_step_warm(self, step: Step) -> tuple[int, float, float]:
+        """Run a Python script step inside this process.
+        Only call it from the main thread while no other step is running.
+        Return the exit code, wall time and peak RSS in MB of the
+        whole runner process."""
+
+        script = self.base_dir / step.cmd[1]
+        saved_argv = sys.argv
+        saved_path = sys.path[:]
+        saved_cwd = os.getcwd()
+        sys.argv = [str(script)] + step.cmd[2:]
+        sys.path[:0] = [str(script.parent), str(self.base_dir)]
+        os.chdir(self.base_dir)
+
+        start = time.perf_counter()
+        try:
+            runpy.run_path(str(script), run_name="__main__")
+            returncode = 0
+        except SystemExit as e:
+            if e.code is None:
+                returncode = 0
+            elif isinstance(e.code, int):
+                returncode = e.code
+            else:
+                print(e.code)
+                returncode = 1
+        except Exception:
+            traceback.print_exc()
+            returncode = 1
+        finally:
+            sys.argv = saved_argv
+            sys.path[:] = saved_path
+            os.chdir(saved_cwd)
+        seconds = time.perf_counter() - start
+
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            peak_rss_mb = peak_rss / 1024 / 1024
+        else:
+            peak_rss_mb = peak_rss / 1024
+
+        return returncode, seconds, peak_rss_mb
+
+    def ready_steps(self) -> list[Step]:
+        ready = []
+        for step in self.steps.values():
+            if step.status != "pending":
+                continue
+            dep_status = {self.steps[d].status for d in step.deps}
+            if dep_status & {"failed", "blocked"}:
+                step.status = "blocked"
+            elif dep_status <= {"done", "skipped", "disabled", "unselected"}:
+                ready.append(step)
+        return ready
+
+    def needs_run(self, step: Step) -> bool:
+        """Decide if a ready step runs, is skipped or is disabled."""
+
+        self.reload_config()
+        if step.when is not None and not step.when():
+            step.status = "disabled"
+            print(f"[green]{step.name:<35}[white]disabled in config.ini")
+            return False
+
+        if self.is_up_to_date(step):
+            step.status = "skipped"
+            print(f"[green]{step.name:<35}[white]up to date")
+            return False
+
+        if self.dry_run:
+            step.status = "done"
+            print(f"[green]{step.name:<35}[white]would run")
+            return False
+
+        return True
+
+    def start_step(self, step: Step) -> None:
+        step.status = "running"
+        print(f"[bright_yellow]{step.name:<35}[white]{' '.join(step.cmd[1:])}")
+
+    def finish_step(self, step: Step, result: tuple[int, float, float]) -> None:
+        returncode, step.seconds, step.peak_rss_mb = result
+
+        # the shared snapshot is stale if the step changed headwords,
+        # whether it ran warm, cold or not in Python at all
+        if "db:dpd_headwords" in step.outputs:
+            invalidate_headword_snapshot()
+
+        if returncode == 0:
+            step.status = "done"
+            for resource in step.outputs:
+                self.hash_cache.pop(resource, None)
+            self.state[step.name] = step.fingerprint or self.fingerprint(step)
+        else:
+            step.status = "failed"
+            self.state.pop(step.name, None)
+            print(f"[red]{step.name} exited with {returncode}")
+        self.save_state()
+
+    def run(self) -> bool:
+        """Run the whole graph. Return True if no step failed."""
+
+        self.check_resources()
+        running: dict[Future, Step] = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while True:
+                warm_step: Optional[Step] = None
+                # starting a step can skip it, which can make more ready
+                started = True
+                while started and warm_step is None and len(running) < self.jobs:
+                    started = False
+                    for step in self.ready_steps():
+                        if len(running) >= self.jobs:
+                            break
+                        if not self.needs_run(step):
+                            started = True
+                        elif self.is_warm(step):
+                            warm_step = step
+                            break
+                        else:
+                            self.start_step(step)
+                            running[pool.submit(self.run_step, step)] = step
+                            started = True
+
+                # a warm step waits until nothing else is running
+                if warm_step is not None and not running:
+                    self.start_step(warm_step)
+                    self.finish_step(warm_step, self.run_step_warm(warm_step))
+                    continue
+
+                if not running:
+                    break
+
+                done, __not_done__ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = running.pop(future)
+                    self.finish_step(step, future.result())
+
+        if not self.dry_run:
+            self.record_resources()
+            self.save_state()
+        self.print_report()
+        return not any(
+            step.status in {"failed", "blocked"}
+            for step in self.steps.values())
+
+    def print_report(self) -> None:
+        table = Table(title="build summary")
+        table.add_column("step")
+        table.add_column("status")
+        table.add_column("seconds", justify="right")
+        table.add_column("peak rss mb", justify="right")
+
+        colours = {
+            "done": "green",
+            "skipped": "blue",
+            "disabled": "white",
+            "failed": "red",
+            "blocked": "red",
+        }
+        total_seconds = 0.0
+        for step in self.steps.values():
+            if step.status == "unselected":
+                continue
+            colour = colours.get(step.status, "white")
+            table.add_row(
+                step.name,
+                f"[{colour}]{step.status}",
+                f"{step.seconds:.1f}" if step.seconds else "",
+                f"{step.peak_rss_mb:,.0f}" if step.peak_rss_mb else "",
+            )
+            total_seconds += step.seconds
+
+        print(table)
+        print(f"[green]{'total step seconds':<20}[white]{total_seconds:.1f}")
@@ -1,15 +1,20 @@
 #!/usr/bin/env python3
 
-"""Generic GoldenDict exporter using pyglossary."""
+"""Generic GoldenDict exporter.
+
+The StarDict files are written natively, streaming the definitions to disk
+and keeping only the index in memory. Pyglossary is used for slob."""
 
-import shutil
 import idzip
 import os
+import re
+import shutil
 
 from pathlib import Path
 from pyglossary import Glossary
+from struct import pack
 from subprocess import Popen
-from typing import Optional
+from typing import Iterable, Optional
 from zipfile import ZipFile, ZIP_DEFLATED
 
 from tools.date_and_time import make_timestamp
@@ -123,7 +128,7 @@ class DictVariables():
 def export_to_goldendict_with_pyglossary(
     dict_info: DictInfo,
     dict_var: DictVariables,
-    dict_data: list[DictEntry],
+    dict_data: Iterable[DictEntry],
     zip_synonyms: bool = True,
     include_slob=False
 ) -> None:
@@ -136,14 +141,13 @@ def export_to_goldendict_with_pyglossary(
         zip_synonyms = True,
         include_slob = False
     )
+    dict_data can be any iterable of DictEntry, e.g. a generator,
+    but must be a list to include slob, which reads it a second time.
     """
 
-    p_green_title("exporting to goldendict with pyglossary")
-    glos = create_glossary(dict_info)
-    glos = add_css(glos, dict_var)
-    glos = add_js(glos, dict_var)
-    glos = add_data(glos, dict_data)
-    write_to_file(glos, dict_var)
+    p_green_title("exporting to goldendict")
+    add_res_files(dict_var)
+    write_stardict(dict_info, dict_var, dict_data)
     add_icon(dict_var)
     if zip_synonyms:
         zip_synfile(dict_var)
@@ -153,9 +157,135 @@ def export_to_goldendict_with_pyglossary(
     if dict_var.delete_original:
         delete_original(dict_var)
     if include_slob:
+        glos = create_glossary(dict_info)
+        glos = add_css(glos, dict_var)
+        glos = add_js(glos, dict_var)
+        glos = add_data(glos, dict_data)
         write_to_slob(glos, dict_var)
 
 
+def add_res_files(dict_var: DictVariables) -> None:
+    """Copy the CSS and JS files into the res folder."""
+
+    p_white("adding css and js")
+    res_paths = [dict_var.css_path, *(dict_var.js_paths or [])]
+    res_paths = [
+        res_path for res_path in res_paths if res_path and res_path.exists()]
+    if res_paths:
+        res_dir = dict_var.gd_path.joinpath("res")
+        res_dir.mkdir(parents=True, exist_ok=True)
+        for res_path in res_paths:
+            shutil.copyfile(res_path, res_dir.joinpath(res_path.name))
+        p_yes(len(res_paths))
+    else:
+        p_yes("no")
+
+
+def stardict_sort_key(word: bytes) -> tuple[bytes, bytes]:
+    """StarDict sorts the index by lowercase bytes, then bytes."""
+    return word.lower(), word
+
+
+def write_stardict(
+    dict_info: DictInfo,
+    dict_var: DictVariables,
+    dict_data: Iterable[DictEntry]
+) -> None:
+    """Write the StarDict files, streaming the definitions to the .dict file.
+    Only the headwords, synonyms, offsets and sizes are kept in memory,
+    to write the .idx and .syn files in StarDict order."""
+
+    p_white("writing goldendict file")
+    dict_var.gd_path.mkdir(parents=True, exist_ok=True)
+    dict_file_path = dict_var.gd_path_name.with_suffix(".dict")
+    idx_file_path = dict_var.gd_path_name.with_suffix(".idx")
+
+    words: list[bytes] = []
+    blocks: list[tuple[int, int]] = []
+    synonyms: list[tuple[bytes, int]] = []
+    offset = 0
+    with open(dict_file_path, "wb") as dict_file:
+        for d in dict_data:
+            definition = d.definition_html.encode("utf-8")
+            dict_file.write(definition)
+            for synonym in d.synonyms:
+                synonyms.append((synonym.encode("utf-8"), len(words)))
+            words.append(d.word.encode("utf-8"))
+            blocks.append((offset, len(definition)))
+            offset += len(definition)
+
+    order = sorted(range(len(words)), key=lambda i: stardict_sort_key(words[i]))
+    with open(idx_file_path, "wb") as idx_file:
+        idx_file.writelines(
+            words[i] + b"\x00" + pack(">II", *blocks[i]) for i in order)
+
+    # synonyms point to the position of their headword in the .idx
+    position = [0] * len(order)
+    for index, i in enumerate(order):
+        position[i] = index
+    synonyms = sorted(
+        ((synonym, position[i]) for synonym, i in synonyms),
+        key=lambda s: (*stardict_sort_key(s[0]), s[1]))
+    if synonyms:
+        with open(dict_var.synfile, "wb") as syn_file:
+            syn_file.writelines(
+                synonym + b"\x00" + pack(">I", index)
+                for synonym, index in synonyms)
+
+    write_ifo_file(
+        dict_info, dict_var, len(words), len(synonyms),
+        idx_file_path.stat().st_size)
+
+    dictzip(dict_file_path)
+    if synonyms:
+        dictzip(dict_var.synfile)
+    p_yes(len(words))
+
+
+def write_ifo_file(
+    dict_info: DictInfo,
+    dict_var: DictVariables,
+    word_count: int,
+    syn_word_count: int,
+    idx_file_size: int
+) -> None:
+    """Write the .ifo file as pyglossary does."""
+
+    def no_newlines(text: str, replacement: str) -> str:
+        return re.sub("\n\r?|\r\n?", replacement, text)
+
+    bookname = no_newlines(dict_info.bookname, " ")
+    if dict_info.source_lang and dict_info.target_lang:
+        langs = f"{dict_info.source_lang}-{dict_info.target_lang}"
+        if langs not in bookname.lower():
+            bookname = f"{bookname} ({langs})"
+
+    ifo = [
+        ("version", "3.0.0"),
+        ("bookname", bookname),
+        ("wordcount", str(word_count)),
+        ("idxfilesize", str(idx_file_size)),
+        ("sametypesequence", "h"),
+    ]
+    if syn_word_count > 0:
+        ifo.append(("synwordcount", str(syn_word_count)))
+    for key, value in [
+        ("author", dict_info.author),
+        ("website", dict_info.website),
+        ("date", dict_info.date),
+    ]:
+        if value:
+            ifo.append((key, no_newlines(str(value), " ")))
+    ifo.append(("description", no_newlines(dict_info.description, "<br>")))
+
+    with open(
+        dict_var.gd_path_name, "w", encoding="utf-8", newline="\n"
+    ) as ifo_file:
+        ifo_file.write("StarDict's dict ifo file\n")
+        for key, value in ifo:
+            ifo_file.write(f"{key}={value}\n")
+
+
 def create_glossary(dict_info: DictInfo) -> Glossary:
     """Create Glossary."""
     
@@ -223,21 +353,6 @@ def add_data(glos: Glossary, dict_data: list[DictEntry]) -> Glossary:
     return glos
 
 
-def write_to_file(glos: Glossary, dict_var: DictVariables) -> None:
-    """Write output files."""
-    
-    p_white("writing goldendict file")
-    glos.write(
-        filename=str(dict_var.gd_path_name),
-        format="Stardict",
-        dictzip=True,
-        merge_syns=False,       # when True, include synonyms in compressed main file rather than *.syn
-        sametypesequence="h",
-        sqlite=False,           # when False, more RAM but faster 
-    )
-    p_yes("ok")
-
-
 def write_to_slob(glos: Glossary, dict_var: DictVariables) -> None:
     """Write to slob format files."""
     
@@ -252,21 +367,28 @@ def write_to_slob(glos: Glossary, dict_var: DictVariables) -> None:
     p_yes("ok")
 
 
+def dictzip(file_path: Path) -> None:
+    """Compress a file into dictzip format and delete the original."""
+
+    with open(file_path, "rb") as input_f, \
+            open(f"{file_path}.dz", "wb") as output_f:
+        input_info = os.fstat(input_f.fileno())
+        idzip.compressor.compress( #type:ignore
+            input_f,
+            input_info.st_size,
+            output_f,
+            file_path.name,
+            int(input_info.st_mtime))
+    file_path.unlink()
+
+
 def zip_synfile(dict_var: DictVariables) -> None:
     """ Compress .syn file into dictzip format """
     
     p_white("synzip")
     try:
-        with open(dict_var.synfile, "rb") as input_f, open(dict_var.synfile_zip, 'wb') as output_f:
-            input_info = os.fstat(input_f.fileno())
-            idzip.compressor.compress( #type:ignore
-                input_f,
-                input_info.st_size,
-                output_f,
-                dict_var.synfile.name,
-                int(input_info.st_mtime)) 
-            dict_var.synfile.unlink()
-            p_yes("ok")
+        dictzip(dict_var.synfile)
+        p_yes("ok")
     except FileNotFoundError:
         p_no("no")
 
@@ -0,0 +1,236 @@
+"""A read-only snapshot of the DpdHeadword table which can be loaded once
+and shared by every build step running in the same process.
+
+The snapshot is columnar and sorted in Pāḷi alphabetical order. It holds the
+raw columns plus precomputed derived data (lemma_clean, inflections_list,
+family lists etc.), and lightweight __slots__ rows which can be used in place
+of DpdHeadword objects in read-only code.
+
+Usage:
+    from tools.headword_snapshot import get_headword_snapshot
+    snapshot = get_headword_snapshot()
+    for i in snapshot:
+        print(i.lemma_1, i.lemma_clean, i.inflections_list)
+    lemmas = snapshot.column("lemma_1")
+
+A step which writes to the dpd_headwords table should call
+invalidate_headword_snapshot() afterwards.
+"""
+
+import re
+
+from pathlib import Path
+from typing import Iterator, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from db.db_helpers import get_db_session
+from db.models import DpdHeadword
+from tools.pali_sort_key import pali_sort_key
+from tools.paths import ProjectPaths
+
+
+COLUMNS: list[str] = [
+    column.name for column in DpdHeadword.__table__.columns]
+
+DERIVED: list[str] = [
+    "sort_key",
+    "lemma_clean",
+    "root_clean",
+    "root_family_key",
+    "inflections_list",
+    "inflections_list_api_ca_eva_iti",
+    "inflections_list_all",
+    "family_compound_list",
+    "family_idioms_list",
+    "family_set_list",
+    "antonym_list",
+    "synonym_list",
+    "variant_list",
+]
+
+
+def _split(string: str, separator: str) -> tuple[str, ...]:
+    if string:
+        return tuple(string.split(separator))
+    else:
+        return ()
+
+
+def _derive(row: dict) -> dict:
+    """Compute derived data for one row, the same as the DpdHeadword
+    properties of the same name."""
+
+    lemma_clean = re.sub(r" \d.*$", "", row["lemma_1"])
+    if row["root_key"] and row["family_root"]:
+        root_family_key = f"{row['root_key']} {row['family_root']}"
+    else:
+        root_family_key = ""
+
+    return {
+        "sort_key": pali_sort_key(row["lemma_1"]),
+        "lemma_clean": lemma_clean,
+        "root_clean": re.sub(r" \d.*$", "", row["root_key"] or ""),
+        "root_family_key": root_family_key,
+        "inflections_list": _split(row["inflections"], ","),
+        "inflections_list_api_ca_eva_iti": _split(
+            row["inflections_api_ca_eva_iti"], ","),
+        # as DpdHeadword.inflections_list_all, empty strings included
+        "inflections_list_all": tuple(
+            row["inflections"].split(",")
+            + row["inflections_api_ca_eva_iti"].split(",")),
+        "family_compound_list": _split(row["family_compound"], " ") or (lemma_clean,),
+        "family_idioms_list": _split(row["family_idioms"], " ") or (lemma_clean,),
+        "family_set_list": _split(row["family_set"], "; "),
+        "antonym_list": _split(row["antonym"], ", "),
+        "synonym_list": _split(row["synonym"], ", "),
+        "variant_list": _split(row["variant"], ", "),
+    }
+
+
+class HeadwordRow:
+    """A read-only stand-in for a DpdHeadword.
+    Pure properties which only depend on columns are borrowed
+    from DpdHeadword, so templates and helper functions work unchanged."""
+
+    __slots__ = COLUMNS + DERIVED
+
+    def __init__(self, values: dict) -> None:
+        for key, value in values.items():
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"HeadwordRow is read-only: {key}")
+
+    def __delattr__(self, key):
+        raise AttributeError(f"HeadwordRow is read-only: {key}")
+
+    lemma_1_ = DpdHeadword.lemma_1_
+    lemma_link = DpdHeadword.lemma_link
+    lemma_ipa = DpdHeadword.lemma_ipa
+    lemma_tts = DpdHeadword.lemma_tts
+    meaning_combo = DpdHeadword.meaning_combo
+    meaning_combo_html = DpdHeadword.meaning_combo_html
+    root_base_clean = DpdHeadword.root_base_clean
+    construction_summary = DpdHeadword.construction_summary
+    construction_clean = DpdHeadword.construction_clean
+    construction_line1 = DpdHeadword.construction_line1
+    degree_of_completion = DpdHeadword.degree_of_completion
+    degree_of_completion_html = DpdHeadword.degree_of_completion_html
+    source_link_1 = DpdHeadword.source_link_1
+    source_link_2 = DpdHeadword.source_link_2
+    source_link_sutta = DpdHeadword.source_link_sutta
+    sanskrit_clean = DpdHeadword.sanskrit_clean
+    freq_data_unpack = DpdHeadword.freq_data_unpack
+    cf_set = DpdHeadword.cf_set
+    idioms_set = DpdHeadword.idioms_set
+    needs_grammar_button = DpdHeadword.needs_grammar_button
+    needs_example_button = DpdHeadword.needs_example_button
+    needs_examples_button = DpdHeadword.needs_examples_button
+    needs_conjugation_button = DpdHeadword.needs_conjugation_button
+    needs_declension_button = DpdHeadword.needs_declension_button
+    needs_root_family_button = DpdHeadword.needs_root_family_button
+    needs_word_family_button = DpdHeadword.needs_word_family_button
+    needs_compound_family_button = DpdHeadword.needs_compound_family_button
+    needs_compound_families_button = DpdHeadword.needs_compound_families_button
+    needs_idioms_button = DpdHeadword.needs_idioms_button
+    needs_set_button = DpdHeadword.needs_set_button
+    needs_sets_button = DpdHeadword.needs_sets_button
+    needs_frequency_button = DpdHeadword.needs_frequency_button
+
+    def __repr__(self) -> str:
+        return f"HeadwordRow: {self.id} {self.lemma_1} {self.pos} {self.meaning_1}"
+
+
+class HeadwordSnapshot:
+    """All headwords sorted by lemma_1 in Pāḷi alphabetical order,
+    stored as columns and as rows."""
+
+    __slots__ = ["stamp", "columns", "rows", "_by_id", "_by_lemma_1"]
+
+    def __init__(self, stamp: tuple, records: list[dict]) -> None:
+        records.sort(key=lambda x: x["sort_key"])
+        self.stamp = stamp
+        self.columns: dict[str, tuple] = {
+            name: tuple(record[name] for record in records)
+            for name in COLUMNS + DERIVED}
+        self.rows: tuple[HeadwordRow, ...] = tuple(
+            HeadwordRow(record) for record in records)
+        self._by_id: Optional[dict[int, HeadwordRow]] = None
+        self._by_lemma_1: Optional[dict[str, HeadwordRow]] = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[HeadwordRow]:
+        return iter(self.rows)
+
+    def column(self, name: str) -> tuple:
+        """A whole column in sorted order."""
+        return self.columns[name]
+
+    @property
+    def by_id(self) -> dict[int, HeadwordRow]:
+        if self._by_id is None:
+            self._by_id = {i.id: i for i in self.rows}
+        return self._by_id
+
+    @property
+    def by_lemma_1(self) -> dict[str, HeadwordRow]:
+        if self._by_lemma_1 is None:
+            self._by_lemma_1 = {i.lemma_1: i for i in self.rows}
+        return self._by_lemma_1
+
+    def __repr__(self) -> str:
+        return f"HeadwordSnapshot: {len(self.rows)} headwords"
+
+
+_snapshot_cache: dict[Path, HeadwordSnapshot] = {}
+
+
+def _make_stamp(db_session: Session) -> tuple:
+    """A cheap fingerprint of the dpd_headwords table."""
+    return tuple(db_session.execute(
+        select(
+            func.count(DpdHeadword.id),
+            func.max(DpdHeadword.id),
+            func.max(DpdHeadword.updated_at))
+    ).one())
+
+
+def load_headword_snapshot(db_session: Session) -> HeadwordSnapshot:
+    """Load a new snapshot without hydrating any ORM objects."""
+
+    stamp = _make_stamp(db_session)
+    result = db_session.execute(
+        select(DpdHeadword.__table__).order_by(DpdHeadword.id))
+    records = []
+    for row in result.mappings():
+        record = dict(row)
+        record.update(_derive(record))
+        records.append(record)
+    return HeadwordSnapshot(stamp, records)
+
+
+def get_headword_snapshot(db_path: Optional[Path] = None) -> HeadwordSnapshot:
+    """Return the snapshot shared by this process,
+    reloading it if dpd_headwords has changed."""
+
+    if db_path is None:
+        db_path = ProjectPaths().dpd_db_path
+
+    db_session = get_db_session(db_path)
+    try:
+        snapshot = _snapshot_cache.get(db_path)
+        if snapshot is None or snapshot.stamp != _make_stamp(db_session):
+            snapshot = load_headword_snapshot(db_session)
+            _snapshot_cache[db_path] = snapshot
+    finally:
+        db_session.close()
+    return snapshot
+
+
+def invalidate_headword_snapshot() -> None:
+    """Drop the shared snapshot after writing to dpd_headwords."""
+    _snapshot_cache.clear()
@@ -0,0 +1,107 @@
+"""Write one column of the Lookup table by difference.
+
+The packed value of every key is hashed, and so is every value already in
+the column. Only the keys whose hash differs are inserted, updated, cleared
+or deleted, in executemany batches.
+
+The old hashes are always made from the column itself, as other steps,
+e.g. the Go deconstructor, rewrite it with values of the same length.
+"""
+
+import hashlib
+
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from db.models import Lookup
+
+
+lookup_table = Lookup.__table__
+
+
+def hash_value(value: str) -> bytes:
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+
+
+def column_hashes(db_session: Session, column_name: str) -> dict[str, bytes]:
+    """Hashes of the values in a column of the db."""
+
+    column = lookup_table.c[column_name]
+    return {
+        lookup_key: hash_value(value)
+        for lookup_key, value in db_session.execute(
+            select(lookup_table.c.lookup_key, column).where(column != ""))}
+
+
+def write_lookup_column(
+    db_session: Session,
+    column_name: str,
+    packed_dict: dict[str, str]
+) -> dict[str, int]:
+    """Write {lookup_key: packed value} into a column of the Lookup table,
+    touching only the keys whose value has changed.
+
+    Keys which no longer have a value are cleared,
+    or deleted if no other column has a value.
+    Return the number of inserts, updates, clears and deletes."""
+
+    old_hashes = column_hashes(db_session, column_name)
+    new_hashes = {key: hash_value(value) for key, value in packed_dict.items()}
+
+    lookup_keys = set(db_session.scalars(select(Lookup.lookup_key)))
+
+    inserts: list[dict[str, str]] = []
+    updates: list[dict[str, str]] = []
+    for key, new_hash in new_hashes.items():
+        if old_hashes.get(key) != new_hash:
+            row = {"key": key, "value": packed_dict[key]}
+            if key in lookup_keys:
+                updates.append(row)
+            else:
+                inserts.append(row)
+
+    removed = [{"key": key} for key in old_hashes if key not in new_hashes]
+
+    column = lookup_table.c[column_name]
+    other_columns = [
+        c for c in lookup_table.columns
+        if c.name not in ["lookup_key", column_name]]
+
+    if inserts:
+        db_session.execute(
+            insert(lookup_table),
+            [{"lookup_key": row["key"], column_name: row["value"]}
+                for row in inserts])
+
+    if updates:
+        db_session.execute(
+            update(lookup_table)
+            .where(lookup_table.c.lookup_key == bindparam("key"))
+            .values({column: bindparam("value")}),
+            updates)
+
+    deleted = 0
+    cleared = 0
+    if removed:
+        # delete rows with no other value, clear the rest
+        result = db_session.execute(
+            delete(lookup_table)
+            .where(lookup_table.c.lookup_key == bindparam("key"))
+            .where(*[c == "" for c in other_columns]),
+            removed)
+        deleted = result.rowcount
+        result = db_session.execute(
+            update(lookup_table)
+            .where(lookup_table.c.lookup_key == bindparam("key"))
+            .values({column: ""}),
+            removed)
+        cleared = result.rowcount
+
+    db_session.commit()
+
+    return {
+        "inserts": len(inserts),
+        "updates": len(updates),
+        "clears": cleared,
+        "deletes": deleted,
+    }
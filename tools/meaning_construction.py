@@ -59,8 +59,8 @@ def summarize_construction(i: DpdHeadword) -> str:
     """Create a summary of a word's construction,
     excluding brackets and phonetic changes."""
     
-    if "<b>" in i.construction:
-        i.construction = i.construction.replace("<b>", "").replace("</b>", "")
+    # don't modify i, it can be a read-only snapshot row
+    i_construction = i.construction.replace("<b>", "").replace("</b>", "")
 
     # if no meaning then show root, word family or nothing
     if not i.meaning_1:
@@ -72,12 +72,12 @@ def summarize_construction(i: DpdHeadword) -> str:
             return ""
 
     else:
-        if not i.construction:
+        if not i_construction:
             return ""
 
         # clean construction
         # remove line2
-        construction = re.sub(r"\n.+$", "", i.construction)
+        construction = re.sub(r"\n.+$", "", i_construction)
         # remove phonetic changes
         construction = re.sub("> .[^ ]*? ", "", construction)
         # remove phonetic changes at end
@@ -245,6 +245,7 @@ class ProjectPaths:
         self.save_state_path = base_dir / "gui/stash/gui_state"
         self.stash_dir = base_dir / "gui/stash/"
         self.stash_path = base_dir / "gui/stash/stash"
+        self.value_lists_path = base_dir / "gui/stash/value_lists"
 
         # db/inflections/
         self.inflection_templates_path = base_dir / "db/inflections/inflection_templates.xlsx"
@@ -297,6 +298,7 @@ class ProjectPaths:
         self.matches_dict_path = base_dir / "db/deconstructor/assets/matches_dict"
         self.neg_inflections_set_path = base_dir / "db/deconstructor/assets/neg_inflections_set"
         self.sandhi_assets_dir = base_dir / "db/deconstructor/assets"
+        self.sandhi_memo_path = base_dir / "db/deconstructor/assets/sandhi_memo"
         self.text_set_path = base_dir / "db/deconstructor/assets/text_set"
         self.unmatched_set_path = base_dir / "db/deconstructor/assets/unmatched_set"
 
@@ -307,6 +309,7 @@ class ProjectPaths:
         self.process_path = base_dir / "db/deconstructor/output/process.tsv"
         self.rule_counts_path = base_dir / "db/deconstructor/output/rule_counts/rule_counts.tsv"
         self.sandhi_dict_df_path = base_dir / "db/deconstructor/output/sandhi_dict_df.tsv"
+        self.sandhi_checkpoint_dir = base_dir / "db/deconstructor/output/checkpoint/"
         self.sandhi_dict_path = base_dir / "db/deconstructor/output/sandhi_dict"
         self.sandhi_log_path = base_dir / "db/deconstructor/output/logfile.log"
         self.sandhi_output_dir = base_dir / "db/deconstructor/output/"
@@ -368,6 +371,7 @@ class ProjectPaths:
 
         # temp
         self.temp_dir = base_dir / "temp/"
+        self.build_state_path = base_dir / "temp/build_state.json"
 
         # db_tests/
         self.antonym_dict_path = base_dir / "db_tests/test_antonyms.json"
@@ -375,6 +379,8 @@ class ProjectPaths:
         self.bold_example_path = base_dir / "db_tests/test_bold.json"
         self.compound_type_path = base_dir / "db_tests/add_compound_type.tsv"
         self.digu_json_path = base_dir / "db_tests/test_digu.json"
+        self.external_tests_path = base_dir / "db_tests/tests_external.json"
+        self.external_tests_hashes_path = base_dir / "db_tests/tests_external_hashes"
         self.hyphenations_dict_path = base_dir / "db_tests/test_hyphenations.json"
         self.hyphenations_scratchpad_path = base_dir / "db_tests/test_hyphenations.txt"
         self.idioms_exceptions_dict = base_dir / "db_tests/test_idioms.json"